@@ -0,0 +1,60 @@
+"""Memory benchmark of parsed plans, as the plan store keeps them.
+
+Parses seven timetable files, as many as the plan store keeps, of a large
+school synthesized from the recorded plan in tests/fixtures, and reports how
+much memory the parsed plans keep allocated once the XML trees are gone.
+
+Run from the repository root: python benchmarks/plan_memory.py [forms]
+"""
+import gc
+from pathlib import Path
+import re
+import sys
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan  # noqa: E402
+
+FIXTURE = ROOT / "tests" / "fixtures" / "PlanKl20250127.xml"
+DAYS = range(21, 28)
+
+
+def week_of_plans(forms: int) -> list[bytes]:
+    """Return the plan files of a week for a school with the given number of forms."""
+    source = FIXTURE.read_text(encoding="utf-8")
+    form = re.search(r"<Kl>.*?</Kl>", source, re.S).group(0)
+    names = [f"{grade}{letter}" for grade in range(5, 13) for letter in "abcdefgh"]
+    school = source.replace(
+        "<Klassen>",
+        "<Klassen>" + "".join(
+            form.replace("<Kurz>5a</Kurz>", f"<Kurz>{name}</Kurz>") for name in names[:forms]
+        ),
+    )
+    week = [
+        school.replace("27. Januar 2025", f"{day}. Januar 2025").replace("20250127", f"202501{day}")
+        for day in DAYS
+    ]
+    return [plan.encode("utf-8") for plan in week]
+
+
+def main() -> None:
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    files = week_of_plans(forms)
+
+    gc.collect()
+    tracemalloc.start()
+    plans = [IndiwareMobilPlan.from_xml_stream(content) for content in files]
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lessons = sum(len(form.lessons) for plan in plans for form in plan.forms)
+    print(f"{len(plans)} plans, {len(plans[0].forms)} forms each, {lessons} lessons")
+    print(f"retained by parsed plans: {retained / 1024:8.0f} KiB ({retained / lessons:.0f} B per lesson)")
+    print(f"peak while parsing:       {peak / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Benchmark of restoring plans from binary snapshots instead of their XML.
+
+Compares parsing the seven timetable files of a large school, as a warm start
+would have to, with materializing the same plans from their snapshots, once
+with all forms and once with a single one.
+
+Run from the repository root: python benchmarks/plan_snapshot.py [forms]
+"""
+from pathlib import Path
+import sys
+import timeit
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.plan_memory import week_of_plans  # noqa: E402
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan  # noqa: E402
+from custom_components.stundenplan24.stundenplan24_py.snapshot import (  # noqa: E402
+    TimetableSnapshot,
+    dump_timetable,
+)
+
+
+def report(label: str, func, number: int = 20) -> None:
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{label:<32} {seconds * 1000:8.2f} ms")
+
+
+def main() -> None:
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    files = week_of_plans(forms)
+    snapshots = [dump_timetable(IndiwareMobilPlan.from_xml_stream(content)) for content in files]
+
+    print(f"{len(files)} plans, {forms} forms each")
+    print(f"XML {sum(map(len, files)) / 1024:.0f} KiB, snapshots {sum(map(len, snapshots)) / 1024:.0f} KiB")
+    report("parse XML, all forms", lambda: [IndiwareMobilPlan.from_xml_stream(f) for f in files])
+    report("parse XML, one form", lambda: [IndiwareMobilPlan.from_xml_stream(f, {"5a"}) for f in files])
+    report("snapshot, all forms", lambda: [TimetableSnapshot(s).materialize() for s in snapshots])
+    report("snapshot, one form", lambda: [TimetableSnapshot(s).materialize({"5a"}) for s in snapshots])
+
+
+if __name__ == "__main__":
+    main()
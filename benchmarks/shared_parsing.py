@@ -0,0 +1,88 @@
+"""Microbenchmark of the time and date parsers in stundenplan24_py.shared.
+
+Compares them with the strptime calls they replaced, on the kind of values a
+plan contains: a few dozen distinct times, each repeated many times.
+
+Run from the repository root: python benchmarks/shared_parsing.py
+"""
+import datetime
+from pathlib import Path
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from custom_components.stundenplan24.stundenplan24_py import shared  # noqa: E402
+
+TIMES = [f"{hour:02}:{minute:02}" for hour in range(7, 17) for minute in (0, 15, 30, 45)]
+SHORT_DATES = [f"25{month:02}{day:02}" for month in range(1, 13) for day in (1, 15)]
+TIMESTAMPS = ["24.01.2025, 13:12", "27.01.2025, 06:45"]
+PLAN_DATES = ["Montag, 27. Januar 2025 (A-Woche)", "Dienstag, 28. Januar 2025"]
+
+# How often each value of a set is parsed per round, as in a plan
+REPEAT = 50
+
+
+def _plan_date_strptime_era(date: str) -> datetime.date:
+    # parse_plan_date as it was, building the month table on every call
+    months = {
+        "Januar": 1, "Februar": 2, "März": 3, "April": 4, "Mai": 5, "Juni": 6,
+        "Juli": 7, "August": 8, "September": 9, "Oktober": 10, "November": 11,
+        "Dezember": 12,
+    }
+    _, date = date.split(", ", 1)
+    day, month_and_year = date.split(". ", 1)
+    month, _year = month_and_year.split(" ", 1)
+    year, *_ = _year.split(" ", 1)
+    return datetime.date(int(year), months[month], int(day))
+
+
+CASES = [
+    (
+        "time HH:MM",
+        TIMES,
+        lambda value: datetime.datetime.strptime(value, "%H:%M").time(),
+        shared.parse_time,
+    ),
+    (
+        "date YYMMDD",
+        SHORT_DATES,
+        lambda value: datetime.datetime.strptime(value, "%y%m%d").date(),
+        shared.parse_short_date,
+    ),
+    (
+        "timestamp",
+        TIMESTAMPS,
+        lambda value: datetime.datetime.strptime(value, "%d.%m.%Y, %H:%M"),
+        shared.parse_timestamp,
+    ),
+    (
+        "plan date",
+        PLAN_DATES,
+        _plan_date_strptime_era,
+        shared.parse_plan_date,
+    ),
+]
+
+
+def _per_call(parse, values, number: int = 20) -> float:
+    workload = values * REPEAT
+    seconds = min(
+        timeit.repeat(lambda: [parse(value) for value in workload], number=number, repeat=5)
+    )
+    return seconds / number / len(workload) * 1e9
+
+
+def main() -> None:
+    print(f"{'parser':<14}{'before ns/call':>16}{'after ns/call':>16}{'speedup':>10}")
+    for name, values, before, after in CASES:
+        # same results, or the comparison is meaningless
+        assert [before(value) for value in values] == [after(value) for value in values]
+
+        before_ns = _per_call(before, values)
+        after_ns = _per_call(after, values)
+        print(f"{name:<14}{before_ns:>16.0f}{after_ns:>16.0f}{before_ns / after_ns:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
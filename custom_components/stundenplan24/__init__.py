@@ -8,8 +8,10 @@ from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
+from . import websocket_api
+from .const import CONF_SCHOOL_URL, CONF_USERNAME, DOMAIN
 from .coordinator import Stundenplan24Coordinator
+from .plan_cache import PlanDiskCache
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.CALENDAR]
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the Stundenplan24 component."""
     hass.data.setdefault(DOMAIN, {})
+    websocket_api.async_setup(hass)
     return True
 
 
@@ -37,9 +40,6 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # Forward the setup to the platforms
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
-    # Register shutdown handler
-    entry.async_on_unload(coordinator.async_shutdown)
-
     # Register update listener for options flow changes
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
@@ -62,6 +62,23 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the plans cached on disk for a removed entry.
+
+    Entries for the same school and user share the cache, which is kept for
+    as long as one of them is left.
+    """
+    school = (entry.data[CONF_SCHOOL_URL], entry.data[CONF_USERNAME])
+    if any(
+        (other.data.get(CONF_SCHOOL_URL), other.data.get(CONF_USERNAME)) == school
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        return
+
+    await hass.async_add_executor_job(PlanDiskCache.for_school(hass, *school).remove)
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     await async_unload_entry(hass, entry)
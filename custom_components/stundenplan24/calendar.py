@@ -1,19 +1,21 @@
 """Calendar platform for Stundenplan24 integration."""
 from __future__ import annotations
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 import logging
 from typing import Any
 
 from homeassistant.components.calendar import CalendarEntity, CalendarEvent
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
 from .const import CONF_FILTER_SUBJECTS, DOMAIN
 from .coordinator import Stundenplan24Coordinator
+from .stundenplan24_py.week_timetable import WeekTimetable
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -59,42 +61,25 @@ class Stundenplan24Calendar(CoordinatorEntity, CalendarEntity):
             "model": "Student Schedule",
             "sw_version": "1.0",
         }
+        # Events of the data and subject filter they were built from
+        self._events: _EventIndex | None = None
+        self._events_data: dict[str, Any] | None = None
+        self._events_filter: tuple[str, ...] = ()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if the timetables changed.
+
+        The calendar entity schedules its own updates at event boundaries.
+        """
+        if self.coordinator.data_changed(("timetables", "timetable", "week")):
+            super()._handle_coordinator_update()
 
     @property
     def event(self) -> CalendarEvent | None:
         """Return the next upcoming event."""
         now = dt_util.now()
-        events = self._get_events(now, now + timedelta(days=7))
-
-        if not events:
-            return None
-
-        # Find next event - handle both datetime and date objects
-        def is_future_event(event):
-            """Check if event is in the future."""
-            if isinstance(event.start, datetime):
-                return event.start > now
-            else:
-                # All-day events (date objects) - compare just the date
-                # Consider all-day event as starting at midnight
-                event_datetime = dt_util.start_of_local_day(
-                    datetime.combine(event.start, datetime.min.time())
-                )
-                return event_datetime > now
-
-        future_events = [e for e in events if is_future_event(e)]
-        if future_events:
-            # Use the same sort key as in _get_events for consistency
-            def sort_key(event):
-                if isinstance(event.start, datetime):
-                    return event.start
-                else:
-                    return dt_util.start_of_local_day(
-                        datetime.combine(event.start, datetime.min.time())
-                    )
-            return min(future_events, key=sort_key)
-
-        return None
+        return self._event_index().next_event(now, now + timedelta(days=7))
 
     async def async_get_events(
         self,
@@ -111,158 +96,191 @@ class Stundenplan24Calendar(CoordinatorEntity, CalendarEntity):
         end_date: datetime,
     ) -> list[CalendarEvent]:
         """Get calendar events within a datetime range."""
-        if not self.coordinator.data:
-            return []
-
-        # Get all daily timetables (new multi-day structure)
-        timetables = self.coordinator.data.get("timetables", {})
-
-        # Fallback to single timetable for backward compatibility
-        if not timetables:
-            single_timetable = self.coordinator.data.get("timetable")
-            if single_timetable and single_timetable.forms:
-                timetables = {single_timetable.date: single_timetable}
-            else:
-                return []
-
         # Ensure start_date and end_date are timezone-aware
         if start_date.tzinfo is None:
             start_date = dt_util.as_local(start_date)
         if end_date.tzinfo is None:
             end_date = dt_util.as_local(end_date)
 
-        events = []
+        return self._event_index().between(start_date, end_date)
+
+    def _event_index(self) -> _EventIndex:
+        """Return the events of the current data, built once per data and subject filter."""
+        data = self.coordinator.data
+        # Get subject filter from config entry options
+        filter_subjects = tuple(self.coordinator.entry.options.get(CONF_FILTER_SUBJECTS, []))
+
+        if (
+            self._events is None
+            or self._events_data is not data
+            or self._events_filter != filter_subjects
+        ):
+            self._events = _EventIndex(_build_events(data, filter_subjects))
+            self._events_data = data
+            self._events_filter = filter_subjects
+
+        return self._events
+
+
+class _EventIndex:
+    """Calendar events sorted by start, for range queries by bisection.
+
+    Events are included in a range if their day starts in it and, for timed
+    events, they start in it as well.
+    """
+
+    def __init__(self, events: list[CalendarEvent]) -> None:
+        """Sort the events."""
+        keyed = sorted(
+            ((_sort_key(event), _day_start(event), event) for event in events),
+            key=lambda item: item[0],
+        )
+        self._starts = [start for start, _, _ in keyed]
+        # Not decreasing either, as events are sorted by start
+        self._day_starts = [day_start for _, day_start, _ in keyed]
+        self._events = [event for _, _, event in keyed]
+
+    def between(self, start: datetime, end: datetime) -> list[CalendarEvent]:
+        """Return the events within a range."""
+        first = bisect_left(self._day_starts, start)
+        last = bisect_left(self._starts, end)
+        return self._events[first:last]
+
+    def next_event(self, now: datetime, end: datetime) -> CalendarEvent | None:
+        """Return the first event of the range from now to end starting after now."""
+        first = max(bisect_left(self._day_starts, now), bisect_right(self._starts, now))
+        if first < len(self._events) and self._starts[first] < end:
+            return self._events[first]
+        return None
+
 
-        # Process each daily plan within the requested date range
-        for plan_date, timetable in timetables.items():
-            if not timetable.forms:
-                continue
+def _day_start(event: CalendarEvent) -> datetime:
+    """Return the start of the local day of an event."""
+    day = event.start.date() if isinstance(event.start, datetime) else event.start
+    return dt_util.start_of_local_day(datetime.combine(day, datetime.min.time()))
 
-            # Convert plan_date to a timezone-aware datetime
-            plan_datetime = dt_util.start_of_local_day(
-                datetime.combine(plan_date, datetime.min.time())
-            )
 
-            # Check if the plan date is within the requested range
-            if plan_datetime < start_date or plan_datetime >= end_date:
-                continue
-
-            # Get the first form (should be the selected one after filtering)
-            form = timetable.forms[0]
-
-            # Get subject filter from config entry options
-            filter_subjects = self.coordinator.entry.options.get(CONF_FILTER_SUBJECTS, [])
-
-            # Generate events for each lesson on this plan date
-            for lesson in form.lessons:
-                if not lesson.start or not lesson.end:
-                    continue
-
-                # Apply subject filter if configured
-                if filter_subjects:
-                    # Only include lessons for filtered subjects
-                    lesson_subject = str(lesson.subject) if lesson.subject else ""
-                    if lesson_subject not in filter_subjects:
-                        continue
-
-                # Create event on the plan date with lesson times
-                lesson_datetime = plan_datetime.replace(
-                    hour=lesson.start.hour,
-                    minute=lesson.start.minute,
-                    second=lesson.start.second
-                )
-                lesson_end_datetime = plan_datetime.replace(
-                    hour=lesson.end.hour,
-                    minute=lesson.end.minute,
-                    second=lesson.end.second
-                )
-
-                # Check if lesson is within requested range
-                if lesson_datetime >= start_date and lesson_datetime < end_date:
-                    # Create event
-                    summary = str(lesson.subject) if lesson.subject else "Unbekannt"
-
-                    description_parts = []
-
-                    # Safely convert lesson attributes to strings
-                    # Use bullet points for better visual separation
-                    if lesson.teacher:
-                        try:
-                            teacher_str = str(lesson.teacher)
-                            if teacher_str and teacher_str != "None":
-                                description_parts.append(f"👤 Lehrer: {teacher_str}")
-                        except (TypeError, ValueError):
-                            pass
-
-                    if lesson.room:
-                        try:
-                            room_str = str(lesson.room)
-                            if room_str and room_str != "None":
-                                description_parts.append(f"📍 Raum: {room_str}")
-                        except (TypeError, ValueError):
-                            pass
-
-                    if lesson.information:
-                        try:
-                            info_str = str(lesson.information)
-                            if info_str and info_str != "None":
-                                description_parts.append(f"ℹ️  Info: {info_str}")
-                        except (TypeError, ValueError):
-                            pass
-
-                    # Use single newlines - iCalendar format supports \n for line breaks
-                    description = "\n".join(description_parts) if description_parts else None
-
-                    event = CalendarEvent(
-                        start=lesson_datetime,
-                        end=lesson_end_datetime,
-                        summary=summary,
-                        description=description,
-                    )
-
-                    events.append(event)
-
-        # Add all-day events for ZusatzInfo (additional info)
-        for plan_date, timetable in timetables.items():
-            # Convert plan_date to a timezone-aware datetime
-            plan_datetime = dt_util.start_of_local_day(
-                datetime.combine(plan_date, datetime.min.time())
+def _sort_key(event: CalendarEvent) -> datetime:
+    """Sort key that handles both datetime and date objects."""
+    if isinstance(event.start, datetime):
+        return event.start
+    # All-day events should sort at midnight of that day
+    return _day_start(event)
+
+
+def _build_events(
+    data: dict[str, Any] | None, filter_subjects: tuple[str, ...]
+) -> list[CalendarEvent]:
+    """Build the events of all stored plans."""
+    if not data:
+        return []
+
+    # Get all daily timetables (new multi-day structure)
+    timetables = data.get("timetables", {})
+
+    # Fallback to single timetable for backward compatibility
+    if not timetables:
+        single_timetable = data.get("timetable")
+        if single_timetable and single_timetable.forms:
+            timetables = {single_timetable.date: single_timetable}
+        else:
+            return []
+
+    # Columnar index of the lessons, built here only for data set directly
+    week = data.get("week")
+    if week is None:
+        week = WeekTimetable.from_plans(timetables.values())
+
+    events = []
+
+    # Process each daily plan
+    for plan_date, timetable in timetables.items():
+        if not timetable.forms:
+            continue
+
+        # Convert plan_date to a timezone-aware datetime
+        plan_datetime = dt_util.start_of_local_day(
+            datetime.combine(plan_date, datetime.min.time())
+        )
+
+        # Get the first form (should be the selected one after filtering)
+        form = timetable.forms[0]
+
+        # Generate events for each timed lesson on this plan date,
+        # only for the filtered subjects if configured
+        lessons = week.select(
+            dates=plan_date,
+            forms=form.short_name,
+            subjects=filter_subjects or None,
+            timed=True,
+        )
+        for _, _, lesson in week.rows(lessons):
+            # Create event on the plan date with lesson times
+            lesson_datetime = plan_datetime.replace(
+                hour=lesson.start.hour,
+                minute=lesson.start.minute,
+                second=lesson.start.second
+            )
+            lesson_end_datetime = plan_datetime.replace(
+                hour=lesson.end.hour,
+                minute=lesson.end.minute,
+                second=lesson.end.second
             )
 
-            # Check if the plan date is within the requested range
-            if plan_datetime < start_date or plan_datetime >= end_date:
-                continue
-
-            # Check if there's additional info for this day
-            if timetable.additional_info:
-                # Filter out empty lines and None values
-                info_lines = [line for line in timetable.additional_info if line and line.strip()]
-
-                if info_lines:
-                    # Create all-day event
-                    # All-day events in Home Assistant: start and end as date objects
-                    summary = "Informationen"
-                    description = "\n".join(info_lines)
-
-                    event = CalendarEvent(
-                        start=plan_date,  # Use date object for all-day events
-                        end=plan_date + timedelta(days=1),
-                        summary=summary,
-                        description=description,
-                    )
-
-                    events.append(event)
-
-        # Sort events - handle mixed datetime and date objects
-        def sort_key(event):
-            """Sort key that handles both datetime and date objects."""
-            if isinstance(event.start, datetime):
-                return event.start
-            else:
-                # Convert date to timezone-aware datetime for sorting
-                # All-day events should sort at midnight of that day
-                return dt_util.start_of_local_day(
-                    datetime.combine(event.start, datetime.min.time())
-                )
-
-        return sorted(events, key=sort_key)
+            summary = str(lesson.subject) if lesson.subject else "Unbekannt"
+
+            description_parts = []
+
+            # Safely convert lesson attributes to strings
+            # Use bullet points for better visual separation
+            if lesson.teacher:
+                try:
+                    teacher_str = str(lesson.teacher)
+                    if teacher_str and teacher_str != "None":
+                        description_parts.append(f"👤 Lehrer: {teacher_str}")
+                except (TypeError, ValueError):
+                    pass
+
+            if lesson.room:
+                try:
+                    room_str = str(lesson.room)
+                    if room_str and room_str != "None":
+                        description_parts.append(f"📍 Raum: {room_str}")
+                except (TypeError, ValueError):
+                    pass
+
+            if lesson.information:
+                try:
+                    info_str = str(lesson.information)
+                    if info_str and info_str != "None":
+                        description_parts.append(f"ℹ️  Info: {info_str}")
+                except (TypeError, ValueError):
+                    pass
+
+            # Use single newlines - iCalendar format supports \n for line breaks
+            description = "\n".join(description_parts) if description_parts else None
+
+            events.append(CalendarEvent(
+                start=lesson_datetime,
+                end=lesson_end_datetime,
+                summary=summary,
+                description=description,
+            ))
+
+    # Add all-day events for ZusatzInfo (additional info)
+    for plan_date, timetable in timetables.items():
+        # Check if there's additional info for this day
+        if timetable.additional_info:
+            # Filter out empty lines and None values
+            info_lines = [line for line in timetable.additional_info if line and line.strip()]
+
+            if info_lines:
+                # All-day events in Home Assistant: start and end as date objects
+                events.append(CalendarEvent(
+                    start=plan_date,  # Use date object for all-day events
+                    end=plan_date + timedelta(days=1),
+                    summary="Informationen",
+                    description="\n".join(info_lines),
+                ))
+
+    return events
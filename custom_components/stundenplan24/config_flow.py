@@ -17,14 +17,23 @@ from homeassistant.helpers import config_validation as cv
 from .const import (
     CONF_FILTER_SUBJECTS,
     CONF_FORM,
+    CONF_INCREMENTAL_REFRESH,
+    CONF_MAX_PARALLEL_REQUESTS,
+    CONF_MAX_SUBSTITUTION_ROWS,
     CONF_PASSWORD,
     CONF_SCHOOL_URL,
     CONF_USERNAME,
+    DEFAULT_INCREMENTAL_REFRESH,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
+    DEFAULT_MAX_SUBSTITUTION_ROWS,
     DOMAIN,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+# Options of the plan store, shared by all entries of a school
+SCHOOL_OPTIONS = (CONF_MAX_PARALLEL_REQUESTS, CONF_INCREMENTAL_REFRESH)
+
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_SCHOOL_URL): str,
@@ -201,17 +210,20 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
     async def async_step_init(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
-        """Manage the options for subject filtering."""
+        """Manage the options for subject filtering and plan requests."""
+        options = self.config_entry.options
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            self._update_school_options(user_input)
+            # Options not in the form are kept
+            return self.async_create_entry(title="", data={**options, **user_input})
 
         # Get available subjects from the API
         available_subjects = await self._get_available_subjects()
 
         # Get currently configured filter
         # If not yet configured (key doesn't exist), pre-select all subjects
-        if CONF_FILTER_SUBJECTS in self.config_entry.options:
-            current_filter = self.config_entry.options[CONF_FILTER_SUBJECTS]
+        if CONF_FILTER_SUBJECTS in options:
+            current_filter = options[CONF_FILTER_SUBJECTS]
         else:
             # Pre-select all available subjects by default
             current_filter = list(available_subjects.keys())
@@ -221,11 +233,38 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             vol.Optional(
                 CONF_FILTER_SUBJECTS,
                 description={"suggested_value": current_filter}
-            ): cv.multi_select(available_subjects)
+            ): cv.multi_select(available_subjects),
+            vol.Optional(
+                CONF_MAX_PARALLEL_REQUESTS,
+                default=options.get(CONF_MAX_PARALLEL_REQUESTS, DEFAULT_MAX_PARALLEL_REQUESTS),
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=16)),
+            vol.Optional(
+                CONF_INCREMENTAL_REFRESH,
+                default=options.get(CONF_INCREMENTAL_REFRESH, DEFAULT_INCREMENTAL_REFRESH),
+            ): bool,
+            vol.Optional(
+                CONF_MAX_SUBSTITUTION_ROWS,
+                default=options.get(CONF_MAX_SUBSTITUTION_ROWS, DEFAULT_MAX_SUBSTITUTION_ROWS),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
         })
 
         return self.async_show_form(step_id="init", data_schema=schema)
 
+    def _update_school_options(self, user_input: dict[str, Any]) -> None:
+        """Save the options of the plan store to the other entries of the school too.
+
+        The entries of a school share one plan store, so these options only
+        make sense for all of them at once.
+        """
+        school_options = {key: user_input[key] for key in SCHOOL_OPTIONS if key in user_input}
+        school = _school_of(self.config_entry)
+
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            if entry.entry_id != self.config_entry.entry_id and _school_of(entry) == school:
+                self.hass.config_entries.async_update_entry(
+                    entry, options={**entry.options, **school_options}
+                )
+
     async def _get_available_subjects(self) -> dict[str, str]:
         """Get available subjects from the API."""
         hosting = Hosting.deserialize({
@@ -275,6 +314,11 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             await client.close()
 
 
+def _school_of(entry: config_entries.ConfigEntry) -> tuple[Any, ...]:
+    """Return what identifies the plan store an entry uses."""
+    return tuple(entry.data.get(key) for key in (CONF_SCHOOL_URL, CONF_USERNAME, CONF_PASSWORD))
+
+
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
 
@@ -2,6 +2,12 @@
 
 DOMAIN = "stundenplan24"
 
+# hass.data key of the clients shared between config entries
+DATA_PLAN_STORES = f"{DOMAIN}_plan_stores"
+
+# Fired when lessons or substitutions of a plan changed between two refreshes
+EVENT_PLAN_CHANGED = f"{DOMAIN}_plan_changed"
+
 # Config flow
 CONF_SCHOOL_URL = "school_url"
 CONF_USERNAME = "username"
@@ -9,10 +15,16 @@ CONF_PASSWORD = "password"
 CONF_STUDENT_ID = "student_id"
 CONF_FORM = "form"
 CONF_FILTER_SUBJECTS = "filter_subjects"
+CONF_MAX_PARALLEL_REQUESTS = "max_parallel_requests"
+CONF_INCREMENTAL_REFRESH = "incremental_refresh"
+CONF_MAX_SUBSTITUTION_ROWS = "max_substitution_rows"
 
 # Default values
 DEFAULT_SCAN_INTERVAL = 30  # minutes
 DEFAULT_NAME = "Stundenplan24"
+DEFAULT_MAX_PARALLEL_REQUESTS = 4  # concurrent HTTP requests per refresh
+DEFAULT_INCREMENTAL_REFRESH = True  # only fetch plan files whose vpdir timestamp changed
+DEFAULT_MAX_SUBSTITUTION_ROWS = 30  # substitutions in the state attributes of a sensor
 
 # Sensor types
 SENSOR_TYPE_CURRENT_LESSON = "current_lesson"
@@ -2,14 +2,27 @@
 from __future__ import annotations
 
 from asyncio import Lock
-from datetime import datetime, timedelta
+from collections.abc import Collection, Iterable
+import copy
+from datetime import date, datetime, time, timedelta
 import logging
 from typing import Any
 
-from .stundenplan24_py.client import IndiwareStundenplanerClient, Hosting
+from .stundenplan24_py.client import Hosting, IndiwareStundenplanerClient
+from .stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from .stundenplan24_py.lesson_index import LessonIndex
+from .stundenplan24_py.plan_diff import (
+    CHANGED,
+    PlanChanges,
+    RowChange,
+    diff_substitution_plans,
+    diff_timetables,
+)
+from .stundenplan24_py.shared import Value
+from .stundenplan24_py.week_timetable import WeekTimetable
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
@@ -18,15 +31,30 @@ from homeassistant.util import dt as dt_util
 
 from .const import (
     CONF_FORM,
+    CONF_INCREMENTAL_REFRESH,
+    CONF_MAX_PARALLEL_REQUESTS,
     CONF_PASSWORD,
     CONF_SCHOOL_URL,
     CONF_USERNAME,
+    DEFAULT_INCREMENTAL_REFRESH,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
     DEFAULT_SCAN_INTERVAL,
     DOMAIN,
+    EVENT_PLAN_CHANGED,
 )
+from .plan_cache import PlanDiskCache
+from .plan_store import SchoolPlans, SchoolPlanStore
+from .registry import SchoolKey, async_get_plan_store_registry
 
 _LOGGER = logging.getLogger(__name__)
 
+# Pseudo data key, changed when the first update of a new day came in
+KEY_TODAY = "today"
+
+_SUBSTITUTION_KEYS = ("substitution_today", "substitution_tomorrow")
+# Keys derived from the timetables, compared through them
+_TIMETABLE_KEYS = ("timetables", "week", "lessons")
+
 
 class Stundenplan24Coordinator(DataUpdateCoordinator):
     """Class to manage fetching stundenplan24 data."""
@@ -35,18 +63,37 @@ class Stundenplan24Coordinator(DataUpdateCoordinator):
         """Initialize coordinator."""
         self.entry = entry
         self.client: IndiwareStundenplanerClient | None = None
+        self.store: SchoolPlanStore | None = None
         self._setup_lock = Lock()
+        self._unsubscribe_store: CALLBACK_TYPE | None = None
+        # The first refresh may be served from the plans cached on disk
+        self._warm_start_done = False
 
         # Store config data
         self.school_url = entry.data[CONF_SCHOOL_URL]
         self.username = entry.data[CONF_USERNAME]
         self.password = entry.data[CONF_PASSWORD]
 
+        # Views of the school-wide plans reduced to the selected form, keyed by
+        # filename together with the plan they were derived from
+        self._timetable_views: dict[str, tuple[IndiwareMobilPlan, IndiwareMobilPlan]] = {}
+        # Indexes of the views, together with the views they were built from
+        self._week: tuple[tuple[IndiwareMobilPlan, ...], WeekTimetable, LessonIndex] | None = None
+
+        # Data keys whose content changed with the last update, None if unknown
+        self.changed_keys: frozenset[str] | None = None
+        self._data_day: date | None = None
+        # Content digests of the plans the current data was built from
+        self._data_fingerprint: tuple | None = None
+
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
             update_interval=timedelta(minutes=DEFAULT_SCAN_INTERVAL),
+            # Unchanged plans hand back the current data, which then doesn't
+            # wake up the entities
+            always_update=False,
         )
 
     async def _async_setup(self) -> None:
@@ -56,17 +103,38 @@ class Stundenplan24Coordinator(DataUpdateCoordinator):
             if self.client is not None:
                 return
 
-            # Create hosting object using deserialize method
-            hosting = Hosting.deserialize({
-                "creds": {
-                    "username": self.username,
-                    "password": self.password,
-                },
-                "endpoints": self.school_url,
-            })
-
-            # Initialize client
-            self.client = IndiwareStundenplanerClient(hosting=hosting)
+            def create_store() -> SchoolPlanStore:
+                # Create hosting object using deserialize method
+                hosting = Hosting.deserialize({
+                    "creds": {
+                        "username": self.username,
+                        "password": self.password,
+                    },
+                    "endpoints": self.school_url,
+                })
+
+                return SchoolPlanStore(
+                    self.hass,
+                    IndiwareStundenplanerClient(hosting=hosting),
+                    **self._request_options,
+                    disk_cache=PlanDiskCache.for_school(self.hass, self.school_url, self.username),
+                )
+
+            # Entries for the same school and credentials share one plan store
+            self.store = async_get_plan_store_registry(self.hass).acquire(
+                self._school_key, create_store
+            )
+            # Released with the entry, also when its first refresh fails and
+            # the setup is retried
+            self.entry.async_on_unload(self.async_shutdown)
+            # The request options are those of the whole school. The options
+            # flow saves them to all its entries, and an entry set up again
+            # after a change applies them to a store its siblings kept alive.
+            self.store.update_options(**self._request_options)
+            self.client = self.store.client
+            self._unsubscribe_store = self.store.async_subscribe(
+                self, self._handle_store_update, self.entry.data.get(CONF_FORM) or None
+            )
 
             _LOGGER.debug("Stundenplan24 client initialized for %s", self.school_url)
 
@@ -80,198 +148,319 @@ class Stundenplan24Coordinator(DataUpdateCoordinator):
             await self._async_setup()
 
         try:
-            data = {}
+            if not self._warm_start_done:
+                self._warm_start_done = True
+                if (plans := await self.store.async_load_cached()) is not None:
+                    # Become available right away, the server is asked afterwards
+                    _LOGGER.debug("Starting from cached plans, revalidating in the background")
+                    self.entry.async_create_background_task(
+                        self.hass,
+                        self.async_refresh(),
+                        "stundenplan24 revalidate cached plans",
+                        eager_start=False,
+                    )
+                    return self._data_from(plans)
+
+            return self._data_from(await self.store.async_refresh(self))
 
-            # Convert filter objects to lists
-            mobil_clients = list(self.client.indiware_mobil_clients)
-            substitution_clients = list(self.client.substitution_plan_clients)
+        except Exception as err:
+            _LOGGER.error("Error communicating with API: %s", err)
+            raise UpdateFailed(f"Error communicating with API: {err}") from err
+
+    @callback
+    def _handle_store_update(self, plans: SchoolPlans) -> None:
+        """Take over plans another entry of the same school refreshed.
+
+        The next poll is moved to one interval from now, also when nothing
+        changed, so the entries of a school poll together and their refreshes
+        are coalesced into one round of requests.
+        """
+        data = self._data_from(plans)
+        if data is not self.data:
+            self.async_set_updated_data(data)
+        elif self._listeners:
+            self._schedule_refresh()
+
+    def _data_from(self, plans: SchoolPlans) -> dict[str, Any]:
+        """Return the data for plans, the current data if their content is unchanged."""
+        fingerprint = _fingerprint(plans, dt_util.now().date())
+        if (
+            fingerprint is not None
+            and fingerprint == self._data_fingerprint
+            and self.data is not None
+            and self.last_update_success
+        ):
+            _LOGGER.debug("Plans unchanged, keeping the current data")
+            self.changed_keys = frozenset()
+            return self.data
+
+        data = self._track_changes(self._build_data(plans))
+        self._data_fingerprint = fingerprint
+        return data
+
+    def _track_changes(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Work out what data is about to replace and announce changed plans.
+
+        Sets changed_keys and fires EVENT_PLAN_CHANGED for every date whose
+        lessons or substitutions differ from the current data. If nothing
+        differs, the current data is returned instead of data.
+        """
+        old = self.data
+        today = dt_util.now().date()
+        new_day, self._data_day = self._data_day != today, today
+        # Substitution plans are shared with the other entries of the school and
+        # hold their forms as well, only the selected form counts here
+        selected_form = self.entry.data.get(CONF_FORM)
+        forms = (selected_form,) if selected_form else None
+
+        if old is None or not self.last_update_success:
+            # Nothing to compare against, or entities still show a failed update
+            self.changed_keys = None
+            return data
 
-            # Fetch substitution plan for today
+        changed = {
+            key for key in old.keys() | data.keys()
+            if key not in (*_SUBSTITUTION_KEYS, *_TIMETABLE_KEYS, "timetable")
+            and old.get(key) != data.get(key)
+        }
+        if new_day:
+            changed.add(KEY_TODAY)
+
+        for key in _SUBSTITUTION_KEYS:
+            if diff_substitution_plans(old.get(key), data.get(key), forms):
+                changed.add(key)
+        if diff_timetables(old.get("timetable"), data.get("timetable")):
+            changed.add("timetable")
+
+        # Substitution plans are compared by date, as today's plan was tomorrow's before
+        old_substitutions = _plans_by_date(old.get(key) for key in _SUBSTITUTION_KEYS)
+        new_substitutions = _plans_by_date(data.get(key) for key in _SUBSTITUTION_KEYS)
+        for day, plan in new_substitutions.items():
+            self._fire_plan_changed(
+                "substitution", diff_substitution_plans(old_substitutions.get(day), plan, forms)
+            )
+
+        old_timetables = old.get("timetables") or {}
+        new_timetables = data.get("timetables") or {}
+        for day in old_timetables.keys() | new_timetables.keys():
+            changes = diff_timetables(old_timetables.get(day), new_timetables.get(day))
+            if changes:
+                changed.update(_TIMETABLE_KEYS)
+            if day in new_timetables:
+                self._fire_plan_changed("timetable", changes)
+
+        self.changed_keys = frozenset(changed)
+        return data if changed else old
+
+    def data_changed(self, keys: Collection[str]) -> bool:
+        """Return whether the last update changed any of keys, or may have."""
+        return (
+            not self.last_update_success
+            or self.changed_keys is None
+            or not self.changed_keys.isdisjoint(keys)
+        )
+
+    def _fire_plan_changed(self, plan: str, changes: PlanChanges) -> None:
+        """Fire an event for changed lessons or substitutions of one date."""
+        if not changes.rows:
+            return
+
+        self.hass.bus.async_fire(EVENT_PLAN_CHANGED, {
+            "entry_id": self.entry.entry_id,
+            "form": self.entry.data.get(CONF_FORM) or None,
+            "plan": plan,
+            "date": changes.date.isoformat() if changes.date else None,
+            "changes": [_row_change_data(row) for row in changes.rows],
+        })
+
+    def _build_data(self, plans: SchoolPlans) -> dict[str, Any]:
+        """Build the data of this entry from the plans of the whole school."""
+        data = {}
+
+        if plans.substitutions is not None:
+            # The plans are those of the next school days: today's is missing
+            # on a weekend, "tomorrow" is the next school day after today
             today = dt_util.now().date()
-            tomorrow = today + timedelta(days=1)
+            next_day = min((day for day in plans.substitutions if day > today), default=None)
+            data["substitution_today"] = plans.substitutions.get(today)
+            data["substitution_tomorrow"] = plans.substitutions.get(next_day)
+
+        if plans.timetables is not None:
+            data |= self._build_timetable_data(plans)
+
+        return data
+
+    def _build_timetable_data(self, plans: SchoolPlans) -> dict[str, Any]:
+        """Index the timetables by date, reduced to the selected form."""
+        plans_by_date = {}
+
+        for filename, school_plan in plans.timetables.items():
+            plan = self._form_view(filename, school_plan)
+
+            # Store plan by date for easy lookup
+            # Warn if we're overwriting an existing plan (duplicate date)
+            if plan.date in plans_by_date:
+                _LOGGER.warning(
+                    "Plan for %s already exists (from %s), overwriting with %s",
+                    plan.date,
+                    "previous file",
+                    filename
+                )
+
+            plans_by_date[plan.date] = plan
+
+        # Forget views of files that dropped out of the window
+        self._timetable_views = {
+            filename: view for filename, view in self._timetable_views.items()
+            if filename in plans.timetables
+        }
+
+        if not plans_by_date:
+            if plans.timetable_errors:
+                _LOGGER.warning("No timetables could be fetched")
+            self._week = None
+            return {"timetables": {}, "timetable": None}
+
+        # Store all plans indexed by date
+        week, lessons = self._week_indexes(plans_by_date)
+        data = {"timetables": plans_by_date, "week": week, "lessons": lessons}
+
+        # Store fetch errors for diagnostics
+        if plans.timetable_errors:
+            data["timetable_fetch_errors"] = plans.timetable_errors
+
+        # For backward compatibility, also store the most recent plan
+        # as "timetable" (for existing sensors that expect it)
+        most_recent_date = max(plans_by_date.keys())
+        data["timetable"] = plans_by_date[most_recent_date]
+
+        _LOGGER.debug(
+            "Fetched %d daily timetables (most recent: %s)",
+            len(plans_by_date),
+            most_recent_date
+        )
 
-            _LOGGER.debug("Fetching substitution plans for %s and %s", today, tomorrow)
+        return data
 
-            # Fetch today's substitution plan (student view)
-            if substitution_clients:
-                try:
-                    today_plan = await substitution_clients[0].fetch_plan(
-                        date_or_filename=today
-                    )
-                    data["substitution_today"] = today_plan
-                    _LOGGER.debug("Fetched substitution plan for today: %s", today_plan.date if today_plan else None)
-                except Exception as err:
-                    _LOGGER.warning("Could not fetch substitution plan for today: %s", err)
-                    data["substitution_today"] = None
-
-                # Fetch tomorrow's substitution plan
-                try:
-                    tomorrow_plan = await substitution_clients[0].fetch_plan(
-                        date_or_filename=tomorrow
-                    )
-                    data["substitution_tomorrow"] = tomorrow_plan
-                    _LOGGER.debug("Fetched substitution plan for tomorrow: %s", tomorrow_plan.date if tomorrow_plan else None)
-                except Exception as err:
-                    _LOGGER.warning("Could not fetch substitution plan for tomorrow: %s", err)
-                    data["substitution_tomorrow"] = None
-
-            # Fetch Indiware Mobil plans (timetable)
-            # Each plan contains ALL forms/classes for a specific day
-            # We fetch multiple days to provide better calendar coverage
-            if mobil_clients:
-                try:
-                    # Get available dates first
-                    available_dates = await mobil_clients[0].fetch_dates()
-
-                    if available_dates:
-                        from .stundenplan24_py.indiware_mobil import IndiwareMobilPlan
-                        import xml.etree.ElementTree as ET
-
-                        # Fetch plans for up to 7 days (for weekly calendar view)
-                        # Each plan file contains all forms, so we only fetch once per day
-                        plans_by_date = {}
-                        fetch_errors = {}
-                        selected_form = self.entry.data.get(CONF_FORM)
-
-                        # Sort files by date (most recent first) and get up to 7
-                        # available_dates is a dict: {filename: last_modified_datetime}
-                        # Filter out generic files like Klassen.xml that may duplicate dated plans
-                        specific_plan_files = [
-                            f for f in available_dates.keys()
-                            if f.startswith('PlanKl') and f.endswith('.xml')
-                        ]
-
-                        sorted_files = sorted(
-                            specific_plan_files,
-                            key=lambda f: available_dates[f],
-                            reverse=True  # Most recent first
-                        )
-                        files_to_fetch = sorted_files[:7]
-
-                        _LOGGER.debug(
-                            "Available plan files from API (%d total): %s",
-                            len(available_dates),
-                            list(available_dates.keys())
-                        )
-                        _LOGGER.debug(
-                            "Sorted by date (most recent first), fetching first 7: %s",
-                            files_to_fetch
-                        )
-
-                        for filename in files_to_fetch:
-                            try:
-                                plan_response = await mobil_clients[0].fetch_plan(
-                                    date_or_filename=filename
-                                )
-
-                                # Validate XML content before parsing
-                                content = plan_response.content
-
-                                # Basic validation: check if content looks like XML
-                                # Remove BOM and whitespace, then check for XML start
-                                if isinstance(content, bytes):
-                                    # Remove BOM for bytes
-                                    stripped = content.lstrip(b'\xef\xbb\xbf').strip()
-                                    if not stripped or not stripped.startswith(b'<'):
-                                        raise ValueError(f"Response is not XML (bytes): {repr(content[:100])}")
-                                else:
-                                    # Remove BOM for string (UTF-8 BOM is \ufeff)
-                                    stripped = content.lstrip('\ufeff').strip()
-                                    if not stripped or not stripped.startswith('<'):
-                                        raise ValueError(f"Response is not XML (string): {repr(content[:100])}")
-
-                                # Parse XML to IndiwareMobilPlan
-                                root = ET.fromstring(content)
-                                plan = IndiwareMobilPlan.from_xml(root)
-
-                                # Filter to selected form if configured
-                                # This reduces memory usage since we only keep relevant data
-                                if selected_form:
-                                    plan.forms = [
-                                        form for form in plan.forms
-                                        if form.short_name == selected_form
-                                    ]
-
-                                # Store plan by date for easy lookup
-                                # Warn if we're overwriting an existing plan (duplicate date)
-                                if plan.date in plans_by_date:
-                                    _LOGGER.warning(
-                                        "Plan for %s already exists (from %s), overwriting with %s",
-                                        plan.date,
-                                        "previous file",
-                                        filename
-                                    )
-
-                                plans_by_date[plan.date] = plan
-
-                                _LOGGER.debug(
-                                    "Fetched plan for %s (from %s) with %d form(s)",
-                                    plan.date,
-                                    filename,
-                                    len(plan.forms)
-                                )
-                            except ET.ParseError as err:
-                                fetch_errors[filename] = f"XML parse error: {err}"
-                                _LOGGER.error("Failed to parse XML for %s: %s", filename, err)
-                                continue
-                            except ValueError as err:
-                                fetch_errors[filename] = str(err)
-                                _LOGGER.error("Invalid content for %s: %s", filename, err)
-                                continue
-                            except Exception as err:
-                                fetch_errors[filename] = str(err)
-                                _LOGGER.warning(
-                                    "Could not fetch plan %s: %s",
-                                    filename,
-                                    err
-                                )
-                                continue
-
-                        if plans_by_date:
-                            # Store all plans indexed by date
-                            data["timetables"] = plans_by_date
-
-                            # Store fetch errors for diagnostics
-                            if fetch_errors:
-                                data["timetable_fetch_errors"] = fetch_errors
-                                _LOGGER.info(
-                                    "Fetched %d of %d timetables successfully, %d errors",
-                                    len(plans_by_date),
-                                    len(files_to_fetch),
-                                    len(fetch_errors)
-                                )
-
-                            # For backward compatibility, also store the most recent plan
-                            # as "timetable" (for existing sensors that expect it)
-                            most_recent_date = max(plans_by_date.keys())
-                            data["timetable"] = plans_by_date[most_recent_date]
-
-                            _LOGGER.debug(
-                                "Fetched %d daily timetables (most recent: %s)",
-                                len(plans_by_date),
-                                most_recent_date
-                            )
-                        else:
-                            _LOGGER.warning("No timetables could be fetched")
-                            data["timetables"] = {}
-                            data["timetable"] = None
-                    else:
-                        _LOGGER.warning("No timetable files available")
-                        data["timetables"] = {}
-                        data["timetable"] = None
-                except Exception as err:
-                    _LOGGER.warning("Could not fetch timetables: %s", err)
-                    data["timetables"] = {}
-                    data["timetable"] = None
+    def _form_view(self, filename: str, plan: IndiwareMobilPlan) -> IndiwareMobilPlan:
+        """Return plan reduced to the selected form.
 
-            return data
+        The plan itself is shared with the other entries of the school and must
+        not be modified. Views are reused for as long as the plan doesn't change.
+        """
+        selected_form = self.entry.data.get(CONF_FORM)
+        if not selected_form:
+            return plan
 
-        except Exception as err:
-            _LOGGER.error("Error communicating with API: %s", err)
-            raise UpdateFailed(f"Error communicating with API: {err}") from err
+        cached = self._timetable_views.get(filename)
+        if cached is not None and cached[0] is plan:
+            return cached[1]
+
+        view = copy.copy(plan)
+        view.forms = [
+            form for form in plan.forms
+            if form.short_name == selected_form
+        ]
+        self._timetable_views[filename] = (plan, view)
+
+        return view
+
+    def _week_indexes(self, plans_by_date: dict) -> tuple[WeekTimetable, LessonIndex]:
+        """Return the indexes of the plans, rebuilt only when one changed.
+
+        These are the columnar timetable and the lessons by start time, both of
+        the selected form only. Queries about the whole school, like whether a
+        room is free, are left to entries without a form.
+        """
+        views = tuple(plans_by_date.values())
+        if self._week is not None and len(self._week[0]) == len(views) and all(
+            cached is view for cached, view in zip(self._week[0], views)
+        ):
+            return self._week[1], self._week[2]
+
+        selected_form = self.entry.data.get(CONF_FORM) or None
+        week = WeekTimetable.from_plans(views, (selected_form,) if selected_form else None)
+        lessons = LessonIndex.from_plans(views, selected_form)
+        self._week = (views, week, lessons)
+        return week, lessons
+
+    @property
+    def _request_options(self) -> dict[str, Any]:
+        """Return the options of the entry that apply to the plan store."""
+        return {
+            "max_parallel_requests": self.entry.options.get(
+                CONF_MAX_PARALLEL_REQUESTS, DEFAULT_MAX_PARALLEL_REQUESTS
+            ),
+            "incremental_refresh": self.entry.options.get(
+                CONF_INCREMENTAL_REFRESH, DEFAULT_INCREMENTAL_REFRESH
+            ),
+        }
+
+    @property
+    def _school_key(self) -> SchoolKey:
+        """Return the key of the shared plan store in the registry."""
+        return (self.school_url, self.username, self.password)
 
     async def async_shutdown(self) -> None:
         """Shutdown the coordinator."""
         if self.client:
-            await self.client.close()
-            _LOGGER.debug("Stundenplan24 client closed")
+            if self._unsubscribe_store is not None:
+                self._unsubscribe_store()
+                self._unsubscribe_store = None
+            # The store and its client are closed once no other entry uses them
+            self.client = None
+            self.store = None
+            await async_get_plan_store_registry(self.hass).async_release(self._school_key)
+            _LOGGER.debug("Stundenplan24 client released")
+
+
+def _fingerprint(plans: SchoolPlans, today: date) -> tuple | None:
+    """Return what identifies the content of plans, None if a digest is unknown.
+
+    Data built on another day differs even for the same plans, so the day is
+    part of the fingerprint.
+    """
+    fingerprint: list[Any] = [today]
+    for stage in (plans.substitutions, plans.timetables):
+        if stage is None:
+            fingerprint.append(None)
+            continue
+        keys = []
+        for key, plan in sorted(stage.items(), key=lambda item: str(item[0])):
+            digest = plans.digests.get(key) if plan is not None else None
+            if plan is not None and digest is None:
+                return None
+            keys.append((key, digest))
+        fingerprint.append(tuple(keys))
+    fingerprint.append(tuple(sorted((plans.timetable_errors or {}).items())))
+    return tuple(fingerprint)
+
+
+def _plans_by_date(plans: Iterable[Any]) -> dict[date, Any]:
+    return {plan.date: plan for plan in plans if plan is not None}
+
+
+def _event_value(value: Any) -> Any:
+    """Return a plan attribute in a form that can go into event data."""
+    if isinstance(value, Value):
+        return value.content
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def _row_change_data(row: RowChange) -> dict[str, Any]:
+    """Return the event data of a changed lesson or substitution."""
+    current = row.new if row.new is not None else row.old
+    data = {
+        "change": row.change,
+        "form": row.form,
+        "period": row.period,
+        "fields": list(row.fields),
+        "subject": _event_value(current.subject),
+        "teacher": _event_value(current.teacher),
+        "room": _event_value(current.room),
+    }
+    if row.change == CHANGED:
+        data["previous"] = {field: _event_value(getattr(row.old, field)) for field in row.fields}
+    return data
@@ -0,0 +1,219 @@
+"""On-disk copy of the plan responses of a school for Stundenplan24.
+
+After a restart of Home Assistant the plan store starts from the responses of
+the last run instead of downloading the whole week before any entity is
+available. The first refresh then only revalidates them with the stored
+Last-Modified/ETag validators and vpdir timestamps.
+
+Next to the raw XML of each response a binary snapshot of the parsed plan is
+kept, which loads without parsing the XML again.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+import contextlib
+import dataclasses
+from datetime import date, datetime
+import hashlib
+import json
+import logging
+import mmap
+import pathlib
+import shutil
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import DOMAIN
+from .pipifax_io.cache import FileSystemCache
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump when the layout of the index changes; older caches are ignored then
+_INDEX_VERSION = 1
+_INDEX_KEY = "index.json"
+_TIMETABLES = "timetables"
+_SUBSTITUTIONS = "substitutions"
+_SNAPSHOT_SUFFIX = ".snap"
+
+
+def cache_root(hass: HomeAssistant) -> pathlib.Path:
+    """Return the directory the caches of all schools live in."""
+    return pathlib.Path(hass.config.path(STORAGE_DIR, DOMAIN))
+
+
+@dataclasses.dataclass(frozen=True)
+class StoredResponse:
+    """The raw content of a plan response together with its validators."""
+
+    content: str | None
+    last_modified: datetime | None
+    etag: str | None
+    # Modification time of the file in the vpdir listing, timetables only
+    listed_modified: datetime | None = None
+    # Binary snapshot of the parsed plan, written along with the content
+    snapshot: bytes | None = None
+    # Digest of the content
+    digest: str | None = None
+
+
+def _datetime_to_json(value: Any) -> str | None:
+    return value.isoformat() if isinstance(value, datetime) else None
+
+
+def _datetime_from_json(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _meta_to_json(response: StoredResponse) -> dict[str, Any]:
+    return {
+        "last_modified": _datetime_to_json(response.last_modified),
+        "etag": response.etag if isinstance(response.etag, str) else None,
+        "listed_modified": _datetime_to_json(response.listed_modified),
+        "digest": response.digest,
+    }
+
+
+def _response_from_json(meta: dict[str, Any]) -> StoredResponse:
+    return StoredResponse(
+        None,
+        _datetime_from_json(meta["last_modified"]),
+        meta["etag"],
+        _datetime_from_json(meta["listed_modified"]),
+        digest=meta.get("digest"),
+    )
+
+
+def _is_plain_filename(filename: str) -> bool:
+    """Return whether a filename from the server is safe to use as a cache key."""
+    return bool(filename) and "/" not in filename and "\\" not in filename and not filename.startswith(".")
+
+
+def _content_key(key: str | date) -> str:
+    """Return the file of a timetable (by filename) or substitution plan (by day)."""
+    if isinstance(key, date):
+        return f"{_SUBSTITUTIONS}/{key.isoformat()}.xml"
+    return f"{_TIMETABLES}/{key}"
+
+
+class PlanDiskCache:
+    """Raw plan responses of one school, stored on disk.
+
+    Timetables are keyed by filename and substitution plans by day. The
+    validators of all responses live in one index file, the contents and
+    snapshots in one file each. All methods do blocking I/O and belong in the
+    executor.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        """Initialize the cache."""
+        self._files = FileSystemCache(path)
+
+    @classmethod
+    def for_school(cls, hass: HomeAssistant, school_url: str, username: str) -> PlanDiskCache:
+        """Return the cache of a school, keeping the credentials out of the path."""
+        digest = hashlib.sha256(f"{school_url}\0{username}".encode()).hexdigest()[:16]
+        return cls(cache_root(hass) / digest)
+
+    def remove(self) -> None:
+        """Delete the cache with all stored responses."""
+        shutil.rmtree(self._files.file_path, ignore_errors=True)
+
+    def load(self) -> tuple[dict[str, StoredResponse], dict[date, StoredResponse]]:
+        """Return the validators of the stored timetables and substitution plans.
+
+        The contents are not read, see read_content and open_snapshot. A
+        missing, outdated or broken index is treated as an empty cache.
+        """
+        try:
+            index = json.loads(self._files.lookup(_INDEX_KEY))
+            if index.get("version") != _INDEX_VERSION:
+                return {}, {}
+
+            return (
+                {
+                    filename: _response_from_json(meta)
+                    for filename, meta in index[_TIMETABLES].items()
+                    if _is_plain_filename(filename)
+                },
+                {
+                    date.fromisoformat(day): _response_from_json(meta)
+                    for day, meta in index[_SUBSTITUTIONS].items()
+                },
+            )
+        except FileNotFoundError:
+            return {}, {}
+        except (ValueError, KeyError, TypeError, AttributeError) as err:
+            _LOGGER.warning("Ignoring broken plan cache in %s: %s", self._files.file_path, err)
+            return {}, {}
+
+    def read_content(self, key: str | date) -> str | None:
+        """Return the stored content of a response, None if it is gone."""
+        try:
+            return self._files.lookup(_content_key(key)).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    @contextlib.contextmanager
+    def open_snapshot(self, key: str | date) -> Iterator[mmap.mmap | None]:
+        """Map the snapshot of a response into memory, None if there is none."""
+        path = self._files.file_path / (_content_key(key) + _SNAPSHOT_SUFFIX)
+        try:
+            file = path.open("rb")
+        except FileNotFoundError:
+            yield None
+            return
+
+        with file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                yield None
+                return
+            with buffer:
+                yield buffer
+
+    def save(
+        self,
+        timetables: dict[str, StoredResponse],
+        substitutions: dict[date, StoredResponse],
+    ) -> None:
+        """Replace the cache with the given responses.
+
+        Responses without content or snapshot keep the files stored before;
+        files of responses that are not given any more are removed.
+        """
+        timetables = {
+            filename: response for filename, response in timetables.items()
+            if _is_plain_filename(filename)
+        }
+
+        keep = set()
+        for key, response in (*timetables.items(), *substitutions.items()):
+            content_key = _content_key(key)
+            keep |= {content_key, content_key + _SNAPSHOT_SUFFIX}
+            if response.content is not None:
+                self._files.store(content_key, response.content.encode("utf-8"))
+            if response.snapshot is not None:
+                self._files.store(content_key + _SNAPSHOT_SUFFIX, response.snapshot)
+
+        # The index is written last, so it never refers to a file not written yet
+        self._files.store(_INDEX_KEY, json.dumps({
+            "version": _INDEX_VERSION,
+            _TIMETABLES: {
+                filename: _meta_to_json(response) for filename, response in timetables.items()
+            },
+            _SUBSTITUTIONS: {
+                day.isoformat(): _meta_to_json(response) for day, response in substitutions.items()
+            },
+        }).encode("utf-8"))
+
+        for directory in (_TIMETABLES, _SUBSTITUTIONS):
+            path = self._files.file_path / directory
+            if not path.is_dir():
+                continue
+            for file in path.iterdir():
+                if f"{directory}/{file.name}" not in keep:
+                    self._files.delete(f"{directory}/{file.name}")
@@ -0,0 +1,849 @@
+"""Per-school plan store for Stundenplan24.
+
+Every plan file of a school contains all of its forms, so config entries for
+the same school would otherwise download and parse the very same files. The
+store does that once per school and hands the parsed plans to every
+coordinator subscribed to it; the coordinators derive the view for their form.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+import dataclasses
+from datetime import date, datetime
+import functools
+import hashlib
+import logging
+import time
+from typing import Any, TypeVar
+import xml.etree.ElementTree as ET
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .plan_cache import PlanDiskCache, StoredResponse
+from .stundenplan24_py.client import (
+    IndiwareMobilClient,
+    IndiwareStundenplanerClient,
+    PlanResponse,
+    SubstitutionPlanClient,
+)
+from .stundenplan24_py import xml_backend
+from .stundenplan24_py.errors import NotModifiedError, PlanClientError, PlanNotFoundError
+from .stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from .stundenplan24_py.school_days import DEFAULT_DAYS_PER_WEEK, next_school_days
+from .stundenplan24_py.snapshot import (
+    SnapshotError,
+    TimetableSnapshot,
+    dump_substitution_plan,
+    dump_timetable,
+    load_substitution_plan,
+)
+from .stundenplan24_py.substitution_plan import SubstitutionPlan
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# Plans refreshed for one subscriber are handed to a subscriber that hasn't
+# seen them yet without another round trip, as long as they are this fresh
+# (seconds). Covers several entries of a school being set up one after another.
+_SHARE_WINDOW = 60
+
+# Substitution plans are fetched for this many school days, today included if
+# it is one
+_SUBSTITUTION_DAYS = 2
+
+StoreListener = Callable[["SchoolPlans"], None]
+
+
+@dataclasses.dataclass
+class _CachedPlan:
+    """A parsed plan together with the validators of the response it came from."""
+
+    plan: Any
+    last_modified: datetime | None
+    etag: str | None
+    # Modification time of the file as last seen in the vpdir listing
+    listed_modified: datetime | None = None
+    # Forms a plan was parsed for, None for all forms
+    forms: frozenset[str] | None = None
+    # Raw content of a fresh response, until it is written to the disk cache
+    content: str | None = None
+    # Digest of the raw content the plan was parsed from, if known
+    digest: str | None = None
+
+    def to_stored(self, dump: Callable[[_CachedPlan], bytes]) -> StoredResponse:
+        """Return what the disk cache keeps of this plan, with a snapshot if fresh."""
+        return StoredResponse(
+            self.content,
+            self.last_modified,
+            self.etag,
+            self.listed_modified,
+            dump(self) if self.content is not None else None,
+            self.digest,
+        )
+
+    @property
+    def validators(self) -> dict[str, Any]:
+        """Return the conditional request arguments for fetch_plan."""
+        validators = {}
+        if self.last_modified is not None:
+            validators["if_modified_since"] = self.last_modified
+        if self.etag is not None:
+            validators["if_none_match"] = self.etag
+        return validators
+
+
+@dataclasses.dataclass
+class SchoolPlans:
+    """The plans of a whole school as of one refresh."""
+
+    # Parsed timetables by filename, most recent file first. None if the
+    # school has no Indiware Mobil endpoint.
+    timetables: dict[str, IndiwareMobilPlan] | None = None
+    # Error message by filename for timetables that could not be fetched
+    timetable_errors: dict[str, str] = dataclasses.field(default_factory=dict)
+    # Substitution plans of the next school days by day, None for days that
+    # could not be fetched. None if the school has no substitution plan endpoint.
+    substitutions: dict[date, SubstitutionPlan | None] | None = None
+    # Forms the timetables and substitution plans contain at least, None for
+    # all forms
+    forms: frozenset[str] | None = None
+    # Digest of the raw content of each plan above, by filename or day. Equal
+    # digests mean equal plans; None means unknown.
+    digests: dict[str | date, str | None] = dataclasses.field(default_factory=dict)
+
+
+def content_digest(content: str | bytes) -> str:
+    """Return the digest identifying the raw content of a plan response."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def _covers(parsed: frozenset[str] | None, wanted: frozenset[str] | None) -> bool:
+    """Return whether plans parsed for the forms parsed contain the forms wanted."""
+    if parsed is None:
+        return True
+    return wanted is not None and wanted <= parsed
+
+
+def _check_xml(content: str | bytes) -> None:
+    """Reject plan responses that are obviously not XML."""
+    # Basic validation: check if content looks like XML
+    # Remove BOM and whitespace, then check for XML start
+    if isinstance(content, bytes):
+        # Remove BOM for bytes
+        stripped = content.lstrip(b'\xef\xbb\xbf').strip()
+        if not stripped or not stripped.startswith(b'<'):
+            raise ValueError(f"Response is not XML (bytes): {repr(content[:100])}")
+    else:
+        # Remove BOM for string (UTF-8 BOM is \ufeff)
+        stripped = content.lstrip('\ufeff').strip()
+        if not stripped or not stripped.startswith('<'):
+            raise ValueError(f"Response is not XML (string): {repr(content[:100])}")
+
+
+class SchoolPlanStore:
+    """Download and parse the plans of one school for all its subscribers.
+
+    A refresh requested while another one is running joins it instead of
+    starting a second one. When a refresh completes, subscribers that didn't
+    ask for it receive the new plans through their listener.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: IndiwareStundenplanerClient,
+        *,
+        max_parallel_requests: int,
+        incremental_refresh: bool,
+        disk_cache: PlanDiskCache | None = None,
+    ) -> None:
+        """Initialize the store."""
+        self.hass = hass
+        self.client = client
+        self._disk_cache = disk_cache
+
+        # Parsed plans and their Last-Modified/ETag validators, keyed by filename
+        # for timetables and by date for substitution plans. A refresh sends the
+        # validators along and reuses the parsed plan when the server answers 304.
+        self._timetable_cache: dict[str, _CachedPlan] = {}
+        self._substitution_cache: dict[date, _CachedPlan] = {}
+
+        # Skip downloading plan files whose vpdir timestamp didn't change
+        self._incremental_refresh = incremental_refresh
+
+        # Bounds how many plan downloads run at the same time during a refresh
+        self._max_parallel_requests = max_parallel_requests
+        self._request_semaphore = asyncio.Semaphore(max_parallel_requests)
+
+        self._listeners: dict[object, StoreListener] = {}
+        # Form each subscriber is interested in, None for all forms
+        self._subscriber_forms: dict[object, str | None] = {}
+        self._pending: asyncio.Task[SchoolPlans] | None = None
+        self._pending_waiters: set[object] = set()
+
+        # Most recent plans, when they were fetched and who has them already
+        self._plans: SchoolPlans | None = None
+        self._plans_fetched = 0.0
+        self._plans_delivered: set[object] = set()
+
+        # Plans of the last run read back from the disk cache, read only once
+        self._load_lock = asyncio.Lock()
+        self._disk_loaded = False
+        self._disk_plans: SchoolPlans | None = None
+        # Validators as last written to the disk cache
+        self._saved_index: tuple[dict, dict] | None = None
+
+        # Which days are school days, as far as the plans told so far. Decides
+        # the days substitution plans are fetched for.
+        self._free_days: frozenset[date] = frozenset()
+        self._days_per_week = DEFAULT_DAYS_PER_WEEK
+
+        # Days the server had no substitution plan for at the last refresh
+        self._missing_substitution_days: frozenset[date] = frozenset()
+        # Last-Modified and ETag of the current substitution plan when last
+        # checked; they change whenever the school publishes a plan
+        self._published: tuple[datetime | None, str | None] | None = None
+
+    @callback
+    def update_options(self, *, max_parallel_requests: int, incremental_refresh: bool) -> None:
+        """Apply changed request options, from the next request on."""
+        self._incremental_refresh = incremental_refresh
+        if max_parallel_requests != self._max_parallel_requests:
+            # Requests holding a slot of the old semaphore release it there
+            self._max_parallel_requests = max_parallel_requests
+            self._request_semaphore = asyncio.Semaphore(max_parallel_requests)
+
+    @callback
+    def async_subscribe(
+        self, subscriber: object, listener: StoreListener, form: str | None = None
+    ) -> CALLBACK_TYPE:
+        """Call listener with the plans of refreshes requested by other subscribers.
+
+        Plans are only parsed for the forms the subscribers are interested in;
+        form=None subscribes to all forms of the school.
+        """
+        self._listeners[subscriber] = listener
+        self._subscriber_forms[subscriber] = form
+
+        @callback
+        def unsubscribe() -> None:
+            self._listeners.pop(subscriber, None)
+            self._subscriber_forms.pop(subscriber, None)
+
+        return unsubscribe
+
+    @property
+    def _wanted_forms(self) -> frozenset[str] | None:
+        """Return the forms any subscriber is interested in, None for all."""
+        if None in self._subscriber_forms.values():
+            return None
+        return frozenset(self._subscriber_forms.values())
+
+    async def async_load_cached(self) -> SchoolPlans | None:
+        """Return the plans of the last run as stored on disk.
+
+        Returns None without a disk cache, when nothing was stored, once plans
+        were fetched from the server, and if the stored plans lack a form some
+        subscriber is interested in.
+        """
+        if self._disk_cache is None:
+            return None
+
+        async with self._load_lock:
+            if not self._disk_loaded:
+                self._disk_loaded = True
+                self._disk_plans = await self._async_load_from_disk()
+
+        plans = self._disk_plans
+        if plans is None or self._plans is not None or not _covers(plans.forms, self._wanted_forms):
+            return None
+
+        return plans
+
+    async def _async_load_from_disk(self) -> SchoolPlans | None:
+        """Parse the stored responses and take them over as cached plans."""
+        forms = self._wanted_forms
+        timetable_cache, substitution_cache = await self.hass.async_add_executor_job(
+            _load_disk_cache, self._disk_cache, forms
+        )
+        if not timetable_cache and not substitution_cache:
+            return None
+
+        # The validators come along, so the first refresh only revalidates
+        self._timetable_cache = timetable_cache
+        self._substitution_cache = substitution_cache
+        self._saved_index = self._disk_index()
+
+        plans = SchoolPlans(forms=forms)
+        plans.digests = {
+            key: cached.digest
+            for cache in (timetable_cache, substitution_cache)
+            for key, cached in cache.items()
+        }
+        if timetable_cache:
+            plans.timetables = {
+                filename: cached.plan
+                for filename, cached in sorted(
+                    timetable_cache.items(),
+                    key=lambda item: item[1].listed_modified or datetime.min,
+                    reverse=True,
+                )
+            }
+        self._update_school_days(
+            (plans.timetables or {}).values(),
+            (cached.plan for cached in substitution_cache.values()),
+        )
+        if substitution_cache:
+            plans.substitutions = {
+                day: cached.plan if (cached := substitution_cache.get(day)) is not None else None
+                for day in self._substitution_days()
+            }
+
+        _LOGGER.debug(
+            "Loaded %d timetable(s) and %d substitution plan(s) from disk",
+            len(timetable_cache),
+            len(substitution_cache),
+        )
+
+        return plans
+
+    async def _async_save_to_disk(self) -> None:
+        """Write fresh responses and changed validators to the disk cache."""
+        if self._disk_cache is None:
+            return
+
+        index = self._disk_index()
+        caches = (*self._timetable_cache.values(), *self._substitution_cache.values())
+        if index == self._saved_index and all(cached.content is None for cached in caches):
+            return
+
+        try:
+            await self.hass.async_add_executor_job(
+                _save_disk_cache,
+                self._disk_cache,
+                dict(self._timetable_cache),
+                dict(self._substitution_cache),
+            )
+        except OSError as err:
+            _LOGGER.warning("Could not write plans to the disk cache: %s", err)
+            return
+
+        self._saved_index = index
+        for cached in caches:
+            cached.content = None
+
+    def _disk_index(self) -> tuple[dict, dict]:
+        """Return the validators of the cached plans, to tell whether they changed."""
+        return tuple(
+            {
+                key: (cached.last_modified, cached.etag, cached.listed_modified)
+                for key, cached in cache.items()
+            }
+            for cache in (self._timetable_cache, self._substitution_cache)
+        )
+
+    async def async_refresh(self, subscriber: object) -> SchoolPlans:
+        """Refresh the plans of the school on behalf of subscriber."""
+        pending = self._pending
+        if pending is not None and not pending.done():
+            _LOGGER.debug("Joining plan refresh already in progress")
+            self._pending_waiters.add(subscriber)
+        elif (
+            self._plans is not None
+            and subscriber not in self._plans_delivered
+            and time.monotonic() - self._plans_fetched < _SHARE_WINDOW
+            and _covers(self._plans.forms, self._wanted_forms)
+        ):
+            _LOGGER.debug("Handing out plans fetched for another entry")
+            self._plans_delivered.add(subscriber)
+            return self._plans
+        else:
+            self._pending_waiters = {subscriber}
+            pending = self._pending = self.hass.async_create_background_task(
+                self._async_refresh_and_notify(),
+                "stundenplan24 plan refresh",
+                eager_start=False,
+            )
+
+        # Shielded, as cancelling one subscriber must not cancel the others
+        return await asyncio.shield(pending)
+
+    async def _async_refresh_and_notify(self) -> SchoolPlans:
+        """Refresh the plans and pass them on to the subscribers not waiting for them."""
+        plans = await self._async_fetch_plans()
+
+        waiters = self._pending_waiters
+        self._plans = plans
+        self._plans_fetched = time.monotonic()
+        self._plans_delivered = waiters | self._listeners.keys()
+
+        for subscriber, listener in list(self._listeners.items()):
+            if subscriber not in waiters:
+                listener(plans)
+
+        return plans
+
+    async def async_close(self) -> None:
+        """Close the client of the store."""
+        await self.client.close()
+
+    async def _async_limited(
+        self,
+        func: Callable[..., Awaitable[_T]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> _T:
+        """Await a request while holding one of the parallel request slots."""
+        async with self._request_semaphore:
+            return await func(*args, **kwargs)
+
+    async def _async_fetch_cached(
+        self,
+        cache: dict[Any, _CachedPlan],
+        key: Any,
+        fetch: Callable[..., Awaitable[PlanResponse]],
+        parse: Callable[[str | bytes], Any],
+        **fetch_kwargs: Any,
+    ) -> Any:
+        """Fetch and parse a plan, revalidating the cached copy if there is one."""
+        cached = cache.get(key)
+        validators = cached.validators if cached is not None else {}
+
+        try:
+            response = await self._async_limited(fetch, **fetch_kwargs, **validators)
+        except NotModifiedError:
+            _LOGGER.debug("%s not modified, reusing parsed plan", key)
+            return cached.plan
+
+        digest = content_digest(response.content)
+        if cached is not None and cached.digest == digest:
+            # Downloaded again, but the very same content
+            _LOGGER.debug("%s unchanged, reusing parsed plan", key)
+            cached.last_modified = response.last_modified
+            cached.etag = response.etag
+            return cached.plan
+
+        plan = parse(response.content)
+        cache[key] = _CachedPlan(
+            plan,
+            response.last_modified,
+            response.etag,
+            content=response.content if self._disk_cache is not None else None,
+            digest=digest,
+        )
+
+        return plan
+
+    async def _async_fetch_plans(self) -> SchoolPlans:
+        """Fetch substitution plans and timetables of the school."""
+        # Convert filter objects to lists
+        mobil_clients = list(self.client.indiware_mobil_clients)
+        substitution_clients = list(self.client.substitution_plan_clients)
+
+        # Substitution plans and timetables don't depend on each other,
+        # so both stages run side by side. Each stage handles its own errors.
+        plans = SchoolPlans(forms=self._wanted_forms)
+        await asyncio.gather(
+            self._async_fetch_substitution_plans(plans, substitution_clients),
+            self._async_fetch_timetables(plans, mobil_clients),
+        )
+        self._update_school_days(
+            (plans.timetables or {}).values(), (plans.substitutions or {}).values()
+        )
+        await self._async_save_to_disk()
+
+        return plans
+
+    def _update_school_days(
+        self,
+        timetables: Iterable[IndiwareMobilPlan],
+        substitutions: Iterable[SubstitutionPlan | None],
+    ) -> None:
+        """Take over the free days and days per week the plans announce."""
+        timetables = list(timetables)
+        substitutions = [plan for plan in substitutions if plan is not None]
+        if not timetables and not substitutions:
+            # Keep what earlier plans told
+            return
+
+        self._free_days = frozenset(
+            day for plan in (*timetables, *substitutions) for day in plan.free_days or ()
+        )
+        # Timetables are sorted most recent first
+        days_per_week = timetables[0].days_per_week if timetables else None
+        if days_per_week and 1 <= days_per_week <= 7:
+            self._days_per_week = days_per_week
+
+    def _substitution_days(self) -> list[date]:
+        """Return the school days substitution plans are fetched for."""
+        return next_school_days(
+            dt_util.now().date(), _SUBSTITUTION_DAYS, self._free_days, self._days_per_week
+        )
+
+    async def _async_fetch_substitution_plans(
+        self, plans: SchoolPlans, substitution_clients: list[SubstitutionPlanClient]
+    ) -> None:
+        """Fetch the substitution plans of the next school days (student view).
+
+        Weekends and free days are skipped without a request, as there is no
+        plan for them. Which days these are is known from the plans of the
+        previous refresh; before the first one, Monday to Friday are taken.
+        """
+        if not substitution_clients:
+            return
+
+        days = self._substitution_days()
+        await self._async_recheck_missing(substitution_clients[0], days)
+
+        _LOGGER.debug("Fetching substitution plans for %s", ", ".join(map(str, days)))
+
+        results = await asyncio.gather(
+            *(
+                self._async_fetch_substitution_plan(substitution_clients[0], day, plans.forms)
+                for day in days
+            ),
+            return_exceptions=True,
+        )
+
+        # Forget plans of days that are no longer requested
+        self._substitution_cache = {
+            day: cached for day, cached in self._substitution_cache.items()
+            if day in days
+        }
+
+        self._missing_substitution_days = frozenset(
+            day for day, result in zip(days, results) if isinstance(result, PlanNotFoundError)
+        )
+
+        plans.substitutions = {}
+        for day, result in zip(days, results):
+            if isinstance(result, PlanNotFoundError):
+                # Not published yet; the client asks again less and less often
+                _LOGGER.debug("No substitution plan for %s yet: %s", day, result)
+                plans.substitutions[day] = None
+            elif isinstance(result, Exception):
+                _LOGGER.warning("Could not fetch substitution plan for %s: %s", day, result)
+                plans.substitutions[day] = None
+            else:
+                plans.substitutions[day] = result
+                plans.digests[day] = self._substitution_cache[day].digest
+                _LOGGER.debug(
+                    "Fetched substitution plan for %s: %s",
+                    day,
+                    result.date if result else None
+                )
+
+    async def _async_recheck_missing(self, client: SubstitutionPlanClient, days: list[date]) -> None:
+        """Ask for missing substitution plans again once the school published a plan.
+
+        The client asks for plans the server doesn't have less and less often.
+        The current plan changes with every plan the school publishes, so a
+        HEAD request on it tells when the missing ones are worth asking for
+        before their time.
+        """
+        client.not_found_cache.prune(dt_util.now().date())
+
+        missing = [day for day in days if day in self._missing_substitution_days]
+        if not missing or client.get_url() in client.not_found_cache:
+            return
+
+        try:
+            published = await self._async_limited(client.get_metadata)
+        except PlanClientError as err:
+            _LOGGER.debug("Could not check for newly published substitution plans: %s", err)
+            return
+
+        if self._published is not None and published != self._published:
+            _LOGGER.debug("Substitution plan published, asking for %s again", ", ".join(map(str, missing)))
+            for day in missing:
+                client.not_found_cache.discard(client.get_url(day))
+        self._published = published
+
+    async def _async_fetch_substitution_plan(
+        self,
+        client: SubstitutionPlanClient,
+        day: date,
+        forms: frozenset[str] | None,
+    ) -> SubstitutionPlan:
+        """Download and parse the substitution plan of a day, keeping the actions of forms."""
+        cached = self._substitution_cache.get(day)
+        if cached is not None and not _covers(cached.forms, forms):
+            # Only the actions of the forms parsed for are kept
+            del self._substitution_cache[day]
+            cached = None
+
+        plan = await self._async_fetch_cached(
+            self._substitution_cache,
+            day,
+            client.fetch_plan,
+            functools.partial(_parse_substitution_plan, forms=forms),
+            date_or_filename=day,
+        )
+        if self._substitution_cache[day] is not cached:
+            # Freshly parsed rather than revalidated
+            self._substitution_cache[day].forms = forms
+
+        return plan
+
+    async def _async_fetch_timetables(
+        self, plans: SchoolPlans, mobil_clients: list[IndiwareMobilClient]
+    ) -> None:
+        """Fetch the Indiware Mobil plans (timetable).
+
+        Each plan contains ALL forms/classes for a specific day.
+        We fetch multiple days to provide better calendar coverage.
+        """
+        if not mobil_clients:
+            return
+
+        plans.timetables = {}
+
+        try:
+            # Get available dates first
+            available_dates = await self._async_limited(mobil_clients[0].fetch_dates)
+
+            if not available_dates:
+                _LOGGER.warning("No timetable files available")
+                return
+
+            # Fetch plans for up to 7 days (for weekly calendar view)
+            # Each plan file contains all forms, so we only fetch once per day
+
+            # Sort files by date (most recent first) and get up to 7
+            # available_dates is a dict: {filename: last_modified_datetime}
+            # Filter out generic files like Klassen.xml that may duplicate dated plans
+            specific_plan_files = [
+                f for f in available_dates.keys()
+                if f.startswith('PlanKl') and f.endswith('.xml')
+            ]
+
+            sorted_files = sorted(
+                specific_plan_files,
+                key=lambda f: available_dates[f],
+                reverse=True  # Most recent first
+            )
+            files_to_fetch = sorted_files[:7]
+
+            _LOGGER.debug(
+                "Available plan files from API (%d total): %s",
+                len(available_dates),
+                list(available_dates.keys())
+            )
+            _LOGGER.debug(
+                "Sorted by date (most recent first), fetching first 7: %s",
+                files_to_fetch
+            )
+
+            # Download all files concurrently. Results come back in the order of
+            # files_to_fetch, so duplicate dates resolve the same way as before.
+            results = await asyncio.gather(
+                *(
+                    self._async_fetch_timetable(
+                        mobil_clients[0], filename, available_dates[filename], plans.forms
+                    )
+                    for filename in files_to_fetch
+                ),
+                return_exceptions=True,
+            )
+
+            # Forget plans of files that dropped out of the window
+            self._timetable_cache = {
+                filename: cached for filename, cached in self._timetable_cache.items()
+                if filename in files_to_fetch
+            }
+
+            for filename, result in zip(files_to_fetch, results):
+                if isinstance(result, ET.ParseError):
+                    plans.timetable_errors[filename] = f"XML parse error: {result}"
+                    _LOGGER.error("Failed to parse XML for %s: %s", filename, result)
+                    continue
+                if isinstance(result, ValueError):
+                    plans.timetable_errors[filename] = str(result)
+                    _LOGGER.error("Invalid content for %s: %s", filename, result)
+                    continue
+                if isinstance(result, Exception):
+                    plans.timetable_errors[filename] = str(result)
+                    _LOGGER.warning(
+                        "Could not fetch plan %s: %s",
+                        filename,
+                        result
+                    )
+                    continue
+
+                plans.timetables[filename] = result
+                plans.digests[filename] = self._timetable_cache[filename].digest
+
+                _LOGGER.debug(
+                    "Fetched plan for %s (from %s) with %d form(s)",
+                    result.date,
+                    filename,
+                    len(result.forms)
+                )
+
+            if plans.timetable_errors:
+                _LOGGER.info(
+                    "Fetched %d of %d timetables successfully, %d errors",
+                    len(plans.timetables),
+                    len(files_to_fetch),
+                    len(plans.timetable_errors)
+                )
+        except Exception as err:
+            _LOGGER.warning("Could not fetch timetables: %s", err)
+            plans.timetables = {}
+            plans.timetable_errors = {}
+
+    async def _async_fetch_timetable(
+        self,
+        client: IndiwareMobilClient,
+        filename: str,
+        listed_modified: datetime,
+        forms: frozenset[str] | None,
+    ) -> IndiwareMobilPlan:
+        """Download and parse a single plan file, keeping only the given forms.
+
+        In incremental mode the vpdir listing decides: a file whose modification
+        time matches the one seen last refresh is served from the cache without
+        any request at all.
+        """
+        cached = self._timetable_cache.get(filename)
+        if cached is not None and not _covers(cached.forms, forms):
+            # Parsed before a subscriber for another form came along. The plan
+            # has to be downloaded again, as only the parsed forms are kept.
+            del self._timetable_cache[filename]
+            cached = None
+
+        if (
+            self._incremental_refresh
+            and cached is not None
+            and cached.listed_modified == listed_modified
+        ):
+            _LOGGER.debug("Plan %s unchanged since %s, skipping download", filename, listed_modified)
+            return cached.plan
+
+        plan = await self._async_fetch_cached(
+            self._timetable_cache,
+            filename,
+            client.fetch_plan,
+            functools.partial(_parse_timetable, forms=forms),
+            date_or_filename=filename,
+        )
+        if self._timetable_cache[filename] is not cached:
+            # Freshly parsed rather than revalidated
+            self._timetable_cache[filename].forms = forms
+        self._timetable_cache[filename].listed_modified = listed_modified
+
+        return plan
+
+
+def _load_disk_cache(
+    disk_cache: PlanDiskCache, forms: frozenset[str] | None
+) -> tuple[dict[str, _CachedPlan], dict[date, _CachedPlan]]:
+    """Load the stored plans, skipping those that fail to load."""
+    stored_timetables, stored_substitutions = disk_cache.load()
+    timetable_cache = {}
+    substitution_cache = {}
+
+    for cache, stored, load in (
+        (timetable_cache, stored_timetables, functools.partial(_load_timetable, forms=forms)),
+        (
+            substitution_cache,
+            stored_substitutions,
+            functools.partial(_load_substitution_plan, forms=forms),
+        ),
+    ):
+        for key, response in stored.items():
+            try:
+                plan, content = load(disk_cache, key)
+            except Exception as err:
+                _LOGGER.debug("Ignoring cached plan %s: %s", key, err)
+                continue
+            # Plans parsed from their content get a new snapshot with the next save
+            cache[key] = _CachedPlan(
+                plan,
+                response.last_modified,
+                response.etag,
+                response.listed_modified,
+                forms,
+                content,
+                response.digest,
+            )
+
+    return timetable_cache, substitution_cache
+
+
+def _load_timetable(
+    disk_cache: PlanDiskCache, filename: str, forms: frozenset[str] | None
+) -> tuple[IndiwareMobilPlan, str | None]:
+    """Load a stored timetable from its snapshot, or else parse its content.
+
+    Returns the content along with the plan if it had to be parsed.
+    """
+    with disk_cache.open_snapshot(filename) as buffer:
+        if buffer is not None:
+            try:
+                with TimetableSnapshot(buffer) as snapshot:
+                    if _covers(snapshot.parsed_forms, forms):
+                        return snapshot.materialize(forms), None
+            except SnapshotError as err:
+                _LOGGER.debug("Ignoring snapshot of %s: %s", filename, err)
+
+    content = _read_content(disk_cache, filename)
+    return _parse_timetable(content, forms), content
+
+
+def _load_substitution_plan(
+    disk_cache: PlanDiskCache, day: date, forms: frozenset[str] | None
+) -> tuple[SubstitutionPlan, str | None]:
+    """Load a stored substitution plan from its snapshot, or else parse its content."""
+    with disk_cache.open_snapshot(day) as buffer:
+        if buffer is not None:
+            try:
+                if (plan := load_substitution_plan(buffer, forms)) is not None:
+                    return plan, None
+            except SnapshotError as err:
+                _LOGGER.debug("Ignoring snapshot of %s: %s", day, err)
+
+    content = _read_content(disk_cache, day)
+    return _parse_substitution_plan(content, forms), content
+
+
+def _read_content(disk_cache: PlanDiskCache, key: str | date) -> str:
+    content = disk_cache.read_content(key)
+    if content is None:
+        raise FileNotFoundError(f"No content stored for {key}")
+    return content
+
+
+def _save_disk_cache(
+    disk_cache: PlanDiskCache,
+    timetable_cache: dict[str, _CachedPlan],
+    substitution_cache: dict[date, _CachedPlan],
+) -> None:
+    """Write the cached plans, with new snapshots of freshly parsed ones."""
+    disk_cache.save(
+        {
+            key: cached.to_stored(lambda cached: dump_timetable(cached.plan, cached.forms))
+            for key, cached in timetable_cache.items()
+        },
+        {
+            key: cached.to_stored(lambda cached: dump_substitution_plan(cached.plan, cached.forms))
+            for key, cached in substitution_cache.items()
+        },
+    )
+
+
+def _parse_timetable(content: str | bytes, forms: frozenset[str] | None) -> IndiwareMobilPlan:
+    """Parse a plan file, skipping the forms nobody is interested in."""
+    _check_xml(content)
+    return IndiwareMobilPlan.from_xml_stream(content, forms)
+
+
+def _parse_substitution_plan(content: str | bytes, forms: frozenset[str] | None) -> SubstitutionPlan:
+    """Parse a substitution plan file, skipping the actions of forms nobody is interested in."""
+    _check_xml(content)
+    return SubstitutionPlan.from_xml(xml_backend.fromstring(content), forms)
@@ -0,0 +1,79 @@
+"""Shared, reference-counted per-school plan stores for Stundenplan24."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import dataclasses
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DATA_PLAN_STORES
+from .plan_store import SchoolPlanStore
+
+_LOGGER = logging.getLogger(__name__)
+
+# school URL, username, password
+SchoolKey = tuple[str, str, str]
+
+
+@dataclasses.dataclass
+class _RegistryEntry:
+    store: SchoolPlanStore
+    refs: int = 0
+
+
+class PlanStoreRegistry:
+    """Hand out one plan store (and thus one client) per school and credentials.
+
+    Config entries pointing at the same school with the same credentials share
+    the store, its parsed plans, its client and the client's open connections.
+    The client is closed when the last entry using the store releases it.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the registry."""
+        self._entries: dict[SchoolKey, _RegistryEntry] = {}
+
+    @callback
+    def acquire(
+        self,
+        key: SchoolKey,
+        factory: Callable[[], SchoolPlanStore],
+    ) -> SchoolPlanStore:
+        """Return the shared store for key, creating it with factory if needed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _RegistryEntry(factory())
+            _LOGGER.debug("Created plan store for %s", key[0])
+
+        entry.refs += 1
+        _LOGGER.debug("Plan store for %s now has %d user(s)", key[0], entry.refs)
+
+        return entry.store
+
+    async def async_release(self, key: SchoolKey) -> None:
+        """Drop one reference to the store for key, closing it with the last one."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+
+        entry.refs -= 1
+        if entry.refs > 0:
+            return
+
+        # Remove before closing, so a concurrent acquire gets a fresh store
+        del self._entries[key]
+        await entry.store.async_close()
+        _LOGGER.debug("Closed plan store for %s", key[0])
+
+    def __len__(self) -> int:
+        """Return the number of distinct stores."""
+        return len(self._entries)
+
+
+@callback
+def async_get_plan_store_registry(hass: HomeAssistant) -> PlanStoreRegistry:
+    """Return the plan store registry of this Home Assistant instance."""
+    if (registry := hass.data.get(DATA_PLAN_STORES)) is None:
+        registry = hass.data[DATA_PLAN_STORES] = PlanStoreRegistry()
+    return registry
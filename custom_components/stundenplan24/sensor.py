@@ -1,14 +1,17 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
+import abc
+from collections.abc import Mapping
 from datetime import datetime, date, time, timedelta
 import logging
 from typing import Any
 
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_point_in_time
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import dt as dt_util
 
@@ -18,9 +21,17 @@ from .const import (
     ATTR_SUBJECT,
     ATTR_SUBSTITUTIONS,
     ATTR_TEACHER,
+    CONF_FORM,
+    CONF_MAX_SUBSTITUTION_ROWS,
+    DEFAULT_MAX_SUBSTITUTION_ROWS,
     DOMAIN,
+    SENSOR_TYPE_CURRENT_LESSON,
+    SENSOR_TYPE_NEXT_LESSON,
 )
-from .coordinator import Stundenplan24Coordinator
+from .coordinator import KEY_TODAY, Stundenplan24Coordinator
+from .stundenplan24_py.lesson_index import LessonIndex, ScheduledLesson
+from .stundenplan24_py.substitution_plan import SubstitutionPlan
+from .substitutions import substitution_attributes, substitution_rows
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -42,6 +53,7 @@ async def async_setup_entry(
     sensors = [
         Stundenplan24SubstitutionsTodaySensor(coordinator),
         Stundenplan24SubstitutionsTomorrowSensor(coordinator),
+        Stundenplan24CurrentLessonSensor(coordinator),
         Stundenplan24NextLessonSensor(coordinator),
         Stundenplan24AdditionalInfoSensor(coordinator),
     ]
@@ -54,6 +66,10 @@ class Stundenplan24Sensor(CoordinatorEntity, SensorEntity):
 
     _attr_has_entity_name = True
 
+    # Data keys the state depends on; None for sensors that depend on the time
+    # of day as well and are written on every update
+    _data_keys: frozenset[str] | None = None
+
     def __init__(self, coordinator: Stundenplan24Coordinator, sensor_type: str) -> None:
         """Initialize the sensor."""
         super().__init__(coordinator)
@@ -67,223 +83,240 @@ class Stundenplan24Sensor(CoordinatorEntity, SensorEntity):
             "sw_version": "1.0",
         }
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if data the sensor shows changed."""
+        if self._data_keys is None or self.coordinator.data_changed(self._data_keys):
+            super()._handle_coordinator_update()
 
-class Stundenplan24SubstitutionsTodaySensor(Stundenplan24Sensor):
-    """Sensor for today's substitutions."""
 
-    def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
-        """Initialize the sensor."""
-        super().__init__(coordinator, "substitutions_today")
-        self._attr_name = "Vertretungen Heute"
-        self._attr_icon = "mdi:calendar-today"
+class Stundenplan24SubstitutionsSensor(Stundenplan24Sensor):
+    """Base class for the substitutions of one day."""
+
+    # Key of the substitution plan in the coordinator data
+    _plan_key: str
+
+    # Too bulky for the recorder; the full list is available through the websocket API
+    _unrecorded_attributes = frozenset({ATTR_SUBSTITUTIONS, "additional_info"})
+
+    @property
+    def _plan(self) -> SubstitutionPlan | None:
+        if not self.coordinator.data:
+            return None
+        return self.coordinator.data.get(self._plan_key)
+
+    @property
+    def _form(self) -> str | None:
+        return self.coordinator.entry.data.get(CONF_FORM) or None
 
     @property
     def native_value(self) -> int | None:
-        """Return the number of substitutions."""
+        """Return the number of substitutions of the form."""
         if not self.coordinator.data:
             return None
 
-        plan = self.coordinator.data.get("substitution_today")
+        plan = self._plan
         if not plan or not plan.actions:
             return 0
 
-        return len(plan.actions)
+        return len(substitution_rows(plan, self._form))
 
     @property
-    def extra_state_attributes(self) -> dict[str, Any]:
+    def extra_state_attributes(self) -> Mapping[str, Any]:
         """Return additional attributes."""
-        if not self.coordinator.data:
-            return {}
-
-        plan = self.coordinator.data.get("substitution_today")
+        plan = self._plan
         if not plan:
             return {}
 
-        substitutions = []
-        if plan.actions:
-            for action in plan.actions:
-                substitution = {
-                    "form": action.form,
-                    "period": action.period,
-                }
-
-                if action.subject:
-                    substitution["subject"] = str(action.subject)
-                if action.teacher:
-                    substitution["teacher"] = str(action.teacher)
-                if action.room:
-                    substitution["room"] = str(action.room)
-                if action.info:
-                    substitution["info"] = action.info
-
-                # Add original values if changed
-                if action.original_subject:
-                    substitution["original_subject"] = action.original_subject
-                if action.original_teacher:
-                    substitution["original_teacher"] = action.original_teacher
-                if action.original_room:
-                    substitution["original_room"] = action.original_room
-
-                substitutions.append(substitution)
+        options = self.coordinator.entry.options
+        return substitution_attributes(
+            plan,
+            self._form,
+            options.get(CONF_MAX_SUBSTITUTION_ROWS, DEFAULT_MAX_SUBSTITUTION_ROWS),
+        )
 
-        attrs = {
-            ATTR_SUBSTITUTIONS: substitutions,
-            "date": str(plan.date) if plan.date else None,
-            "last_update": str(plan.timestamp) if plan.timestamp else None,
-        }
 
-        if plan.absent_teachers:
-            attrs["absent_teachers"] = plan.absent_teachers
-        if plan.absent_forms:
-            attrs["absent_forms"] = plan.absent_forms
-        if plan.additional_info:
-            attrs["additional_info"] = plan.additional_info
+class Stundenplan24SubstitutionsTodaySensor(Stundenplan24SubstitutionsSensor):
+    """Sensor for today's substitutions."""
 
-        return attrs
+    _plan_key = "substitution_today"
+    _data_keys = frozenset({"substitution_today"})
 
+    def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, "substitutions_today")
+        self._attr_name = "Vertretungen Heute"
+        self._attr_icon = "mdi:calendar-today"
 
-class Stundenplan24SubstitutionsTomorrowSensor(Stundenplan24Sensor):
+
+class Stundenplan24SubstitutionsTomorrowSensor(Stundenplan24SubstitutionsSensor):
     """Sensor for tomorrow's substitutions."""
 
+    _plan_key = "substitution_tomorrow"
+    _data_keys = frozenset({"substitution_tomorrow"})
+
     def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
         """Initialize the sensor."""
         super().__init__(coordinator, "substitutions_tomorrow")
         self._attr_name = "Vertretungen Morgen"
         self._attr_icon = "mdi:calendar-arrow-right"
 
-    @property
-    def native_value(self) -> int | None:
-        """Return the number of substitutions."""
-        if not self.coordinator.data:
-            return None
 
-        plan = self.coordinator.data.get("substitution_tomorrow")
-        if not plan or not plan.actions:
-            return 0
+class Stundenplan24LessonSensor(Stundenplan24Sensor):
+    """Base class for sensors showing a lesson depending on the time of day.
+
+    The lesson is looked up once per state write. Instead of waiting for the
+    next poll, the sensor updates itself at the next time its lesson may
+    change, re-armed whenever the lessons change.
+    """
 
-        return len(plan.actions)
+    _data_keys = frozenset({"lessons"})
+
+    def __init__(self, coordinator: Stundenplan24Coordinator, sensor_type: str) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, sensor_type)
+        self._lesson: ScheduledLesson | None = None
+        self._unsub_boundary: CALLBACK_TYPE | None = None
+
+    @abc.abstractmethod
+    def _find_lesson(self, lessons: LessonIndex, now: datetime) -> ScheduledLesson | None:
+        """Return the lesson to show at now, a naive local time."""
+
+    def _next_change(self, lessons: LessonIndex, now: datetime) -> datetime | None:
+        """Return when the lesson to show may change next, a naive local time."""
+        return lessons.next_boundary(now)
+
+    async def async_added_to_hass(self) -> None:
+        """Find the lesson when added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._cancel_boundary)
+        self._update_lesson()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Find the lesson again if the lessons changed."""
+        if self.coordinator.data_changed(self._data_keys):
+            self._update_lesson()
+            self.async_write_ha_state()
+
+    @callback
+    def _handle_boundary(self, now: datetime) -> None:
+        """Find the lesson again at a lesson boundary."""
+        self._unsub_boundary = None
+        self._update_lesson()
+        self.async_write_ha_state()
+
+    @callback
+    def _cancel_boundary(self) -> None:
+        if self._unsub_boundary is not None:
+            self._unsub_boundary()
+            self._unsub_boundary = None
+
+    @callback
+    def _update_lesson(self) -> None:
+        """Find the lesson and wake up at the next boundary."""
+        self._cancel_boundary()
+        self._lesson = None
+
+        lessons = self.coordinator.data.get("lessons") if self.coordinator.data else None
+        if lessons is None:
+            return
+
+        now = dt_util.now()
+        # Plan times are local wall-clock times
+        local_now = now.replace(tzinfo=None)
+        self._lesson = self._find_lesson(lessons, local_now)
+
+        boundary = self._next_change(lessons, local_now)
+        if boundary is not None:
+            self._unsub_boundary = async_track_point_in_time(
+                self.hass, self._handle_boundary, boundary.replace(tzinfo=now.tzinfo)
+            )
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
         """Return additional attributes."""
-        if not self.coordinator.data:
-            return {}
-
-        plan = self.coordinator.data.get("substitution_tomorrow")
-        if not plan:
+        if self._lesson is None:
             return {}
 
-        substitutions = []
-        if plan.actions:
-            for action in plan.actions:
-                substitution = {
-                    "form": action.form,
-                    "period": action.period,
-                }
-
-                if action.subject:
-                    substitution["subject"] = str(action.subject)
-                if action.teacher:
-                    substitution["teacher"] = str(action.teacher)
-                if action.room:
-                    substitution["room"] = str(action.room)
-                if action.info:
-                    substitution["info"] = action.info
-
-                substitutions.append(substitution)
-
+        lesson = self._lesson.lesson
         attrs = {
-            ATTR_SUBSTITUTIONS: substitutions,
-            "date": str(plan.date) if plan.date else None,
-            "last_update": str(plan.timestamp) if plan.timestamp else None,
+            "period": lesson.period,
+            "date": str(self._lesson.date),
+            "start_time": str(self._lesson.start.time()),
         }
 
-        if plan.absent_teachers:
-            attrs["absent_teachers"] = plan.absent_teachers
-        if plan.additional_info:
-            attrs["additional_info"] = plan.additional_info
+        if self._lesson.end:
+            attrs["end_time"] = str(self._lesson.end.time())
+        if lesson.teacher:
+            attrs[ATTR_TEACHER] = str(lesson.teacher)
+        if lesson.room:
+            attrs[ATTR_ROOM] = str(lesson.room)
+        if lesson.course2:
+            attrs["course"] = lesson.course2
+        if lesson.information:
+            attrs["info"] = lesson.information
 
         return attrs
 
 
-class Stundenplan24NextLessonSensor(Stundenplan24Sensor):
-    """Sensor for the next lesson."""
+class Stundenplan24CurrentLessonSensor(Stundenplan24LessonSensor):
+    """Sensor for the lesson taking place right now."""
 
     def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
         """Initialize the sensor."""
-        super().__init__(coordinator, "next_lesson")
-        self._attr_name = "Nächste Stunde"
-        self._attr_icon = "mdi:clock-outline"
+        super().__init__(coordinator, SENSOR_TYPE_CURRENT_LESSON)
+        self._attr_name = "Aktuelle Stunde"
+        self._attr_icon = "mdi:school-outline"
 
-    def _find_next_lesson(self) -> dict[str, Any] | None:
-        """Find the next lesson from the timetable."""
-        if not self.coordinator.data:
-            return None
+    def _find_lesson(self, lessons: LessonIndex, now: datetime) -> ScheduledLesson | None:
+        return lessons.current_lesson(now)
 
-        timetable = self.coordinator.data.get("timetable")
-        if not timetable or not timetable.forms:
-            return None
+    @property
+    def native_value(self) -> str | None:
+        """Return the subject of the current lesson."""
+        if self._lesson is None:
+            return "Keine Stunde"
 
-        now = dt_util.now()
-        current_time = now.time()
+        if self._lesson.lesson.subject:
+            return str(self._lesson.lesson.subject)
 
-        # Get the first form (assuming single student view)
-        # TODO: Add form selection via config
-        form = timetable.forms[0] if timetable.forms else None
-        if not form or not form.lessons:
-            return None
+        return "Unbekannt"
 
-        # Find next lesson
-        next_lesson = None
-        for lesson in form.lessons:
-            if lesson.start and lesson.start > current_time:
-                if next_lesson is None or lesson.start < next_lesson.start:
-                    next_lesson = lesson
 
-        return next_lesson
+class Stundenplan24NextLessonSensor(Stundenplan24LessonSensor):
+    """Sensor for the next lesson."""
+
+    def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, SENSOR_TYPE_NEXT_LESSON)
+        self._attr_name = "Nächste Stunde"
+        self._attr_icon = "mdi:clock-outline"
+
+    def _find_lesson(self, lessons: LessonIndex, now: datetime) -> ScheduledLesson | None:
+        return lessons.next_lesson(now)
+
+    def _next_change(self, lessons: LessonIndex, now: datetime) -> datetime | None:
+        # The next lesson only changes once it starts
+        return self._lesson.start if self._lesson is not None else None
 
     @property
     def native_value(self) -> str | None:
         """Return the subject of the next lesson."""
-        lesson = self._find_next_lesson()
-        if not lesson:
+        if self._lesson is None:
             return "Keine weiteren Stunden"
 
-        if lesson.subject:
-            return str(lesson.subject)
+        if self._lesson.lesson.subject:
+            return str(self._lesson.lesson.subject)
 
         return "Unbekannt"
 
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Return additional attributes."""
-        lesson = self._find_next_lesson()
-        if not lesson:
-            return {}
-
-        attrs = {
-            "period": lesson.period,
-        }
-
-        if lesson.start:
-            attrs["start_time"] = str(lesson.start)
-        if lesson.end:
-            attrs["end_time"] = str(lesson.end)
-        if lesson.teacher:
-            attrs[ATTR_TEACHER] = str(lesson.teacher)
-        if lesson.room:
-            attrs[ATTR_ROOM] = str(lesson.room)
-        if lesson.course2:
-            attrs["course"] = lesson.course2
-        if lesson.information:
-            attrs["info"] = lesson.information
-
-        return attrs
-
 
 class Stundenplan24AdditionalInfoSensor(Stundenplan24Sensor):
     """Sensor for additional info (ZusatzInfo) from timetables."""
 
+    _data_keys = frozenset({"timetables", "timetable", KEY_TODAY})
+
     def __init__(self, coordinator: Stundenplan24Coordinator) -> None:
         """Initialize the sensor."""
         super().__init__(coordinator, "additional_info")
@@ -9,6 +9,7 @@ import email.utils
 import typing
 import asyncio
 import logging
+import time
 
 import curl_cffi.requests
 
@@ -19,10 +20,19 @@ from .errors import PlanClientError, PlanNotFoundError, UnauthorizedError, NotMo
 
 logging.getLogger("charset_normalizer").propagate = False
 
+# worker threads of the fallback executor transport, shared by all sub-clients of a hosting
+_EXECUTOR_MAX_WORKERS = 4
+
+# re-probe schedule of URLs that answered 404, in seconds: the first retry after
+# _NOT_FOUND_TTL, doubling with every further 404 up to _NOT_FOUND_MAX_TTL
+_NOT_FOUND_TTL = 15 * 60
+_NOT_FOUND_MAX_TTL = 2 * 60 * 60
+
 __all__ = [
     "Credentials",
     "Hosting",
     "PlanResponse",
+    "NotFoundCache",
     "PlanClient",
     "IndiwareMobilClient",
     "SubstitutionPlanClient",
@@ -93,6 +103,54 @@ class PlanResponse:
         return self.response.headers.get("ETag", None)
 
 
+class NotFoundCache:
+    """URLs that answered 404, not requested again until their re-probe time.
+
+    A plan file that does not exist is asked for less and less often while it keeps
+    missing. Once a vpdir listing or a HEAD request shows the file, its entry is
+    dropped, and so can be the entries of plans a caller knows to be published since.
+    Entries of past dates and entries not probed again for a while are dropped as well.
+    """
+
+    def __init__(self, ttl: float = _NOT_FOUND_TTL, max_ttl: float = _NOT_FOUND_MAX_TTL,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.clock = clock
+        # url -> (time of the next probe, number of 404s in a row, date of the plan)
+        self._entries: dict[str, tuple[float, int, datetime.date | None]] = {}
+
+    def __contains__(self, url: str) -> bool:
+        """Return whether url is known to be missing and not due for another probe."""
+        entry = self._entries.get(url)
+        return entry is not None and self.clock() < entry[0]
+
+    def add(self, url: str, date: datetime.date | None = None):
+        self.prune()
+        _, misses, _ = self._entries.get(url, (0., 0, None))
+        ttl = min(self.ttl * 2 ** misses, self.max_ttl)
+        self._entries[url] = self.clock() + ttl, misses + 1, date
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def prune(self, today: datetime.date | None = None):
+        """Drop entries due for longer than max_ttl and, if today is given, those of past dates."""
+        now = self.clock()
+        self._entries = {
+            url: entry for url, entry in self._entries.items()
+            if now < entry[0] + self.max_ttl
+            and (today is None or entry[2] is None or entry[2] >= today)
+        }
+
+    def discard(self, url: str):
+        self._entries.pop(url, None)
+
+
+def _plan_date(date_or_filename: str | datetime.date | None) -> datetime.date | None:
+    return date_or_filename if isinstance(date_or_filename, datetime.date) else None
+
+
 def _do_request(session, request_kwargs, proxy_url):
     return session.request(
         **request_kwargs,
@@ -107,11 +165,51 @@ def _do_request(session, request_kwargs, proxy_url):
 class PlanClient(abc.ABC):
     def __init__(self, credentials: Credentials | None,
                  proxied_session: pipifax_proxy_manager.ProxiedSession | None = None,
-                 request_executor: concurrent.futures.Executor | None = None):
+                 request_executor: concurrent.futures.Executor | None = None,
+                 session: curl_cffi.requests.Session | None = None,
+                 async_session: curl_cffi.requests.AsyncSession | None = None,
+                 not_found_cache: NotFoundCache | None = None):
         self.credentials = credentials
         self.proxied_session = proxied_session
-        self.request_executor = (
-            concurrent.futures.ThreadPoolExecutor() if request_executor is None else request_executor
+        # only needed for blocking requests, created on first use if not given
+        self.request_executor = request_executor
+        # keep-alive sessions, usually shared with the other clients of the same hosting;
+        # with an async session requests run directly on the event loop, otherwise they are
+        # run in the executor (and without a session every request opens a fresh connection)
+        self.session = session
+        self.async_session = async_session
+        # plan URLs that answered 404, usually shared with the other clients of the same hosting
+        self.not_found_cache = not_found_cache if not_found_cache is not None else NotFoundCache()
+
+    async def _run_blocking(self, func: typing.Callable[[], curl_cffi.requests.Response]):
+        if self.request_executor is None:
+            self.request_executor = concurrent.futures.ThreadPoolExecutor()
+
+        return await asyncio.get_event_loop().run_in_executor(self.request_executor, func)
+
+    async def _fetch_plan_url(
+        self,
+        url: str,
+        date_or_filename: str | datetime.date | None,
+        **kwargs
+    ) -> PlanResponse:
+        if url in self.not_found_cache:
+            raise PlanNotFoundError(f"No plan for {date_or_filename=} found (cached).", 404)
+
+        response = await self.make_request(url, **kwargs)
+
+        if response.status_code == 404:
+            self.not_found_cache.add(url, _plan_date(date_or_filename))
+            raise PlanNotFoundError(f"No plan for {date_or_filename=} found.", response.status_code)
+        elif response.status_code != 200:
+            raise PlanClientError(f"Unexpected status code {response.status_code} for request to {url=}.",
+                                  response.status_code)
+
+        self.not_found_cache.discard(url)
+
+        return PlanResponse(
+            content=response.text,
+            response=response
         )
 
     @abc.abstractmethod
@@ -148,11 +246,12 @@ class PlanClient(abc.ABC):
             | kwargs.get("headers", {})
         )
 
-        if self.proxied_session is None:
-            response = await asyncio.get_event_loop().run_in_executor(
-                self.request_executor,
-                lambda: curl_cffi.requests.request(**kwargs)
-            )
+        if self.proxied_session is None and self.async_session is not None:
+            response = await self.async_session.request(**kwargs)
+        elif self.proxied_session is None:
+            request = self.session.request if self.session is not None else curl_cffi.requests.request
+
+            response = await self._run_blocking(lambda: request(**kwargs))
         else:
             def handler(fut, proxy, i):
                 try:
@@ -164,8 +263,7 @@ class PlanClient(abc.ABC):
                 # print(response.text)
                 return response
 
-            response = await asyncio.get_event_loop().run_in_executor(
-                self.request_executor,
+            response = await self._run_blocking(
                 lambda: self.proxied_session.request(
                     handler=handler,
                     anonymity_level="anonymous",
@@ -190,16 +288,12 @@ class PlanClient(abc.ABC):
 
 
 class IndiwareMobilClient(PlanClient):
-    def __init__(self, endpoint: IndiwareMobilEndpoint, credentials: Credentials | None):
-        super().__init__(credentials)
+    def __init__(self, endpoint: IndiwareMobilEndpoint, credentials: Credentials | None, **kwargs):
+        super().__init__(credentials, **kwargs)
 
         self.endpoint = endpoint
 
-    async def fetch_plan(
-        self,
-        date_or_filename: str | datetime.date | None = None,
-        **kwargs
-    ) -> PlanResponse:
+    def get_url(self, date_or_filename: str | datetime.date | None = None) -> str:
         if date_or_filename is None:
             _url = self.endpoint.plan_file_url2
         elif isinstance(date_or_filename, str):
@@ -209,20 +303,14 @@ class IndiwareMobilClient(PlanClient):
         else:
             raise TypeError(f"date_or_filename must be str, datetime.date or None, not {type(date_or_filename)!r}.")
 
-        url = urllib.parse.urljoin(self.endpoint.url, _url)
-
-        response = await self.make_request(url, **kwargs)
-
-        if response.status_code == 404:
-            raise PlanNotFoundError(f"No plan for {date_or_filename=} found.", response.status_code)
-        elif response.status_code != 200:
-            raise PlanClientError(f"Unexpected status code {response.status_code} for request to {url=}.",
-                                  response.status_code)
+        return urllib.parse.urljoin(self.endpoint.url, _url)
 
-        return PlanResponse(
-            content=response.text,
-            response=response
-        )
+    async def fetch_plan(
+        self,
+        date_or_filename: str | datetime.date | None = None,
+        **kwargs
+    ) -> PlanResponse:
+        return await self._fetch_plan_url(self.get_url(date_or_filename), date_or_filename, **kwargs)
 
     async def fetch_dates(self, **kwargs) -> dict[str, datetime.datetime]:
         """Return a dictionary of available file names and their last modification date."""
@@ -262,13 +350,15 @@ class IndiwareMobilClient(PlanClient):
                 datetime.datetime.strptime(date_str, "%d.%m.%Y %H:%M")
                 .replace(tzinfo=datetime.timezone.utc)
             )
+            # listed files exist, whatever they answered before
+            self.not_found_cache.discard(self.get_url(filename))
 
         return out
 
 
 class SubstitutionPlanClient(PlanClient):
-    def __init__(self, endpoint: SubstitutionPlanEndpoint, credentials: Credentials | None):
-        super().__init__(credentials)
+    def __init__(self, endpoint: SubstitutionPlanEndpoint, credentials: Credentials | None, **kwargs):
+        super().__init__(credentials, **kwargs)
 
         self.endpoint = endpoint
 
@@ -287,20 +377,7 @@ class SubstitutionPlanClient(PlanClient):
         date_or_filename: str | datetime.date | None = None,
         **kwargs
     ) -> PlanResponse:
-        url = self.get_url(date_or_filename)
-
-        response = await self.make_request(url, **kwargs)
-
-        if response.status_code == 404:
-            raise PlanNotFoundError(f"No plan for {date_or_filename=} found.", response.status_code)
-        elif response.status_code != 200:
-            raise PlanClientError(f"Unexpected status code {response.status_code} for request to {url=}.",
-                                  response.status_code)
-
-        return PlanResponse(
-            content=response.text,
-            response=response
-        )
+        return await self._fetch_plan_url(self.get_url(date_or_filename), date_or_filename, **kwargs)
 
     async def get_metadata(self, date_or_filename: str | datetime.date | None = None) -> tuple[
         datetime.datetime, str]:
@@ -309,38 +386,70 @@ class SubstitutionPlanClient(PlanClient):
         response = await self.make_request(url, method="HEAD")
 
         if response.status_code == 404:
+            self.not_found_cache.add(url, _plan_date(date_or_filename))
             raise PlanNotFoundError(f"No plan for {date_or_filename=} found.", response.status_code)
         elif response.status_code != 200:
             raise PlanClientError(f"Unexpected status code {response.status_code} for request to {url=}.",
                                   response.status_code)
 
+        # the plan exists now, fetch it right away
+        self.not_found_cache.discard(url)
+
         plan_response = PlanResponse("", response)
 
         return plan_response.last_modified, plan_response.etag
 
 
 class IndiwareStundenplanerClient:
-    def __init__(self, hosting: Hosting):
+    def __init__(self, hosting: Hosting, transport: typing.Literal["async", "executor"] = "async"):
         self.hosting = hosting
+        self.transport = transport
+
+        # All endpoints of a hosting usually live on the same host, so the sub-clients share one
+        # session and with it the open connections (no TCP and TLS handshake per request).
+        if transport == "async":
+            # requests run on the event loop, no worker threads at all
+            self.async_session = curl_cffi.requests.AsyncSession()
+            self.session = None
+            self.request_executor = None
+        elif transport == "executor":
+            # blocking requests, run in one small pool shared by all sub-clients
+            self.async_session = None
+            self.session = curl_cffi.requests.Session()
+            self.request_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_EXECUTOR_MAX_WORKERS, thread_name_prefix="stundenplan24"
+            )
+        else:
+            raise ValueError(f"transport must be 'async' or 'executor', not {transport!r}.")
+
+        # plans missing on the server, by URL, so the sub-clients don't ask for them on every refresh
+        self.not_found_cache = NotFoundCache()
+
+        client_kwargs = dict(
+            session=self.session,
+            async_session=self.async_session,
+            request_executor=self.request_executor,
+            not_found_cache=self.not_found_cache,
+        )
 
         self.form_plan_client = (
-            IndiwareMobilClient(hosting.indiware_mobil.forms, hosting.creds)
+            IndiwareMobilClient(hosting.indiware_mobil.forms, hosting.creds, **client_kwargs)
             if hosting.indiware_mobil.forms is not None else None
         )
         self.teacher_plan_client = (
-            IndiwareMobilClient(hosting.indiware_mobil.teachers, hosting.creds)
+            IndiwareMobilClient(hosting.indiware_mobil.teachers, hosting.creds, **client_kwargs)
             if hosting.indiware_mobil.teachers is not None else None
         )
         self.room_plan_client = (
-            IndiwareMobilClient(hosting.indiware_mobil.rooms, hosting.creds)
+            IndiwareMobilClient(hosting.indiware_mobil.rooms, hosting.creds, **client_kwargs)
             if hosting.indiware_mobil.rooms is not None else None
         )
 
         self.students_substitution_plan_client = SubstitutionPlanClient(
-            hosting.substitution_plan.students, hosting.creds
+            hosting.substitution_plan.students, hosting.creds, **client_kwargs
         ) if hosting.substitution_plan.students is not None else None
         self.teachers_substitution_plan_client = SubstitutionPlanClient(
-            hosting.substitution_plan.teachers, hosting.creds
+            hosting.substitution_plan.teachers, hosting.creds, **client_kwargs
         ) if hosting.substitution_plan.teachers is not None else None
 
     @property
@@ -358,8 +467,14 @@ class IndiwareStundenplanerClient:
         )
 
     async def close(self):
-        """Close all clients and their executors."""
+        """Close all clients, their executors and the shared session."""
         # Shutdown thread pool executors
         for client in list(self.indiware_mobil_clients) + list(self.substitution_plan_clients):
             if hasattr(client, 'request_executor') and client.request_executor is not None:
                 client.request_executor.shutdown(wait=False)
+
+        # Close the shared session (and with it the pooled connections)
+        if self.async_session is not None:
+            await self.async_session.close()
+        if self.session is not None:
+            self.session.close()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Collection
 import dataclasses
 import datetime
 import typing
@@ -7,7 +8,23 @@ import xml.etree.ElementTree as ET
 
 import pytz
 
-from .shared import parse_free_days, parse_plan_date, Value, Exam
+from . import xml_backend
+from .shared import (
+    ChildFields,
+    Exam,
+    Value,
+    code_text,
+    int_text,
+    intern_code,
+    intern_value,
+    parse_children,
+    parse_free_days,
+    parse_plan_date,
+    parse_time,
+    parse_timestamp,
+    text,
+    time_text,
+)
 
 # Cache timezone at module import to avoid blocking I/O in event loop
 _BERLIN_TZ = pytz.timezone("Europe/Berlin")
@@ -21,6 +38,12 @@ __all__ = [
 
 
 class IndiwareMobilPlan:
+    # Plans are cached by identity, hence __weakref__
+    __slots__ = (
+        "plan_type", "timestamp", "date", "filename", "native", "week", "days_per_week",
+        "school_number", "free_days", "forms", "additional_info", "__weakref__",
+    )
+
     plan_type: str
     timestamp: datetime.datetime | None  # time of last update
     date: datetime.date
@@ -28,7 +51,7 @@ class IndiwareMobilPlan:
     native: str
     week: int
     days_per_week: int
-    school_number: int = None
+    school_number: int | None
 
     free_days: list[datetime.date]
     forms: list[Form]
@@ -38,22 +61,7 @@ class IndiwareMobilPlan:
     def from_xml(cls, xml: ET.Element):
         day = cls()
 
-        # parse head
-        head = xml.find("Kopf")
-        day.plan_type = head.find("planart").text
-
-        day.timestamp = (
-            _BERLIN_TZ.localize(datetime.datetime.strptime(head.find("zeitstempel").text, "%d.%m.%Y, %H:%M"))
-        ) if head.find("zeitstempel") is not None else None
-        day.date = parse_plan_date(head.find("DatumPlan").text)
-        day.filename = head.find("datei").text
-        day.native = int(nativ.text) if (nativ := head.find("nativ")) is not None else None
-        day.week = int(head.find("woche").text) if head.find("woche") is not None else None
-        day.days_per_week = int(head.find("tageprowoche").text) if head.find("tageprowoche") is not None else 5
-        try:
-            day.school_number = int(head.find("schulnummer").text)
-        except (AttributeError, TypeError):
-            day.school_number = None
+        day._parse_head(xml.find("Kopf"))
 
         # parse free days
         ft_tag = xml.find("FreieTage")
@@ -67,14 +75,90 @@ class IndiwareMobilPlan:
         # parse additional info
         day.additional_info = []
         _additional_info = xml.find("ZusatzInfo")
-        _additional_info = _additional_info if _additional_info is not None else []
-        for line in _additional_info:
-            day.additional_info.append(line.text)
+        if _additional_info is not None:
+            day._parse_additional_info(_additional_info)
+
+        return day
+
+    @classmethod
+    def from_xml_stream(
+        cls,
+        content: str | bytes,
+        forms: Collection[str] | None = None,
+        backend: str | None = None,
+    ):
+        """Parse a plan document incrementally, keeping only the given forms.
+
+        Elements are dropped from the tree as soon as they have been consumed.
+        A <Kl> whose <Kurz> is not in forms is discarded while it is being read,
+        so neither its subtree nor a Form object for it is ever built up. With
+        forms=None every form is kept, like from_xml does.
+        """
+        day = cls()
+        day.free_days = []
+        day.forms = []
+        day.additional_info = []
+
+        # Ancestors of the element of the current event, root first
+        path: list[ET.Element] = []
+        skip_form = False
+
+        for event, elem in xml_backend.iterparse(content, backend):
+            if event == "start":
+                path.append(elem)
+                continue
+
+            path.pop()
+            depth = len(path)
+
+            if depth >= 3 and path[1].tag == "Klassen":
+                # child of a <Kl>, or deeper
+                if depth == 3 and elem.tag == "Kurz" and forms is not None:
+                    skip_form = elem.text not in forms
+                if skip_form:
+                    path[-1].remove(elem)
+            elif depth == 2 and elem.tag == "Kl":
+                if not skip_form:
+                    day.forms.append(Form.from_xml(elem))
+                skip_form = False
+                path[-1].remove(elem)
+            elif depth == 1:
+                if elem.tag == "Kopf":
+                    day._parse_head(elem)
+                elif elem.tag == "FreieTage":
+                    day.free_days = parse_free_days(elem)
+                elif elem.tag == "ZusatzInfo":
+                    day._parse_additional_info(elem)
+                path[-1].remove(elem)
 
         return day
 
+    def _parse_head(self, head: ET.Element) -> None:
+        self.plan_type = head.find("planart").text
+
+        self.timestamp = (
+            _BERLIN_TZ.localize(parse_timestamp(head.find("zeitstempel").text))
+        ) if head.find("zeitstempel") is not None else None
+        self.date = parse_plan_date(head.find("DatumPlan").text)
+        self.filename = head.find("datei").text
+        self.native = int(nativ.text) if (nativ := head.find("nativ")) is not None else None
+        self.week = int(head.find("woche").text) if head.find("woche") is not None else None
+        self.days_per_week = int(head.find("tageprowoche").text) if head.find("tageprowoche") is not None else 5
+        try:
+            self.school_number = int(head.find("schulnummer").text)
+        except (AttributeError, TypeError):
+            self.school_number = None
+
+    def _parse_additional_info(self, xml: ET.Element) -> None:
+        for line in xml:
+            self.additional_info.append(line.text)
+
 
 class Form:
+    __slots__ = (
+        "short_name", "hash", "periods", "courses", "classes", "lessons", "exams", "break_supervisions",
+    )
+
     short_name: str
     hash: str | None
 
@@ -89,67 +173,70 @@ class Form:
     def from_xml(cls, xml: ET.Element):
         form = cls()
 
-        form.short_name = xml.find("Kurz").text
-        try:
-            form.hash = xml.find("Hash").text
-        except AttributeError:
-            form.hash = None
-
-        # parse periods
+        form.hash = None
         form.periods = {}
-        kl_stunden = xml.find("KlStunden")
-        for period in (kl_stunden if kl_stunden is not None else []):
-            start, end = period.attrib["ZeitVon"].strip(), period.attrib["ZeitBis"].strip()
-            try:
-                start = datetime.datetime.strptime(start, "%H:%M").time()
-            except ValueError:
-                continue
-            try:
-                end = datetime.datetime.strptime(end, "%H:%M").time()
-            except ValueError:
-                continue
-            form.periods |= {int(period.text): (start, end)}
-
-        # parse courses
         form.courses = {}
-        kurse = xml.find("Kurse")
-        for _course in (kurse if kurse is not None else []):
-            course = _course.find("KKz")
-            form.courses |= {course.text: course.attrib["KLe"]}
-
-        # parse classes
         form.classes = {}
-        unterricht = xml.find("Unterricht")
-        for _class in (unterricht if unterricht is not None else []):
-            class_ = _class.find("UeNr")
-            class_obj = Class(
-                teacher=class_.attrib["UeLe"],
-                subject=class_.attrib["UeFa"],
-                group=class_.attrib["UeGr"] if "UeGr" in class_.attrib else None
-            )
-            form.classes |= {class_.text: class_obj}
-
-        # parse lessons
-        form.lessons = []
-        for _lesson in xml.find("Pl"):
-            form.lessons.append(Lesson.from_xml(_lesson))
-
-        # parse exams
         form.exams = []
-        klausuren = xml.find("Klausuren")
-        for _exam in (klausuren if klausuren is not None else []):
-            form.exams.append(Exam.from_xml_indiware_mobile(_exam))
-
-        # parse break supervisions
         form.break_supervisions = []
-        aufsichten = xml.find("Aufsichten")
-        for _break_supervision in (aufsichten if aufsichten is not None else []):
-            form.break_supervisions.append(BreakSupervision.from_xml(_break_supervision))
+
+        parse_children(form, xml, _FORM_FIELDS, required=("Kurz", "Pl"))
 
         return form
 
 
-@dataclasses.dataclass
+def _parse_periods(xml: ET.Element) -> dict[int, tuple[datetime.time, datetime.time]]:
+    periods = {}
+    for period in xml:
+        start, end = period.attrib["ZeitVon"].strip(), period.attrib["ZeitBis"].strip()
+        try:
+            start = parse_time(start)
+        except ValueError:
+            continue
+        try:
+            end = parse_time(end)
+        except ValueError:
+            continue
+        periods[int(period.text)] = (start, end)
+    return periods
+
+
+def _parse_courses(xml: ET.Element) -> dict[str, str]:
+    courses = {}
+    for _course in xml:
+        course = _course.find("KKz")
+        courses[intern_code(course.text)] = intern_code(course.attrib["KLe"])
+    return courses
+
+
+def _parse_classes(xml: ET.Element) -> dict[str, Class]:
+    classes = {}
+    for _class in xml:
+        class_ = _class.find("UeNr")
+        classes[class_.text] = Class(
+            teacher=intern_code(class_.attrib["UeLe"]),
+            subject=intern_code(class_.attrib["UeFa"]),
+            group=intern_code(class_.attrib["UeGr"]) if "UeGr" in class_.attrib else None
+        )
+    return classes
+
+
+_FORM_FIELDS: ChildFields = {
+    "Kurz": ("short_name", code_text),
+    "Hash": ("hash", text),
+    "KlStunden": ("periods", _parse_periods),
+    "Kurse": ("courses", _parse_courses),
+    "Unterricht": ("classes", _parse_classes),
+    "Pl": ("lessons", lambda xml: [Lesson.from_xml(lesson) for lesson in xml]),
+    "Klausuren": ("exams", lambda xml: [Exam.from_xml_indiware_mobile(exam) for exam in xml]),
+    "Aufsichten": (
+        "break_supervisions",
+        lambda xml: [BreakSupervision.from_xml(supervision) for supervision in xml],
+    ),
+}
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class Class:
     teacher: str
     subject: str
@@ -161,6 +248,11 @@ BREAK_SUPERVISION_CANCELLED = "AuAusfall"
 
 
 class BreakSupervision:
+    __slots__ = (
+        "status", "day", "before_period", "clock_time", "time_label", "location", "instead_of",
+        "information",
+    )
+
     status: str | None
     day: int
     before_period: int
@@ -175,20 +267,33 @@ class BreakSupervision:
         out = cls()
 
         out.status = xml.get("AuAe")
+        out.instead_of = None
+        out.information = None
 
-        out.day = int(xml.find("AuTag").text)
-        out.before_period = int(xml.find("AuVorStunde").text)
-        out.clock_time = datetime.datetime.strptime(xml.find("AuUhrzeit").text, "%H:%M").time()
-        out.time_label = xml.find("AuZeit").text
-        out.location = xml.find("AuOrt").text
-
-        out.instead_of = for_.text if (for_ := xml.find("AuFuer")) is not None else None
-        out.information = info.text if (info := xml.find("AuInfo")) is not None else None
+        parse_children(
+            out, xml, _BREAK_SUPERVISION_FIELDS,
+            required=("AuTag", "AuVorStunde", "AuUhrzeit", "AuZeit", "AuOrt"),
+        )
 
         return out
 
 
+_BREAK_SUPERVISION_FIELDS: ChildFields = {
+    "AuTag": ("day", int_text),
+    "AuVorStunde": ("before_period", int_text),
+    "AuUhrzeit": ("clock_time", time_text),
+    "AuZeit": ("time_label", code_text),
+    "AuOrt": ("location", code_text),
+    "AuFuer": ("instead_of", code_text),
+    "AuInfo": ("information", text),
+}
+
+
 class Lesson:
+    __slots__ = (
+        "period", "start", "end", "subject", "teacher", "room", "course2", "class_number", "information",
+    )
+
     period: int
     start: datetime.time
     end: datetime.time
@@ -206,22 +311,49 @@ class Lesson:
     def from_xml(cls, xml: ET.Element):
         lesson = cls()
 
-        lesson.period = int(xml.find("St").text)
-        lesson.start = (datetime.datetime.strptime(beg.text.strip().replace(".", ":"), "%H:%M").time()
-                        if (beg := xml.find("Beginn")) is not None and beg.text else None)
-        lesson.end = (datetime.datetime.strptime(end.text.strip().replace(".", ":"), "%H:%M").time()
-                      if (end := xml.find("Ende")) is not None and end.text else None)
+        lesson.start = None
+        lesson.end = None
+        lesson.course2 = None
+        lesson.class_number = None
+
+        # Lessons are by far the most numerous elements, so their children are
+        # dispatched inline rather than through a ChildFields table.
+        period = subject = teacher = room = information = None
+        for child in xml:
+            match child.tag:
+                case "St":
+                    period = child
+                case "Beginn":
+                    lesson.start = _lesson_time(child)
+                case "Ende":
+                    lesson.end = _lesson_time(child)
+                case "Fa":
+                    subject = child
+                case "Le":
+                    teacher = child
+                case "Ra":
+                    room = child
+                case "Ku2":
+                    lesson.course2 = intern_code(child.text)
+                case "Nr":
+                    lesson.class_number = intern_code(child.text)
+                case "If":
+                    information = child
+
+        if period is None or subject is None or teacher is None or room is None or information is None:
+            raise ValueError(f"<{xml.tag}> lacks one of <St>, <Fa>, <Le>, <Ra> and <If>")
+
+        lesson.period = int(period.text)
+        lesson.subject = intern_value(subject.text, subject.get("FaAe") == "FaGeaendert")
+        lesson.teacher = intern_value(teacher.text, teacher.get("LeAe") == "LeGeaendert")
+        lesson.room = intern_value(room.text, room.get("RaAe") == "RaGeaendert")
+        lesson.information = information.text.strip() if information.text is not None else None
 
-        lesson.subject = Value(xml.find("Fa").text, xml.find("Fa").get("FaAe") == "FaGeaendert")
-        lesson.teacher = Value(xml.find("Le").text, xml.find("Le").get("LeAe") == "LeGeaendert")
-        lesson.room = Value(xml.find("Ra").text, xml.find("Ra").get("RaAe") == "RaGeaendert")
+        return lesson
 
-        lesson.course2 = ku2.text if (ku2 := xml.find("Ku2")) is not None else None
 
-        try:
-            lesson.class_number = xml.find("Nr").text
-        except AttributeError:
-            lesson.class_number = None
-        lesson.information = xml.find("If").text.strip() if xml.find("If").text is not None else None
-
-        return lesson
+def _lesson_time(xml: ET.Element) -> datetime.time | None:
+    # some schools separate hours and minutes with a dot
+    if not xml.text:
+        return None
+    return parse_time(xml.text.strip().replace(".", ":"))
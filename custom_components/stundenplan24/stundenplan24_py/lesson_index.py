@@ -0,0 +1,148 @@
+"""Lessons of one form over several days, sorted by start time.
+
+Finding the next or the current lesson at a given time is a bisect over the
+days and one over the start times of that day, rather than a walk over all
+lessons. Lessons without times of their own take the times of their period
+from the form.
+
+All times are naive local wall-clock times, as in the plans.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+import datetime
+import typing
+
+from .indiware_mobil import Form, IndiwareMobilPlan, Lesson
+
+__all__ = ["LessonIndex", "ScheduledLesson"]
+
+
+class ScheduledLesson(typing.NamedTuple):
+    date: datetime.date
+    form: str
+    lesson: Lesson
+    start: datetime.datetime
+    end: datetime.datetime | None
+
+
+class LessonIndex:
+    __slots__ = ("dates", "_lessons", "_starts", "_boundaries")
+
+    def __init__(self) -> None:
+        # ascending, only days with lessons that have a start time
+        self.dates: list[datetime.date] = []
+        # per day, by start; lessons starting at the same time stay in plan order
+        self._lessons: list[list[ScheduledLesson]] = []
+        self._starts: list[list[datetime.datetime]] = []
+        # per day, every start and end of a lesson, ascending and distinct
+        self._boundaries: list[list[datetime.datetime]] = []
+
+    @classmethod
+    def from_plans(cls, plans: Iterable[IndiwareMobilPlan], form: str | None = None) -> LessonIndex:
+        """Build the index of a form from plans of distinct dates.
+
+        Without a form, the first form of each plan is taken.
+        """
+        index = cls()
+
+        for plan in sorted(plans, key=lambda plan: plan.date):
+            selected = _select_form(plan, form)
+            if selected is None:
+                continue
+
+            lessons = sorted(
+                _scheduled_lessons(plan.date, selected), key=lambda lesson: lesson.start
+            )
+            if not lessons:
+                continue
+
+            index.dates.append(plan.date)
+            index._lessons.append(lessons)
+            index._starts.append([lesson.start for lesson in lessons])
+            index._boundaries.append(sorted(
+                {lesson.start for lesson in lessons}
+                | {lesson.end for lesson in lessons if lesson.end is not None}
+            ))
+
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(lessons) for lessons in self._lessons)
+
+    def _first_day(self, now: datetime.datetime) -> int:
+        return bisect_left(self.dates, now.date())
+
+    def next_lesson(self, now: datetime.datetime) -> ScheduledLesson | None:
+        """Return the first lesson starting after now."""
+        day = self._first_day(now)
+
+        if day < len(self.dates) and self.dates[day] == now.date():
+            position = bisect_right(self._starts[day], now)
+            if position < len(self._starts[day]):
+                return self._lessons[day][position]
+            day += 1
+
+        if day < len(self.dates):
+            return self._lessons[day][0]
+
+        return None
+
+    def current_lesson(self, now: datetime.datetime) -> ScheduledLesson | None:
+        """Return the lesson taking place at now, the latest started one if several do."""
+        day = self._first_day(now)
+        if day == len(self.dates) or self.dates[day] != now.date():
+            return None
+
+        lessons = self._lessons[day]
+        for position in reversed(range(bisect_right(self._starts[day], now))):
+            lesson = lessons[position]
+            if lesson.end is not None and lesson.end > now:
+                return lesson
+
+        return None
+
+    def next_boundary(self, now: datetime.datetime) -> datetime.datetime | None:
+        """Return when the next lesson after now starts or ends."""
+        day = self._first_day(now)
+
+        if day < len(self.dates) and self.dates[day] == now.date():
+            boundaries = self._boundaries[day]
+            position = bisect_right(boundaries, now)
+            if position < len(boundaries):
+                return boundaries[position]
+            day += 1
+
+        if day < len(self.dates):
+            return self._boundaries[day][0]
+
+        return None
+
+
+def _select_form(plan: IndiwareMobilPlan, short_name: str | None) -> Form | None:
+    if short_name is None:
+        return plan.forms[0] if plan.forms else None
+    for form in plan.forms:
+        if form.short_name == short_name:
+            return form
+    return None
+
+
+def _scheduled_lessons(date: datetime.date, form: Form) -> Iterable[ScheduledLesson]:
+    """Yield the lessons of form with a start time, of their own or their period's."""
+    for lesson in form.lessons:
+        start, end = lesson.start, lesson.end
+        if lesson.period in form.periods:
+            period_start, period_end = form.periods[lesson.period]
+            start = start if start is not None else period_start
+            end = end if end is not None else period_end
+        if start is None:
+            continue
+
+        start = datetime.datetime.combine(date, start)
+        end = datetime.datetime.combine(date, end) if end is not None else None
+        if end is not None and end <= start:
+            end = None
+
+        yield ScheduledLesson(date, form.short_name, lesson, start, end)
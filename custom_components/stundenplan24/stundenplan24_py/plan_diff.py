@@ -0,0 +1,199 @@
+"""Differences between two versions of a plan.
+
+Value.was_changed only tells what the school marked as changed against the
+regular timetable. The functions here compare two fetched versions of the same
+plan instead: which lessons or substitutions were added, removed or changed
+between them, per form.
+
+Lessons are matched by form, period and class number, substitutions by form
+and period; rows sharing such a key are matched in plan order.
+"""
+from __future__ import annotations
+
+from collections.abc import Collection, Hashable, Iterable
+import dataclasses
+import datetime
+import typing
+
+from .indiware_mobil import IndiwareMobilPlan, Lesson
+from .substitution_plan import Action, SubstitutionPlan, involves_forms
+
+__all__ = [
+    "ADDED",
+    "REMOVED",
+    "CHANGED",
+    "RowChange",
+    "PlanChanges",
+    "diff_timetables",
+    "diff_substitution_plans",
+]
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+_LESSON_FIELDS = ("start", "end", "subject", "teacher", "room", "course2", "information")
+_TIMETABLE_FIELDS = ("timestamp", "date", "free_days", "additional_info")
+
+_ACTION_FIELDS = (
+    "subject", "teacher", "room", "original_subject", "original_teacher", "original_room", "info",
+)
+_SUBSTITUTION_PLAN_FIELDS = (
+    "timestamp", "date", "absent_teachers", "absent_forms", "absent_rooms", "changed_teachers",
+    "changed_forms", "free_days", "break_supervisions", "additional_info",
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RowChange:
+    """A lesson or substitution that differs between two versions of a plan."""
+
+    change: str  # ADDED, REMOVED or CHANGED
+    form: str | None
+    period: int | str
+    old: Lesson | Action | None
+    new: Lesson | Action | None
+    # Names of the attributes that differ, all of them for added and removed rows
+    fields: tuple[str, ...]
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class PlanChanges:
+    """Everything that differs between two versions of a plan."""
+
+    date: datetime.date | None
+    # Plan-level attributes that differ, like the timestamp or additional info
+    fields: tuple[str, ...] = ()
+    rows: tuple[RowChange, ...] = ()
+    forms_added: tuple[str, ...] = ()
+    forms_removed: tuple[str, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.fields or self.rows or self.forms_added or self.forms_removed)
+
+
+def _keyed[T](rows: Iterable[T], key: typing.Callable[[T], Hashable]) -> dict[tuple, T]:
+    """Key rows, numbering rows with the same key in the order they appear."""
+    keyed = {}
+    seen: dict[Hashable, int] = {}
+    for row in rows:
+        row_key = key(row)
+        occurrence = seen[row_key] = seen.get(row_key, -1) + 1
+        keyed[(row_key, occurrence)] = row
+    return keyed
+
+
+def _differing(old: object, new: object, fields: Iterable[str]) -> tuple[str, ...]:
+    return tuple(field for field in fields if getattr(old, field) != getattr(new, field))
+
+
+def _plan_fields(old: object | None, new: object | None, fields: tuple[str, ...]) -> tuple[str, ...]:
+    """Return the differing plan-level attributes, all of them if a version is missing."""
+    if old is None or new is None:
+        return fields
+    return _differing(old, new, fields)
+
+
+def _diff_rows(
+    form: str | None,
+    old: dict[tuple, typing.Any],
+    new: dict[tuple, typing.Any],
+    fields: tuple[str, ...],
+    period: typing.Callable[[typing.Any], int | str],
+) -> list[RowChange]:
+    changes = []
+    for key, old_row in old.items():
+        new_row = new.get(key)
+        if new_row is None:
+            changes.append(RowChange(REMOVED, form, period(old_row), old_row, None, fields))
+        elif old_row is not new_row and (differing := _differing(old_row, new_row, fields)):
+            changes.append(RowChange(CHANGED, form, period(new_row), old_row, new_row, differing))
+    for key, new_row in new.items():
+        if key not in old:
+            changes.append(RowChange(ADDED, form, period(new_row), None, new_row, fields))
+    return changes
+
+
+def diff_timetables(
+    old: IndiwareMobilPlan | None,
+    new: IndiwareMobilPlan | None,
+    forms: Collection[str] | None = None,
+) -> PlanChanges:
+    """Return how new differs from old, looking only at the given forms.
+
+    A missing version counts as an empty plan, so all lessons of the other
+    one show up as added or removed.
+    """
+    date = new.date if new is not None else old.date if old is not None else None
+    if old is new:
+        return PlanChanges(date)
+
+    old_forms = {
+        form.short_name: form for form in (old.forms if old is not None else ())
+        if forms is None or form.short_name in forms
+    }
+    new_forms = {
+        form.short_name: form for form in (new.forms if new is not None else ())
+        if forms is None or form.short_name in forms
+    }
+
+    def lesson_key(lesson: Lesson) -> Hashable:
+        return lesson.period, lesson.class_number
+
+    rows = []
+    for short_name in old_forms.keys() | new_forms.keys():
+        old_form = old_forms.get(short_name)
+        new_form = new_forms.get(short_name)
+        if old_form is new_form:
+            continue
+        rows += _diff_rows(
+            short_name,
+            _keyed(old_form.lessons if old_form is not None else (), lesson_key),
+            _keyed(new_form.lessons if new_form is not None else (), lesson_key),
+            _LESSON_FIELDS,
+            lambda lesson: lesson.period,
+        )
+
+    return PlanChanges(
+        date,
+        fields=_plan_fields(old, new, _TIMETABLE_FIELDS),
+        rows=tuple(sorted(rows, key=lambda row: (row.form, row.period))),
+        forms_added=tuple(sorted(new_forms.keys() - old_forms.keys())),
+        forms_removed=tuple(sorted(old_forms.keys() - new_forms.keys())),
+    )
+
+
+def diff_substitution_plans(
+    old: SubstitutionPlan | None,
+    new: SubstitutionPlan | None,
+    forms: Collection[str] | None = None,
+) -> PlanChanges:
+    """Return how new differs from old, looking only at actions of the given forms."""
+    date = new.date if new is not None else old.date if old is not None else None
+    if old is new:
+        return PlanChanges(date)
+
+    def actions(plan: SubstitutionPlan | None) -> Iterable[Action]:
+        if plan is None:
+            return ()
+        return (action for action in plan.actions if forms is None or involves_forms(action.form, forms))
+
+    def action_key(action: Action) -> Hashable:
+        return action.form, action.period
+
+    rows = []
+    for change in _diff_rows(
+        None,
+        _keyed(actions(old), action_key),
+        _keyed(actions(new), action_key),
+        _ACTION_FIELDS,
+        lambda action: action.period,
+    ):
+        row = change.new if change.new is not None else change.old
+        rows.append(dataclasses.replace(change, form=row.form))
+
+    return PlanChanges(
+        date,
+        fields=_plan_fields(old, new, _SUBSTITUTION_PLAN_FIELDS),
+        rows=tuple(rows),
+    )
@@ -0,0 +1,47 @@
+"""School days as announced by the plans.
+
+A plan lists the free days of the school year and the number of days per week
+lessons take place on, counted from Monday. Any other day is a school day.
+"""
+from __future__ import annotations
+
+from collections.abc import Container
+import datetime
+
+__all__ = ["DEFAULT_DAYS_PER_WEEK", "is_school_day", "next_school_days"]
+
+# Monday to Friday, if no plan told otherwise
+DEFAULT_DAYS_PER_WEEK = 5
+
+# Days looked ahead at most, enough to get past the summer holidays
+_MAX_LOOKAHEAD = 70
+
+
+def is_school_day(
+    day: datetime.date,
+    free_days: Container[datetime.date] = (),
+    days_per_week: int = DEFAULT_DAYS_PER_WEEK,
+) -> bool:
+    return day.weekday() < days_per_week and day not in free_days
+
+
+def next_school_days(
+    start: datetime.date,
+    count: int,
+    free_days: Container[datetime.date] = (),
+    days_per_week: int = DEFAULT_DAYS_PER_WEEK,
+) -> list[datetime.date]:
+    """Return the first count school days from start on, start included.
+
+    Fewer days are returned if the lookahead ends before count are found.
+    """
+    days = []
+    day = start
+    for _ in range(_MAX_LOOKAHEAD):
+        if len(days) == count:
+            break
+        if is_school_day(day, free_days, days_per_week):
+            days.append(day)
+        day += datetime.timedelta(days=1)
+
+    return days
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+from collections.abc import Callable, Collection
 import dataclasses
 import datetime
+import functools
+import sys
+import typing
 import xml.etree.ElementTree as ET
 
 __all__ = [
@@ -10,36 +14,129 @@ __all__ = [
 ]
 
 
+# Maps a child tag to the attribute it sets and the function converting it
+type ChildFields = dict[str, tuple[str, Callable[[ET.Element], typing.Any]]]
+
+
+def parse_children(
+    obj: object,
+    xml: ET.Element,
+    fields: ChildFields,
+    required: Collection[str] = (),
+) -> None:
+    """Set the attributes of obj from the children of xml in a single pass.
+
+    Children with tags not in fields are ignored. Attributes of optional
+    children must be set to their defaults beforehand.
+    """
+    for child in xml:
+        field = fields.get(child.tag)
+        if field is not None:
+            setattr(obj, field[0], field[1](child))
+
+    for tag in required:
+        if not hasattr(obj, fields[tag][0]):
+            raise ValueError(f"<{xml.tag}> has no <{tag}>")
+
+
+def text(xml: ET.Element) -> str | None:
+    return xml.text
+
+
+def intern_code(value: str | None) -> str | None:
+    """Return the interned copy of a short, repeating string like a teacher code."""
+    return sys.intern(value) if value is not None else None
+
+
+def code_text(xml: ET.Element) -> str | None:
+    return intern_code(xml.text)
+
+
+def int_text(xml: ET.Element) -> int:
+    return int(xml.text)
+
+
+def time_text(xml: ET.Element) -> datetime.time:
+    return parse_time(xml.text)
+
+
+# Plans repeat the same few dozen times and dates over and over, so parsed
+# values are cached. The fixed formats are parsed by hand, which is much faster
+# than strptime; anything not in the canonical format is left to strptime, so
+# results and errors stay the same.
+_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def parse_time(value: str) -> datetime.time:
+    """Parse "HH:MM", like datetime.datetime.strptime(value, "%H:%M").time()."""
+    if len(value) == 5 and value[2] == ":" and value.isascii():
+        hour, minute = value[:2], value[3:]
+        if hour.isdigit() and minute.isdigit():
+            return datetime.time(int(hour), int(minute))
+
+    return datetime.datetime.strptime(value, "%H:%M").time()
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def parse_short_date(value: str) -> datetime.date:
+    """Parse "YYMMDD", like datetime.datetime.strptime(value, "%y%m%d").date()."""
+    if len(value) == 6 and value.isascii() and value.isdigit():
+        year = int(value[:2])
+        # same pivot as strptime's %y
+        year += 1900 if year >= 69 else 2000
+        return datetime.date(year, int(value[2:4]), int(value[4:]))
+
+    return datetime.datetime.strptime(value, "%y%m%d").date()
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    """Parse "DD.MM.YYYY, HH:MM", like strptime(value, "%d.%m.%Y, %H:%M")."""
+    if (
+        len(value) == 17
+        and value[2] == value[5] == "."
+        and value[10:12] == ", "
+        and value[14] == ":"
+        and value.isascii()
+    ):
+        fields = value[:2], value[3:5], value[6:10], value[12:14], value[15:]
+        if all(field.isdigit() for field in fields):
+            day, month, year, hour, minute = map(int, fields)
+            return datetime.datetime(year, month, day, hour, minute)
+
+    return datetime.datetime.strptime(value, "%d.%m.%Y, %H:%M")
+
+
 def parse_free_days(xml: ET.Element) -> list[datetime.date]:
     free_days = []
     for day in xml:
-        free_days.append(
-            datetime.datetime.strptime(day.text, "%y%m%d").date()
-        )
+        free_days.append(parse_short_date(day.text))
 
     return free_days
 
 
+_MONTHS = {
+    "Januar": 1,
+    "Februar": 2,
+    "März": 3,
+    "April": 4,
+    "Mai": 5,
+    "Juni": 6,
+    "Juli": 7,
+    "August": 8,
+    "September": 9,
+    "Oktober": 10,
+    "November": 11,
+    "Dezember": 12
+}
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
 def parse_plan_date(date: str) -> datetime.date:
     """
     Example: Freitag, 23. Juni 2023
     """
 
-    months = {
-        "Januar": 1,
-        "Februar": 2,
-        "März": 3,
-        "April": 4,
-        "Mai": 5,
-        "Juni": 6,
-        "Juli": 7,
-        "August": 8,
-        "September": 9,
-        "Oktober": 10,
-        "November": 11,
-        "Dezember": 12
-    }
-
     _, date = date.split(", ", 1)
 
     day, month_and_year = date.split(". ", 1)
@@ -48,10 +145,10 @@ def parse_plan_date(date: str) -> datetime.date:
     # _year sometimes contains the week. Example: "2023 (A-Woche)"
     year, *_ = _year.split(" ", 1)
 
-    return datetime.date(int(year), months[month], int(day))
+    return datetime.date(int(year), _MONTHS[month], int(day))
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Value:
     content: str | None
     was_changed: bool
@@ -63,7 +160,15 @@ class Value:
         return self.content
 
 
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def intern_value(content: str | None, was_changed: bool) -> Value:
+    """Return a shared Value; plans contain the same few hundred over and over."""
+    return Value(intern_code(content), was_changed)
+
+
 class Exam:
+    __slots__ = ("year", "course", "course_teacher", "period", "begin", "duration", "info")
+
     year: int
     course: str
     course_teacher: str
@@ -75,27 +180,32 @@ class Exam:
     @classmethod
     def from_xml_substitution_plan(cls, xml: ET.Element) -> Exam:
         exam = cls()
-
-        exam.year = int(xml.find("jahrgang").text)
-        exam.course = xml.find("kurs").text
-        exam.course_teacher = xml.find("kursleiter").text
-        exam.period = int(xml.find("stunde").text)
-        exam.begin = datetime.datetime.strptime(xml.find("beginn").text, "%H:%M").time()
-        exam.duration = int(xml.find("dauer").text)
-        exam.info = xml.find("kinfo").text
-
+        parse_children(exam, xml, _SUBSTITUTION_PLAN_EXAM_FIELDS, _SUBSTITUTION_PLAN_EXAM_FIELDS)
         return exam
 
     @classmethod
     def from_xml_indiware_mobile(cls, xml: ET.Element) -> Exam:
         exam = cls()
+        parse_children(exam, xml, _INDIWARE_MOBIL_EXAM_FIELDS, _INDIWARE_MOBIL_EXAM_FIELDS)
+        return exam
 
-        exam.year = int(xml.find(f"KlJahrgang").text)
-        exam.course = xml.find("KlKurs").text
-        exam.course_teacher = xml.find("KlKursleiter").text
-        exam.period = int(xml.find("KlStunde").text)
-        exam.begin = datetime.datetime.strptime(xml.find("KlBeginn").text, "%H:%M").time()
-        exam.duration = int(xml.find("KlDauer").text)
-        exam.info = xml.find("KlKinfo").text
 
-        return exam
+_SUBSTITUTION_PLAN_EXAM_FIELDS: ChildFields = {
+    "jahrgang": ("year", int_text),
+    "kurs": ("course", code_text),
+    "kursleiter": ("course_teacher", code_text),
+    "stunde": ("period", int_text),
+    "beginn": ("begin", time_text),
+    "dauer": ("duration", int_text),
+    "kinfo": ("info", text),
+}
+
+_INDIWARE_MOBIL_EXAM_FIELDS: ChildFields = {
+    "KlJahrgang": ("year", int_text),
+    "KlKurs": ("course", code_text),
+    "KlKursleiter": ("course_teacher", code_text),
+    "KlStunde": ("period", int_text),
+    "KlBeginn": ("begin", time_text),
+    "KlDauer": ("duration", int_text),
+    "KlKinfo": ("info", text),
+}
@@ -0,0 +1,570 @@
+"""Binary snapshots of parsed plans.
+
+A snapshot holds the object graph of an IndiwareMobilPlan or SubstitutionPlan
+as fixed-width little-endian records, with every string stored once in a
+string table. Loading it needs neither an XML parser nor pickle: records are
+unpacked straight from the buffer, which may be an mmap of the snapshot file.
+
+The forms of a timetable are reached through a table of names and offsets,
+so forms not asked for are never read, let alone turned into objects. Only
+the pages of the forms that are materialized are touched.
+
+Layout: header | records | string table. Lists are a u32 count followed by
+their items; string ids index the string table, NULL stands for None.
+"""
+from __future__ import annotations
+
+from collections.abc import Collection, Iterator
+import datetime
+import struct
+import typing
+
+import pytz
+
+from .indiware_mobil import BreakSupervision, Class, Form, IndiwareMobilPlan, Lesson
+from .shared import Exam, intern_code, intern_value
+from .substitution_plan import Action, SubstitutionPlan, involves_forms
+
+__all__ = [
+    "SnapshotError",
+    "TimetableSnapshot",
+    "dump_timetable",
+    "dump_substitution_plan",
+    "load_substitution_plan",
+]
+
+_BERLIN_TZ = pytz.timezone("Europe/Berlin")
+
+MAGIC = b"SP24"
+VERSION = 2
+KIND_TIMETABLE = 1
+KIND_SUBSTITUTION_PLAN = 2
+
+NULL = 0xFFFFFFFF
+NO_TIME = 0xFFFF
+NO_INT = -(2 ** 63)
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# magic, version, kind, offset of the string table, offset of the root record
+_HEADER = struct.Struct("<4sHBxII")
+_U32 = struct.Struct("<I")
+_STRING = struct.Struct("<I")
+_DATE = struct.Struct("<I")
+
+# plan_type, timestamp, date, filename, native, week, days_per_week,
+# school_number, parsed forms, free_days, additional_info, forms
+_PLAN = struct.Struct("<IqIIqqqqIIII")
+# short_name, offset of the form record
+_FORM_ENTRY = struct.Struct("<II")
+# hash, periods, courses, classes, lessons, exams, break_supervisions
+_FORM = struct.Struct("<IIIIIII")
+# period, start, end
+_PERIOD = struct.Struct("<iHH")
+# course, teacher
+_COURSE = struct.Struct("<II")
+# number, teacher, subject, group
+_CLASS = struct.Struct("<IIII")
+# period, start, end, subject, changed, teacher, changed, room, changed,
+# course2, class_number, information
+_LESSON = struct.Struct("<iHHIBIBIBIII")
+# year, course, course_teacher, period, begin, duration, info
+_EXAM = struct.Struct("<iIIiHiI")
+# status, day, before_period, clock_time, time_label, location, instead_of, information
+_BREAK_SUPERVISION = struct.Struct("<IiiHIIII")
+
+# filename, date, school_name, timestamp, absent_teachers, absent_forms,
+# absent_rooms, changed_teachers, changed_forms, free_days, parsed forms,
+# actions, action_count, exams, break_supervisions, additional_info
+_SUBSTITUTION_PLAN = struct.Struct("<IIIqIIIIIIIIIIII")
+# form, period, subject, changed, teacher, changed, room, changed,
+# original_subject, original_teacher, original_room, info
+_ACTION = struct.Struct("<IIIBIBIBIIII")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _minutes(time: datetime.time | None) -> int:
+    return time.hour * 60 + time.minute if time is not None else NO_TIME
+
+
+def _time(minutes: int) -> datetime.time | None:
+    return datetime.time(*divmod(minutes, 60)) if minutes != NO_TIME else None
+
+
+def _int(value: int | None) -> int:
+    return value if value is not None else NO_INT
+
+
+def _int_or_none(value: int) -> int | None:
+    return value if value != NO_INT else None
+
+
+def _timestamp(value: datetime.datetime | None) -> int:
+    # Stored as local wall time; plans are localized to Europe/Berlin again on load
+    if value is None:
+        return NO_INT
+    return int((value.replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+def _timestamp_or_none(value: int) -> datetime.datetime | None:
+    if value == NO_INT:
+        return None
+    return _BERLIN_TZ.localize(_EPOCH + datetime.timedelta(seconds=value))
+
+
+class _Writer:
+    def __init__(self, kind: int) -> None:
+        self._kind = kind
+        self._buffer = bytearray(_HEADER.size)
+        self._string_ids: dict[str, int] = {}
+        self._strings: list[bytes] = []
+
+    def string(self, value: str | None) -> int:
+        if value is None:
+            return NULL
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value.encode("utf-8", "surrogatepass"))
+        return string_id
+
+    def record(self, record: struct.Struct, *values: typing.Any) -> int:
+        offset = len(self._buffer)
+        self._buffer += record.pack(*values)
+        return offset
+
+    def records(self, record: struct.Struct, rows: Collection[tuple]) -> int:
+        offset = len(self._buffer)
+        self._buffer += _U32.pack(len(rows))
+        for row in rows:
+            self._buffer += record.pack(*row)
+        return offset
+
+    def strings(self, values: Collection[str | None] | None) -> int:
+        if values is None:
+            return NULL
+        return self.records(_STRING, [(self.string(value),) for value in values])
+
+    def dates(self, values: Collection[datetime.date]) -> int:
+        return self.records(_DATE, [(value.toordinal(),) for value in values])
+
+    def finish(self, root: int) -> bytes:
+        strings_offset = len(self._buffer)
+        self._buffer += _U32.pack(len(self._strings))
+        position = 0
+        for string in self._strings:
+            self._buffer += _U32.pack(position)
+            position += len(string)
+        self._buffer += _U32.pack(position)
+        for string in self._strings:
+            self._buffer += string
+
+        _HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, self._kind, strings_offset, root)
+        return bytes(self._buffer)
+
+
+def dump_timetable(plan: IndiwareMobilPlan, forms: Collection[str] | None = None) -> bytes:
+    """Return the snapshot of a plan.
+
+    forms are the forms the plan was parsed for, None for all forms. They are
+    stored along, so a loader can tell a form missing from the plan from a form
+    that was skipped while parsing.
+    """
+    writer = _Writer(KIND_TIMETABLE)
+
+    form_entries = [
+        (writer.string(form.short_name), _dump_form(writer, form)) for form in plan.forms
+    ]
+    root = writer.record(
+        _PLAN,
+        writer.string(plan.plan_type),
+        _timestamp(plan.timestamp),
+        plan.date.toordinal(),
+        writer.string(plan.filename),
+        _int(plan.native),
+        _int(plan.week),
+        _int(plan.days_per_week),
+        _int(plan.school_number),
+        writer.strings(sorted(forms) if forms is not None else None),
+        writer.dates(plan.free_days),
+        writer.strings(plan.additional_info),
+        writer.records(_FORM_ENTRY, form_entries),
+    )
+    return writer.finish(root)
+
+
+def _dump_form(writer: _Writer, form: Form) -> int:
+    string = writer.string
+    periods = writer.records(_PERIOD, [
+        (period, _minutes(start), _minutes(end)) for period, (start, end) in form.periods.items()
+    ])
+    courses = writer.records(_COURSE, [
+        (string(course), string(teacher)) for course, teacher in form.courses.items()
+    ])
+    classes = writer.records(_CLASS, [
+        (string(number), string(class_.teacher), string(class_.subject), string(class_.group))
+        for number, class_ in form.classes.items()
+    ])
+    lessons = writer.records(_LESSON, [
+        (
+            lesson.period, _minutes(lesson.start), _minutes(lesson.end),
+            string(lesson.subject.content), lesson.subject.was_changed,
+            string(lesson.teacher.content), lesson.teacher.was_changed,
+            string(lesson.room.content), lesson.room.was_changed,
+            string(lesson.course2), string(lesson.class_number), string(lesson.information),
+        )
+        for lesson in form.lessons
+    ])
+    exams = _dump_exams(writer, form.exams)
+    break_supervisions = writer.records(_BREAK_SUPERVISION, [
+        (
+            string(supervision.status), supervision.day, supervision.before_period,
+            _minutes(supervision.clock_time), string(supervision.time_label),
+            string(supervision.location), string(supervision.instead_of),
+            string(supervision.information),
+        )
+        for supervision in form.break_supervisions
+    ])
+
+    return writer.record(
+        _FORM, string(form.hash), periods, courses, classes, lessons, exams, break_supervisions
+    )
+
+
+def _dump_exams(writer: _Writer, exams: list[Exam]) -> int:
+    return writer.records(_EXAM, [
+        (
+            exam.year, writer.string(exam.course), writer.string(exam.course_teacher),
+            exam.period, _minutes(exam.begin), exam.duration, writer.string(exam.info),
+        )
+        for exam in exams
+    ])
+
+
+def dump_substitution_plan(plan: SubstitutionPlan, forms: Collection[str] | None = None) -> bytes:
+    """Return the snapshot of a substitution plan.
+
+    forms are the forms the actions were kept for, None for all forms.
+    """
+    writer = _Writer(KIND_SUBSTITUTION_PLAN)
+    string = writer.string
+
+    actions = writer.records(_ACTION, [
+        (
+            string(action.form), string(action.period),
+            string(action.subject.content), action.subject.was_changed,
+            string(action.teacher.content), action.teacher.was_changed,
+            string(action.room.content), action.room.was_changed,
+            string(action.original_subject), string(action.original_teacher),
+            string(action.original_room), string(action.info),
+        )
+        for action in plan.actions
+    ])
+    root = writer.record(
+        _SUBSTITUTION_PLAN,
+        string(plan.filename),
+        plan.date.toordinal(),
+        string(plan.school_name),
+        _timestamp(plan.timestamp),
+        writer.strings(plan.absent_teachers),
+        writer.strings(plan.absent_forms),
+        writer.strings(plan.absent_rooms),
+        writer.strings(plan.changed_teachers),
+        writer.strings(plan.changed_forms),
+        writer.dates(plan.free_days),
+        writer.strings(sorted(forms) if forms is not None else None),
+        actions,
+        plan.action_count,
+        _dump_exams(writer, plan.exams),
+        writer.strings(plan.break_supervisions),
+        writer.strings(plan.additional_info),
+    )
+    return writer.finish(root)
+
+
+class _Reader:
+    def __init__(self, buffer: typing.Any, kind: int) -> None:
+        self._view = memoryview(buffer)
+        try:
+            self._read_header(kind)
+        except BaseException:
+            # A buffer with exports left can't be closed, as with mmap
+            self._view.release()
+            raise
+
+        self._strings: dict[int, str] = {}
+
+    def _read_header(self, kind: int) -> None:
+        try:
+            magic, version, stored_kind, strings_offset, self.root = _HEADER.unpack_from(self._view)
+            if magic != MAGIC:
+                raise SnapshotError("Not a plan snapshot")
+            if version != VERSION or stored_kind != kind:
+                raise SnapshotError(f"Unsupported snapshot version {version} or kind {stored_kind}")
+
+            (count,) = _U32.unpack_from(self._view, strings_offset)
+            self._string_offsets = strings_offset + _U32.size
+            self._string_data = self._string_offsets + (count + 1) * _U32.size
+        except struct.error as err:
+            raise SnapshotError(f"Truncated snapshot: {err}") from err
+
+        self._string_count = count
+
+    def string(self, string_id: int) -> str | None:
+        if string_id == NULL:
+            return None
+        value = self._strings.get(string_id)
+        if value is None:
+            if string_id >= self._string_count:
+                raise SnapshotError(f"String {string_id} out of range")
+            start, end = struct.unpack_from(
+                "<II", self._view, self._string_offsets + string_id * _U32.size
+            )
+            value = self._strings[string_id] = intern_code(
+                str(self._view[self._string_data + start:self._string_data + end], "utf-8", "surrogatepass")
+            )
+        return value
+
+    def record(self, record: struct.Struct, offset: int) -> tuple:
+        return record.unpack_from(self._view, offset)
+
+    def records(self, record: struct.Struct, offset: int) -> Iterator[tuple]:
+        (count,) = _U32.unpack_from(self._view, offset)
+        start = offset + _U32.size
+        end = start + count * record.size
+        if end > len(self._view):
+            raise SnapshotError("Truncated snapshot")
+        return record.iter_unpack(self._view[start:end])
+
+    def strings(self, offset: int) -> list[str | None] | None:
+        if offset == NULL:
+            return None
+        return [self.string(string_id) for (string_id,) in self.records(_STRING, offset)]
+
+    def dates(self, offset: int) -> list[datetime.date]:
+        return [datetime.date.fromordinal(ordinal) for (ordinal,) in self.records(_DATE, offset)]
+
+    def release(self) -> None:
+        self._view.release()
+
+
+class TimetableSnapshot:
+    """A timetable snapshot whose forms are materialized on demand.
+
+    The buffer, for example an mmap, must stay open until the snapshot is
+    closed; objects materialized before stay valid afterwards.
+    """
+
+    def __init__(self, buffer: typing.Any) -> None:
+        self._reader = _Reader(buffer, KIND_TIMETABLE)
+        try:
+            self._plan = self._reader.record(_PLAN, self._reader.root)
+            parsed_forms = self._reader.strings(self._plan[8])
+            self._form_offsets = {
+                self._reader.string(name): offset
+                for name, offset in self._reader.records(_FORM_ENTRY, self._plan[11])
+            }
+        except struct.error as err:
+            self.close()
+            raise SnapshotError(f"Truncated snapshot: {err}") from err
+        except BaseException:
+            self.close()
+            raise
+
+        # Forms the plan was parsed for, None for all forms
+        self.parsed_forms = frozenset(parsed_forms) if parsed_forms is not None else None
+
+    @property
+    def short_names(self) -> list[str]:
+        """Return the names of the forms in the snapshot, without reading them."""
+        return list(self._form_offsets)
+
+    def materialize(self, forms: Collection[str] | None = None) -> IndiwareMobilPlan:
+        """Build the plan, with only the given forms; None for all forms."""
+        reader = self._reader
+        (
+            plan_type, timestamp, date, filename, native, week, days_per_week, school_number,
+            _, free_days, additional_info, _,
+        ) = self._plan
+
+        try:
+            plan = IndiwareMobilPlan()
+            plan.plan_type = reader.string(plan_type)
+            plan.timestamp = _timestamp_or_none(timestamp)
+            plan.date = datetime.date.fromordinal(date)
+            plan.filename = reader.string(filename)
+            plan.native = _int_or_none(native)
+            plan.week = _int_or_none(week)
+            plan.days_per_week = _int_or_none(days_per_week)
+            plan.school_number = _int_or_none(school_number)
+            plan.free_days = reader.dates(free_days)
+            plan.additional_info = reader.strings(additional_info)
+            plan.forms = [
+                self._form(short_name, offset)
+                for short_name, offset in self._form_offsets.items()
+                if forms is None or short_name in forms
+            ]
+        except struct.error as err:
+            raise SnapshotError(f"Truncated snapshot: {err}") from err
+
+        return plan
+
+    def _form(self, short_name: str, offset: int) -> Form:
+        reader = self._reader
+        string = reader.string
+        hash_, periods, courses, classes, lessons, exams, break_supervisions = reader.record(
+            _FORM, offset
+        )
+
+        form = Form()
+        form.short_name = short_name
+        form.hash = string(hash_)
+        form.periods = {
+            period: (_time(start), _time(end))
+            for period, start, end in reader.records(_PERIOD, periods)
+        }
+        form.courses = {
+            string(course): string(teacher) for course, teacher in reader.records(_COURSE, courses)
+        }
+        form.classes = {
+            string(number): Class(string(teacher), string(subject), string(group))
+            for number, teacher, subject, group in reader.records(_CLASS, classes)
+        }
+        form.lessons = [_lesson(reader, row) for row in reader.records(_LESSON, lessons)]
+        form.exams = _load_exams(reader, exams)
+        form.break_supervisions = [
+            _break_supervision(reader, row)
+            for row in reader.records(_BREAK_SUPERVISION, break_supervisions)
+        ]
+        return form
+
+    def close(self) -> None:
+        """Release the buffer."""
+        self._reader.release()
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+
+def _lesson(reader: _Reader, row: tuple) -> Lesson:
+    string = reader.string
+    (
+        period, start, end, subject, subject_changed, teacher, teacher_changed,
+        room, room_changed, course2, class_number, information,
+    ) = row
+
+    lesson = Lesson()
+    lesson.period = period
+    lesson.start = _time(start)
+    lesson.end = _time(end)
+    lesson.subject = intern_value(string(subject), bool(subject_changed))
+    lesson.teacher = intern_value(string(teacher), bool(teacher_changed))
+    lesson.room = intern_value(string(room), bool(room_changed))
+    lesson.course2 = string(course2)
+    lesson.class_number = string(class_number)
+    lesson.information = string(information)
+    return lesson
+
+
+def _break_supervision(reader: _Reader, row: tuple) -> BreakSupervision:
+    string = reader.string
+    status, day, before_period, clock_time, time_label, location, instead_of, information = row
+
+    supervision = BreakSupervision()
+    supervision.status = string(status)
+    supervision.day = day
+    supervision.before_period = before_period
+    supervision.clock_time = _time(clock_time)
+    supervision.time_label = string(time_label)
+    supervision.location = string(location)
+    supervision.instead_of = string(instead_of)
+    supervision.information = string(information)
+    return supervision
+
+
+def _load_exams(reader: _Reader, offset: int) -> list[Exam]:
+    exams = []
+    for year, course, course_teacher, period, begin, duration, info in reader.records(_EXAM, offset):
+        exam = Exam()
+        exam.year = year
+        exam.course = reader.string(course)
+        exam.course_teacher = reader.string(course_teacher)
+        exam.period = period
+        exam.begin = _time(begin)
+        exam.duration = duration
+        exam.info = reader.string(info)
+        exams.append(exam)
+    return exams
+
+
+def load_substitution_plan(
+    buffer: typing.Any, forms: Collection[str] | None = None
+) -> SubstitutionPlan | None:
+    """Build the substitution plan of a snapshot with the actions of the given forms.
+
+    Returns None if actions of some of the forms were not kept in the snapshot.
+    """
+    reader = _Reader(buffer, KIND_SUBSTITUTION_PLAN)
+    string = reader.string
+
+    try:
+        (
+            filename, date, school_name, timestamp, absent_teachers, absent_forms, absent_rooms,
+            changed_teachers, changed_forms, free_days, parsed_forms, actions, action_count, exams,
+            break_supervisions, additional_info,
+        ) = reader.record(_SUBSTITUTION_PLAN, reader.root)
+
+        parsed_forms = reader.strings(parsed_forms)
+        if parsed_forms is not None and (forms is None or not set(forms) <= set(parsed_forms)):
+            return None
+
+        plan = SubstitutionPlan()
+        plan.filename = string(filename)
+        plan.date = datetime.date.fromordinal(date)
+        plan.school_name = string(school_name)
+        plan.timestamp = _timestamp_or_none(timestamp)
+        plan.absent_teachers = reader.strings(absent_teachers)
+        plan.absent_forms = reader.strings(absent_forms)
+        plan.absent_rooms = reader.strings(absent_rooms)
+        plan.changed_teachers = reader.strings(changed_teachers)
+        plan.changed_forms = reader.strings(changed_forms)
+        plan.free_days = reader.dates(free_days)
+        plan.actions = [
+            _action(reader, row) for row in reader.records(_ACTION, actions)
+            if forms is None or involves_forms(string(row[0]), forms)
+        ]
+        plan.action_count = action_count
+        plan.exams = _load_exams(reader, exams)
+        plan.break_supervisions = reader.strings(break_supervisions)
+        plan.additional_info = reader.strings(additional_info)
+    except struct.error as err:
+        raise SnapshotError(f"Truncated snapshot: {err}") from err
+    finally:
+        reader.release()
+
+    return plan
+
+
+def _action(reader: _Reader, row: tuple) -> Action:
+    string = reader.string
+    (
+        form, period, subject, subject_changed, teacher, teacher_changed, room, room_changed,
+        original_subject, original_teacher, original_room, info,
+    ) = row
+
+    action = Action()
+    action.form = string(form)
+    action.period = string(period)
+    action.subject = intern_value(string(subject), bool(subject_changed))
+    action.teacher = intern_value(string(teacher), bool(teacher_changed))
+    action.room = intern_value(string(room), bool(room_changed))
+    action.original_subject = string(original_subject)
+    action.original_teacher = string(original_teacher)
+    action.original_room = string(original_room)
+    action.info = string(info)
+    return action
@@ -1,16 +1,39 @@
 from __future__ import annotations
 
+from collections.abc import Collection
 import datetime
+import re
 import xml.etree.ElementTree as ET
 
-from .shared import parse_free_days, parse_plan_date, Value, Exam
+from .shared import (
+    Exam,
+    Value,
+    intern_code,
+    intern_value,
+    parse_free_days,
+    parse_plan_date,
+    parse_timestamp,
+)
 
 import pytz
 
 # Cache timezone at module import to avoid blocking I/O in event loop
 _BERLIN_TZ = pytz.timezone("Europe/Berlin")
 
-__all__ = ["SubstitutionPlan", "Action"]
+__all__ = ["SubstitutionPlan", "Action", "split_forms", "involves_forms"]
+
+# Separates the forms of an action concerning several, as in "5a,7b" or "5a, 7b"
+_FORM_SEPARATOR = re.compile(r"[,\s]+")
+
+
+def split_forms(form: str | None) -> list[str]:
+    """Return the forms named by the <klasse> field of an action."""
+    return [token for token in _FORM_SEPARATOR.split(form) if token] if form else []
+
+
+def involves_forms(form: str | None, forms: Collection[str]) -> bool:
+    """Return whether an action for form concerns any of forms."""
+    return any(token in forms for token in split_forms(form))
 
 
 def split_text_if_exists(xml: ET.Element, tag: str) -> list[str]:
@@ -21,6 +44,13 @@ def split_text_if_exists(xml: ET.Element, tag: str) -> list[str]:
 
 
 class SubstitutionPlan:
+    # Plans are cached by identity, hence __weakref__
+    __slots__ = (
+        "filename", "date", "school_name", "timestamp", "absent_teachers", "absent_forms",
+        "absent_rooms", "changed_teachers", "changed_forms", "free_days", "actions", "action_count",
+        "exams", "break_supervisions", "additional_info", "__weakref__",
+    )
+
     filename: str
     date: datetime.date
     school_name: str
@@ -35,6 +65,8 @@ class SubstitutionPlan:
     free_days: list[datetime.date]
 
     actions: list[Action]
+    # Number of actions of the whole school, including those of forms not kept
+    action_count: int
 
     exams: list[Exam]
 
@@ -43,7 +75,11 @@ class SubstitutionPlan:
     additional_info: list[str]
 
     @classmethod
-    def from_xml(cls, xml: ET.Element) -> SubstitutionPlan:
+    def from_xml(cls, xml: ET.Element, forms: Collection[str] | None = None) -> SubstitutionPlan:
+        """Parse a plan, keeping only the actions of the given forms if any.
+
+        Actions of other forms are counted, but never parsed.
+        """
         plan = cls()
 
         head = xml.find("kopf")
@@ -51,7 +87,7 @@ class SubstitutionPlan:
         plan.date = parse_plan_date(head.find("titel").text)
         plan.school_name = head.find("schulname").text
         plan.timestamp = (
-            _BERLIN_TZ.localize(datetime.datetime.strptime(head.find("datum").text, "%d.%m.%Y, %H:%M"))
+            _BERLIN_TZ.localize(parse_timestamp(head.find("datum").text))
         )
 
         head_info = head.find("kopfinfo")
@@ -65,28 +101,46 @@ class SubstitutionPlan:
         plan.free_days = parse_free_days(xml.find("freietage"))
 
         plan.actions = []
-        for action in xml.find("haupt") or []:
+        plan.action_count = 0
+        haupt = xml.find("haupt")
+        for action in (haupt if haupt is not None else []):
+            plan.action_count += 1
+            if forms is not None and not involves_forms(_action_form(action), forms):
+                continue
             plan.actions.append(Action.from_xml(action))
 
         plan.exams = []
-        for exam in xml.find("klausuren") or []:
+        klausuren = xml.find("klausuren")
+        for exam in (klausuren if klausuren is not None else []):
             plan.exams.append(Exam.from_xml_substitution_plan(exam))
 
         plan.break_supervisions = []
-        for supervision_row in xml.find("aufsichten") or []:
+        aufsichten = xml.find("aufsichten")
+        for supervision_row in (aufsichten if aufsichten is not None else []):
             plan.break_supervisions.append(supervision_row.find("aufsichtinfo").text)
 
         footer = xml.find("fuss")
         plan.additional_info = []
 
         if footer is not None:
-            for line in footer.find("fusszeile") or []:
+            fusszeile = footer.find("fusszeile")
+            for line in (fusszeile if fusszeile is not None else []):
                 plan.additional_info.append(line.text)
 
         return plan
 
 
+def _action_form(xml: ET.Element) -> str | None:
+    form = xml.find("klasse")
+    return form.text if form is not None else None
+
+
 class Action:
+    __slots__ = (
+        "form", "period", "subject", "teacher", "room", "original_subject", "original_teacher",
+        "original_room", "info",
+    )
+
     form: str | None
     period: str
 
@@ -104,8 +158,8 @@ class Action:
     def from_xml(cls, xml: ET.Element) -> Action:
         action = cls()
 
-        action.form = form.text if (form := xml.find("klasse")) is not None else None
-        action.period = xml.find("stunde").text
+        action.form = intern_code(form.text) if (form := xml.find("klasse")) is not None else None
+        action.period = intern_code(xml.find("stunde").text)
 
         fach = xml.find("fach")
         lehrer = xml.find("lehrer")
@@ -117,22 +171,22 @@ class Action:
 
         if (vfach is not None) or (vlehrer is not None) or (vraum is not None):
             # this is a teachers' substitution plan
-            action.original_subject = fach.text
-            action.original_teacher = lehrer.text
-            action.original_room = raum.text if raum is not None else None
+            action.original_subject = intern_code(fach.text)
+            action.original_teacher = intern_code(lehrer.text)
+            action.original_room = intern_code(raum.text) if raum is not None else None
 
-            action.subject = Value(vfach.text, vfach.get("legeaendert") == "ae")
-            action.teacher = Value(vlehrer.text, vlehrer.get("legeaendert") == "ae")
-            action.room = Value(vraum.text, vraum.get("rageaendert") == "ae")
+            action.subject = intern_value(vfach.text, vfach.get("legeaendert") == "ae")
+            action.teacher = intern_value(vlehrer.text, vlehrer.get("legeaendert") == "ae")
+            action.room = intern_value(vraum.text, vraum.get("rageaendert") == "ae")
         else:
             # in students' substitution plans, the original values are included in the info
             action.original_subject = None
             action.original_teacher = None
             action.original_room = None
 
-            action.subject = Value(fach.text, xml.find("lehrer").get("legeaendert") == "ae")
-            action.teacher = Value(lehrer, lehrer.get("legeaendert") == "ae")
-            action.room = Value(raum.text, raum.get("rageaendert") == "ae")
+            action.subject = intern_value(fach.text, xml.find("lehrer").get("legeaendert") == "ae")
+            action.teacher = intern_value(lehrer.text, lehrer.get("legeaendert") == "ae")
+            action.room = intern_value(raum.text, raum.get("rageaendert") == "ae")
 
         action.info = xml.find("info").text
 
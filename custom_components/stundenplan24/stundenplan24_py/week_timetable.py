@@ -0,0 +1,227 @@
+"""Columnar view of the lessons of several Indiware Mobil plans.
+
+Every lesson of every form is one row. Rows are stored as parallel arrays,
+with forms, subjects, teachers and rooms replaced by ids into a shared code
+table. For every value of the filterable columns there is a bitmap (a Python
+int) with one bit per row, so a query is a handful of big-int ANDs rather than
+a walk over nested lists of objects.
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator
+import datetime
+import typing
+
+from .indiware_mobil import IndiwareMobilPlan, Lesson
+
+__all__ = ["WeekTimetable", "WeekLesson"]
+
+# Stored in the start/end columns for lessons without a time
+NO_TIME = 0xFFFF
+
+
+class WeekLesson(typing.NamedTuple):
+    date: datetime.date
+    form: str
+    lesson: Lesson
+
+
+def _minutes(time: datetime.time | None) -> int:
+    return time.hour * 60 + time.minute if time is not None else NO_TIME
+
+
+def _bits(bitmap: int) -> Iterator[int]:
+    """Yield the indices of the set bits of bitmap in ascending order."""
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+class WeekTimetable:
+    __slots__ = (
+        "dates", "forms", "codes", "day", "period", "start", "end", "form", "subject", "teacher", "room",
+        "_code_ids", "_lessons", "_all", "_timed", "_by_day", "_by_period", "_by_form",
+        "_by_subject", "_by_teacher", "_by_room",
+    )
+
+    # distinct plan dates, ascending; the day column indexes into it
+    dates: list[datetime.date]
+    # forms the plans were reduced to, None if they hold all forms of the school
+    forms: frozenset[str] | None
+    # code table shared by the form, subject, teacher and room columns; id 0 is None
+    codes: list[str | None]
+
+    day: array
+    period: array
+    start: array  # minutes since midnight or NO_TIME
+    end: array
+    form: array
+    subject: array
+    teacher: array
+    room: array
+
+    def __init__(self) -> None:
+        self.dates = []
+        self.forms = None
+        self.codes = [None]
+        self._code_ids: dict[str | None, int] = {None: 0}
+        self._lessons: list[Lesson] = []
+
+        self.day = array("H")
+        self.period = array("H")
+        self.start = array("H")
+        self.end = array("H")
+        self.form = array("I")
+        self.subject = array("I")
+        self.teacher = array("I")
+        self.room = array("I")
+
+        self._all = 0
+        self._timed = 0
+        self._by_day: dict[int, int] = {}
+        self._by_period: dict[int, int] = {}
+        self._by_form: dict[int, int] = {}
+        self._by_subject: dict[int, int] = {}
+        self._by_teacher: dict[int, int] = {}
+        self._by_room: dict[int, int] = {}
+
+    @classmethod
+    def from_plans(
+        cls, plans: Iterable[IndiwareMobilPlan], forms: Iterable[str] | None = None
+    ) -> WeekTimetable:
+        """Build the table from plans of distinct dates.
+
+        Plans reduced to some forms must name them, as teachers and rooms are
+        then only known from the lessons of those forms.
+        """
+        week = cls()
+        plans = sorted(plans, key=lambda plan: plan.date)
+        week.dates = [plan.date for plan in plans]
+        week.forms = frozenset(forms) if forms is not None else None
+
+        for day, plan in enumerate(plans):
+            for form in plan.forms:
+                form_id = week._code_id(form.short_name)
+                for lesson in form.lessons:
+                    week._append(day, form_id, lesson)
+
+        return week
+
+    def _code_id(self, code: str | None) -> int:
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            code_id = self._code_ids[code] = len(self.codes)
+            self.codes.append(code)
+        return code_id
+
+    def _append(self, day: int, form_id: int, lesson: Lesson) -> None:
+        row = len(self._lessons)
+        bit = 1 << row
+        self._lessons.append(lesson)
+
+        subject_id = self._code_id(lesson.subject.content)
+        teacher_id = self._code_id(lesson.teacher.content)
+        room_id = self._code_id(lesson.room.content)
+
+        self.day.append(day)
+        self.period.append(lesson.period)
+        self.start.append(_minutes(lesson.start))
+        self.end.append(_minutes(lesson.end))
+        self.form.append(form_id)
+        self.subject.append(subject_id)
+        self.teacher.append(teacher_id)
+        self.room.append(room_id)
+
+        self._all |= bit
+        if lesson.start is not None and lesson.end is not None:
+            self._timed |= bit
+        for index, key in (
+            (self._by_day, day),
+            (self._by_period, lesson.period),
+            (self._by_form, form_id),
+            (self._by_subject, subject_id),
+            (self._by_teacher, teacher_id),
+            (self._by_room, room_id),
+        ):
+            index[key] = index.get(key, 0) | bit
+
+    def __len__(self) -> int:
+        return len(self._lessons)
+
+    def _codes_bitmap(self, index: dict[int, int], codes: str | Iterable[str] | None) -> int:
+        if isinstance(codes, str) or codes is None:
+            codes = (codes,)
+        bitmap = 0
+        for code in codes:
+            code_id = self._code_ids.get(code)
+            if code_id is not None:
+                bitmap |= index.get(code_id, 0)
+        return bitmap
+
+    def select(
+        self,
+        *,
+        dates: datetime.date | Iterable[datetime.date] | None = None,
+        periods: int | Iterable[int] | None = None,
+        forms: str | Iterable[str] | None = None,
+        subjects: str | Iterable[str] | None = None,
+        teachers: str | Iterable[str] | None = None,
+        rooms: str | Iterable[str] | None = None,
+        timed: bool = False,
+    ) -> int:
+        """Return the bitmap of the rows matching all given filters.
+
+        Each filter takes one value or several, of which any may match. Filters
+        left at None don't restrict the result; timed=True keeps only lessons
+        with a start and end time.
+        """
+        bitmap = self._timed if timed else self._all
+
+        if dates is not None:
+            if isinstance(dates, datetime.date):
+                dates = (dates,)
+            day_bitmap = 0
+            for date in dates:
+                if date in self.dates:
+                    day_bitmap |= self._by_day.get(self.dates.index(date), 0)
+            bitmap &= day_bitmap
+        if periods is not None:
+            if isinstance(periods, int):
+                periods = (periods,)
+            period_bitmap = 0
+            for period in periods:
+                period_bitmap |= self._by_period.get(period, 0)
+            bitmap &= period_bitmap
+        if forms is not None:
+            bitmap &= self._codes_bitmap(self._by_form, forms)
+        if subjects is not None:
+            bitmap &= self._codes_bitmap(self._by_subject, subjects)
+        if teachers is not None:
+            bitmap &= self._codes_bitmap(self._by_teacher, teachers)
+        if rooms is not None:
+            bitmap &= self._codes_bitmap(self._by_room, rooms)
+
+        return bitmap
+
+    def rows(self, bitmap: int) -> Iterator[WeekLesson]:
+        """Yield the lessons of the rows in bitmap, by date and in plan order."""
+        for row in _bits(bitmap):
+            yield WeekLesson(
+                self.dates[self.day[row]], self.codes[self.form[row]], self._lessons[row]
+            )
+
+    def lessons(self, **filters: typing.Any) -> list[WeekLesson]:
+        """Return the lessons matching the filters of select()."""
+        return list(self.rows(self.select(**filters)))
+
+    def is_room_free(self, room: str, date: datetime.date, period: int) -> bool:
+        """Return whether no lesson takes place in room in the period on date.
+
+        Needs the lessons of the whole school; a table of some forms raises
+        ValueError, as other forms may use the room.
+        """
+        if self.forms is not None:
+            raise ValueError(f"Only the lessons of {', '.join(sorted(self.forms))} are known")
+        return not self.select(rooms=room, dates=date, periods=period)
@@ -0,0 +1,81 @@
+"""XML parsing backends for the plan parsers.
+
+The parsers only use the ElementTree API (find, text, get, attrib, iteration),
+which lxml implements as well, so either library can build the tree. Parse
+errors are raised as ET.ParseError with both.
+
+ElementTree stays the default: lxml parses about twice as fast, but creating
+its element proxies while the parsers walk the tree costs more than that, so
+whole plans end up slower. lxml can be selected explicitly when installed.
+"""
+from __future__ import annotations
+
+import typing
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+__all__ = ["BACKENDS", "DEFAULT_BACKEND", "fromstring", "iterparse"]
+
+BACKENDS: tuple[str, ...] = ("etree", "lxml") if lxml_etree is not None else ("etree",)
+DEFAULT_BACKEND = "etree"
+
+# Number of characters or bytes fed to the pull parser at once
+_CHUNK_SIZE = 64 * 1024
+
+
+def _lxml_parser_options(content: str | bytes) -> dict[str, typing.Any]:
+    return dict(
+        remove_comments=True,
+        remove_pis=True,
+        resolve_entities=False,
+        no_network=True,
+        # lxml refuses str with an encoding declaration, so str is fed as UTF-8
+        # and the declared encoding has to be overridden.
+        encoding="utf-8" if isinstance(content, str) else None,
+    )
+
+
+def fromstring(content: str | bytes, backend: str | None = None) -> ET.Element:
+    """Parse a complete document and return its root element."""
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == "etree":
+        return ET.fromstring(content)
+
+    parser = lxml_etree.XMLParser(**_lxml_parser_options(content))
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    try:
+        return lxml_etree.fromstring(data, parser)
+    except lxml_etree.XMLSyntaxError as err:
+        raise ET.ParseError(str(err)) from err
+
+
+def iterparse(
+    content: str | bytes, backend: str | None = None
+) -> typing.Iterator[tuple[str, ET.Element]]:
+    """Parse a document incrementally, yielding ("start"|"end", element) events.
+
+    Elements may be removed from their parent once their end event was seen.
+    """
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == "etree":
+        parser = ET.XMLPullParser(events=("start", "end"))
+        errors = ()
+    else:
+        parser = lxml_etree.XMLPullParser(events=("start", "end"), **_lxml_parser_options(content))
+        errors = (lxml_etree.XMLSyntaxError,)
+        content = content.encode("utf-8") if isinstance(content, str) else content
+
+    try:
+        for offset in range(0, len(content), _CHUNK_SIZE):
+            parser.feed(content[offset:offset + _CHUNK_SIZE])
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+    except errors as err:
+        raise ET.ParseError(str(err)) from err
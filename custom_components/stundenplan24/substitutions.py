@@ -0,0 +1,105 @@
+"""State attributes of substitution plans for Stundenplan24.
+
+Plans are shared by all entries of a school and replaced when they change, so
+everything derived from them here is built once per plan and memoized in weak
+mappings keyed by the plan object.
+"""
+from __future__ import annotations
+
+from typing import Any
+import weakref
+
+from homeassistant.util.read_only_dict import ReadOnlyDict
+
+from .const import ATTR_SUBSTITUTIONS
+from .stundenplan24_py.substitution_plan import Action, SubstitutionPlan, involves_forms
+
+# Rows of each plan, by form (None for all forms)
+_ROWS: weakref.WeakKeyDictionary[
+    SubstitutionPlan, dict[str | None, tuple[ReadOnlyDict, ...]]
+] = weakref.WeakKeyDictionary()
+# Attributes of each plan, by form and row budget
+_ATTRIBUTES: weakref.WeakKeyDictionary[
+    SubstitutionPlan, dict[tuple[str | None, int], ReadOnlyDict]
+] = weakref.WeakKeyDictionary()
+
+
+def substitution_rows(plan: SubstitutionPlan, form: str | None = None) -> tuple[ReadOnlyDict, ...]:
+    """Return the substitutions of a plan as rows, only those of form if given."""
+    rows_by_form = _ROWS.setdefault(plan, {})
+    rows = rows_by_form.get(form)
+    if rows is None:
+        rows = rows_by_form[form] = tuple(
+            _substitution_row(action)
+            for action in plan.actions or ()
+            if form is None or involves_forms(action.form, (form,))
+        )
+    return rows
+
+
+def substitution_attributes(
+    plan: SubstitutionPlan, form: str | None, max_rows: int
+) -> ReadOnlyDict:
+    """Return the state attributes of a substitution plan.
+
+    At most max_rows substitutions of form are included; the full list is
+    available through the websocket API. The number of substitutions of the
+    whole school comes along. Built once per plan and then served to every
+    state write and read.
+    """
+    attrs_by_budget = _ATTRIBUTES.setdefault(plan, {})
+    attrs = attrs_by_budget.get((form, max_rows))
+    if attrs is None:
+        attrs = attrs_by_budget[(form, max_rows)] = _build_attributes(plan, form, max_rows)
+    return attrs
+
+
+def _substitution_row(action: Action) -> ReadOnlyDict:
+    substitution: dict[str, Any] = {
+        "form": action.form,
+        "period": action.period,
+    }
+
+    if action.subject:
+        substitution["subject"] = str(action.subject)
+    if action.teacher:
+        substitution["teacher"] = str(action.teacher)
+    if action.room:
+        substitution["room"] = str(action.room)
+    if action.info:
+        substitution["info"] = action.info
+
+    # Add original values if changed
+    if action.original_subject:
+        substitution["original_subject"] = action.original_subject
+    if action.original_teacher:
+        substitution["original_teacher"] = action.original_teacher
+    if action.original_room:
+        substitution["original_room"] = action.original_room
+
+    return ReadOnlyDict(substitution)
+
+
+def _build_attributes(plan: SubstitutionPlan, form: str | None, max_rows: int) -> ReadOnlyDict:
+    rows = substitution_rows(plan, form)
+
+    attrs = {
+        ATTR_SUBSTITUTIONS: rows[:max_rows],
+        "date": str(plan.date) if plan.date else None,
+        "last_update": str(plan.timestamp) if plan.timestamp else None,
+        # Substitutions of all forms of the school
+        "school_total": plan.action_count,
+    }
+
+    if len(rows) > max_rows:
+        attrs["substitutions_total"] = len(rows)
+        attrs["substitutions_truncated"] = True
+
+    if plan.absent_teachers:
+        attrs["absent_teachers"] = tuple(plan.absent_teachers)
+    if plan.absent_forms:
+        attrs["absent_forms"] = tuple(plan.absent_forms)
+    if plan.additional_info:
+        attrs["additional_info"] = tuple(plan.additional_info)
+
+    return ReadOnlyDict(attrs)
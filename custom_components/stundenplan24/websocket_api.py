@@ -0,0 +1,72 @@
+"""Websocket API of the Stundenplan24 integration."""
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+from .coordinator import Stundenplan24Coordinator
+from .substitutions import substitution_rows
+
+# Substitution plans in the coordinator data, by the day passed in
+_SUBSTITUTION_DAYS = {
+    "today": "substitution_today",
+    "tomorrow": "substitution_tomorrow",
+}
+MAX_PAGE_SIZE = 500
+
+
+@callback
+def async_setup(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_substitutions)
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/substitutions",
+    vol.Required("entry_id"): str,
+    vol.Optional("day", default="today"): vol.In(list(_SUBSTITUTION_DAYS)),
+    vol.Optional("form"): vol.Any(str, None),
+    vol.Optional("offset", default=0): vol.All(int, vol.Range(min=0)),
+    vol.Optional("limit", default=100): vol.All(int, vol.Range(min=1, max=MAX_PAGE_SIZE)),
+})
+@callback
+def websocket_substitutions(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Return one page of the substitutions of a day, of all forms unless one is given.
+
+    The sensors only carry a limited number of substitutions of their form in
+    their attributes. Plans only keep the substitutions of the forms of the
+    entries of the school, school_total counts those of all forms.
+    """
+    entry_data = hass.data.get(DOMAIN, {}).get(msg["entry_id"])
+    if entry_data is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Entry not found")
+        return
+
+    # Handle both coordinator-only and dict storage
+    if isinstance(entry_data, Stundenplan24Coordinator):
+        coordinator = entry_data
+    else:
+        coordinator = entry_data["coordinator"]
+
+    plan = (coordinator.data or {}).get(_SUBSTITUTION_DAYS[msg["day"]])
+    rows = substitution_rows(plan, msg.get("form")) if plan is not None else ()
+
+    offset, limit = msg["offset"], msg["limit"]
+    next_offset = offset + limit
+    connection.send_result(msg["id"], {
+        "date": str(plan.date) if plan is not None and plan.date else None,
+        "total": len(rows),
+        "school_total": plan.action_count if plan is not None else 0,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < len(rows) else None,
+        "substitutions": list(rows[offset:next_offset]),
+    })
@@ -20,6 +20,23 @@ def auto_enable_custom_integrations(enable_custom_integrations):
     yield
 
 
+@pytest.fixture(autouse=True)
+def plan_cache_dir(tmp_path):
+    """Give every test its own, initially empty disk cache for plans."""
+    cache_dir = tmp_path / "plan_cache"
+    with patch(
+        "custom_components.stundenplan24.plan_cache.cache_root",
+        return_value=cache_dir,
+    ):
+        yield cache_dir
+
+
+@pytest.fixture
+def school_day(freezer):
+    """Freeze time on a Monday, so today and the next day are school days."""
+    freezer.move_to("2025-01-27 12:00:00+00:00")
+
+
 @pytest.fixture
 def mock_config_entry():
     """Return a mock config entry."""
@@ -0,0 +1,32 @@
+"""Turn parsed plans into plain data for comparisons in tests."""
+import dataclasses
+import datetime
+
+
+def _attributes(obj) -> dict:
+    if dataclasses.is_dataclass(obj):
+        return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+
+    attributes = dict(getattr(obj, "__dict__", {}))
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if not name.startswith("__") and hasattr(obj, name):
+                attributes[name] = getattr(obj, name)
+    return attributes
+
+
+def snapshot(obj):
+    """Return obj as JSON-compatible data, recursing into plan objects."""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return {str(key): snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [snapshot(value) for value in obj]
+
+    return {
+        "__type__": type(obj).__name__,
+        **{name: snapshot(value) for name, value in sorted(_attributes(obj).items())},
+    }
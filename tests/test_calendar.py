@@ -403,3 +403,56 @@ async def test_calendar_no_filter_shows_all_subjects(hass, mock_config_entry):
     subjects = [event.summary for event in events]
     assert "Ma" in subjects
     assert "En" in subjects
+
+
+async def test_calendar_event_index_is_reused(hass, mock_config_entry, mock_timetable_with_lessons):
+    """Test that events are built once per data and queried by range."""
+    mock_config_entry.add_to_hass(hass)
+    mock_timetable_with_lessons.content = mock_timetable_with_lessons.content.replace(
+        "<ZusatzInfo />", "<ZusatzInfo><ZiZeile>Wandertag</ZiZeile></ZusatzInfo>"
+    )
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value={"PlanKl20250125.xml": datetime.now()})
+        mock_mobil.fetch_plan = AsyncMock(return_value=mock_timetable_with_lessons)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        calendar = hass.data[DOMAIN][mock_config_entry.entry_id]["calendar"]
+        coordinator = calendar.coordinator
+
+        plan_day = datetime.combine(date(2025, 1, 25), datetime.min.time())
+        events = await calendar.async_get_events(hass, plan_day, plan_day + timedelta(days=1))
+        # The all-day event sorts at midnight, before the lessons
+        assert [event.summary for event in events] == ["Informationen", "Ma", "De", "En", "Sp"]
+
+        # Only events starting before the end of the range
+        events = await calendar.async_get_events(
+            hass, plan_day - timedelta(days=1), plan_day.replace(hour=9)
+        )
+        assert [event.summary for event in events] == ["Informationen", "Ma", "De"]
+
+        events = await calendar.async_get_events(
+            hass, plan_day + timedelta(days=1), plan_day + timedelta(days=8)
+        )
+        assert events == []
+
+        # Built once for the data, again once the data is replaced
+        index = calendar._event_index()
+        assert calendar._event_index() is index
+        coordinator.async_set_updated_data(dict(coordinator.data))
+        assert calendar._event_index() is not index
+
+        assert await hass.config_entries.async_unload(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
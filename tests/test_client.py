@@ -0,0 +1,199 @@
+"""Test the vendored stundenplan24 client."""
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py.client import (
+    Hosting,
+    IndiwareStundenplanerClient,
+    NotFoundCache,
+)
+from custom_components.stundenplan24.stundenplan24_py.errors import PlanNotFoundError
+
+CURL_REQUESTS = "custom_components.stundenplan24.stundenplan24_py.client.curl_cffi.requests"
+
+
+def _hosting() -> Hosting:
+    return Hosting.deserialize({
+        "creds": {"username": "test_user", "password": "test_password"},
+        "endpoints": "https://test-schule.stundenplan24.de/",
+    })
+
+
+def _vpdir_response() -> MagicMock:
+    return MagicMock(status_code=200, text="PlanKl20250127.xml;27.01.2025 07:00;")
+
+
+async def test_async_transport_shares_one_session():
+    """Test that all sub-clients use one AsyncSession and no worker threads."""
+    with patch(f"{CURL_REQUESTS}.AsyncSession") as mock_session_class:
+        mock_session_class.return_value.close = AsyncMock()
+        client = IndiwareStundenplanerClient(hosting=_hosting())
+
+        sub_clients = list(client.indiware_mobil_clients) + list(client.substitution_plan_clients)
+        assert len(sub_clients) == 5
+        assert mock_session_class.call_count == 1
+        assert all(sub_client.async_session is client.async_session for sub_client in sub_clients)
+        assert all(sub_client.request_executor is None for sub_client in sub_clients)
+
+        await client.close()
+
+    client.async_session.close.assert_awaited_once()
+
+
+async def test_async_transport_requests_on_event_loop():
+    """Test that requests are awaited on the AsyncSession with credentials and headers."""
+    with patch(f"{CURL_REQUESTS}.AsyncSession") as mock_session_class:
+        mock_session_class.return_value.close = AsyncMock()
+        mock_session_class.return_value.request = AsyncMock(return_value=_vpdir_response())
+        client = IndiwareStundenplanerClient(hosting=_hosting())
+
+        dates = await client.form_plan_client.fetch_dates()
+
+        await client.close()
+
+    assert list(dates) == ["PlanKl20250127.xml"]
+    assert client.form_plan_client.request_executor is None
+
+    kwargs = client.async_session.request.call_args.kwargs
+    assert kwargs["method"] == "POST"
+    assert kwargs["url"] == "https://test-schule.stundenplan24.de/mobil/_phpmob/vpdir.php"
+    assert kwargs["auth"] == ("test_user", "test_password")
+    assert kwargs["headers"]["User-Agent"] == "Indiware"
+
+
+async def test_executor_transport_shares_session_and_pool():
+    """Test that the fallback transport shares one session and one thread pool."""
+    with patch(f"{CURL_REQUESTS}.Session") as mock_session_class:
+        client = IndiwareStundenplanerClient(hosting=_hosting(), transport="executor")
+
+        sub_clients = list(client.indiware_mobil_clients) + list(client.substitution_plan_clients)
+        assert mock_session_class.call_count == 1
+        assert client.async_session is None
+        assert all(sub_client.session is client.session for sub_client in sub_clients)
+        assert len({id(sub_client.request_executor) for sub_client in sub_clients}) == 1
+
+        client.session.request.return_value = _vpdir_response()
+        dates = await client.form_plan_client.fetch_dates()
+
+        await client.close()
+
+    assert list(dates) == ["PlanKl20250127.xml"]
+    assert client.session.request.call_args.kwargs["method"] == "POST"
+    client.session.close.assert_called_once()
+
+
+def test_unknown_transport():
+    """Test that an unknown transport is rejected."""
+    with pytest.raises(ValueError):
+        IndiwareStundenplanerClient(hosting=_hosting(), transport="carrier-pigeon")
+
+
+async def test_missing_plans_are_probed_less_often():
+    """Test that a 404 is remembered by URL and re-probed on a doubling schedule."""
+    now = 0.0
+    tomorrow = date(2025, 1, 28)
+    with patch(f"{CURL_REQUESTS}.AsyncSession") as mock_session_class:
+        mock_session_class.return_value.close = AsyncMock()
+        mock_session_class.return_value.request = AsyncMock(
+            return_value=MagicMock(status_code=404)
+        )
+        client = IndiwareStundenplanerClient(hosting=_hosting())
+        client.not_found_cache.clock = lambda: now
+        substitution_client = client.students_substitution_plan_client
+        request = client.async_session.request
+
+        async def probe(day: date = tomorrow) -> None:
+            with pytest.raises(PlanNotFoundError):
+                await substitution_client.fetch_plan(day)
+
+        await probe()
+        await probe()
+        # Other URLs are not affected
+        await probe(date(2025, 1, 29))
+        assert request.call_count == 2
+
+        # Due after 15 minutes, then after 30 and 60
+        now = 15 * 60
+        await probe()
+        now += 29 * 60
+        await probe()
+        assert request.call_count == 3
+        now += 60
+        await probe()
+        assert request.call_count == 4
+        now += 59 * 60
+        await probe()
+        assert request.call_count == 4
+        now += 60
+        await probe()
+        assert request.call_count == 5
+
+        # A HEAD request finding the plan ends the schedule
+        request.return_value = MagicMock(status_code=200, headers={"ETag": '"1"'})
+        assert await substitution_client.get_metadata(tomorrow) == (None, '"1"')
+        await substitution_client.fetch_plan(tomorrow)
+        assert request.call_count == 7
+
+        await client.close()
+
+
+async def test_vpdir_listing_invalidates_missing_plans():
+    """Test that a file listed in vpdir is requested again despite an earlier 404."""
+    with patch(f"{CURL_REQUESTS}.AsyncSession") as mock_session_class:
+        mock_session_class.return_value.close = AsyncMock()
+        mock_session_class.return_value.request = AsyncMock(
+            return_value=MagicMock(status_code=404)
+        )
+        client = IndiwareStundenplanerClient(hosting=_hosting())
+        mobil_client = client.form_plan_client
+        request = client.async_session.request
+
+        for _ in range(2):
+            with pytest.raises(PlanNotFoundError):
+                await mobil_client.fetch_plan("PlanKl20250127.xml")
+        assert request.call_count == 1
+
+        request.return_value = _vpdir_response()
+        await mobil_client.fetch_dates()
+        assert mobil_client.get_url("PlanKl20250127.xml") not in client.not_found_cache
+
+        request.return_value = MagicMock(status_code=200, text="<VpMobil />")
+        response = await mobil_client.fetch_plan("PlanKl20250127.xml")
+        assert response.content == "<VpMobil />"
+        assert request.call_count == 3
+
+        await client.close()
+
+
+def test_not_found_cache_caps_the_schedule():
+    """Test that the re-probe interval stops growing at the maximum."""
+    now = 0.0
+    cache = NotFoundCache(ttl=10, max_ttl=25, clock=lambda: now)
+    for _ in range(4):
+        cache.add("url")
+    now = 24.9
+    assert "url" in cache
+    now = 25
+    assert "url" not in cache
+
+
+def test_not_found_cache_forgets_old_entries():
+    """Test that entries of past dates and long overdue ones are dropped."""
+    now = 0.0
+    cache = NotFoundCache(ttl=10, max_ttl=100, clock=lambda: now)
+    cache.add("yesterday", date(2025, 1, 26))
+    cache.add("tomorrow", date(2025, 1, 28))
+    cache.add("file")
+
+    now = 50
+    cache.add("other")
+    assert len(cache) == 4
+    cache.prune(date(2025, 1, 27))
+    assert len(cache) == 3
+
+    # Not asked for since it was due
+    now = 111
+    cache.add("other")
+    assert len(cache) == 1
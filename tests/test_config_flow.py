@@ -3,10 +3,34 @@ import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 from homeassistant import config_entries, data_entry_flow
 import aiohttp
-
-from custom_components.stundenplan24.const import DOMAIN, CONF_FORM
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.stundenplan24.const import (
+    DOMAIN,
+    CONF_FORM,
+    CONF_INCREMENTAL_REFRESH,
+    CONF_MAX_PARALLEL_REQUESTS,
+    CONF_MAX_SUBSTITUTION_ROWS,
+    CONF_USERNAME,
+    DEFAULT_INCREMENTAL_REFRESH,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
+    DEFAULT_MAX_SUBSTITUTION_ROWS,
+)
 from custom_components.stundenplan24.config_flow import CannotConnect, InvalidAuth
 
+# Fields of the options form, and what the form saves for those left alone
+OPTION_KEYS = [
+    "filter_subjects",
+    CONF_MAX_PARALLEL_REQUESTS,
+    CONF_INCREMENTAL_REFRESH,
+    CONF_MAX_SUBSTITUTION_ROWS,
+]
+DEFAULT_OPTIONS = {
+    CONF_MAX_PARALLEL_REQUESTS: DEFAULT_MAX_PARALLEL_REQUESTS,
+    CONF_INCREMENTAL_REFRESH: DEFAULT_INCREMENTAL_REFRESH,
+    CONF_MAX_SUBSTITUTION_ROWS: DEFAULT_MAX_SUBSTITUTION_ROWS,
+}
+
 
 async def test_form_initial(hass):
     """Test we get the form."""
@@ -332,7 +356,7 @@ async def test_options_flow_init(hass, mock_config_entry):
 
     # Should show multi-select with all subjects
     schema_keys = list(result["data_schema"].schema.keys())
-    assert len(schema_keys) == 1
+    assert [str(key) for key in schema_keys] == OPTION_KEYS
 
     # Get the Optional wrapper and extract the actual selector
     subject_field = schema_keys[0]
@@ -465,7 +489,7 @@ async def test_options_flow_save_filter(hass, mock_config_entry):
         )
 
     assert result2["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
-    assert result2["data"] == {"filter_subjects": ["Ma", "De"]}
+    assert result2["data"] == {"filter_subjects": ["Ma", "De"], **DEFAULT_OPTIONS}
 
 
 async def test_options_flow_default_all_subjects(hass, mock_config_entry):
@@ -520,7 +544,7 @@ async def test_options_flow_default_all_subjects(hass, mock_config_entry):
         )
 
     assert result2["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
-    assert result2["data"] == {"filter_subjects": []}
+    assert result2["data"] == {"filter_subjects": [], **DEFAULT_OPTIONS}
 
 
 async def test_options_flow_no_form_client(hass, mock_config_entry):
@@ -541,7 +565,7 @@ async def test_options_flow_no_form_client(hass, mock_config_entry):
 
     # Should show empty options when no client available
     schema_keys = list(result["data_schema"].schema.keys())
-    assert len(schema_keys) == 1
+    assert [str(key) for key in schema_keys] == OPTION_KEYS
 
     subject_field = schema_keys[0]
     validator = result["data_schema"].schema[subject_field]
@@ -573,3 +597,114 @@ async def test_options_flow_connection_error(hass, mock_config_entry):
     subject_field = schema_keys[0]
     validator = result["data_schema"].schema[subject_field]
     assert len(validator.options) == 0
+
+
+async def test_options_flow_keeps_request_options(hass, mock_config_entry):
+    """Test that request options are offered with their values and survive a save."""
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        options={
+            "filter_subjects": ["Ma"],
+            CONF_MAX_PARALLEL_REQUESTS: 2,
+            CONF_INCREMENTAL_REFRESH: False,
+            CONF_MAX_SUBSTITUTION_ROWS: 5,
+            "unknown": True,
+        },
+    )
+
+    with patch(
+        "custom_components.stundenplan24.config_flow.IndiwareStundenplanerClient"
+    ) as mock_client:
+        client_instance = mock_client.return_value
+        client_instance.form_plan_client = None
+        client_instance.close = AsyncMock()
+
+        result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+
+        defaults = {
+            str(key): key.default() for key in result["data_schema"].schema
+            if str(key) != "filter_subjects"
+        }
+        assert defaults == {
+            CONF_MAX_PARALLEL_REQUESTS: 2,
+            CONF_INCREMENTAL_REFRESH: False,
+            CONF_MAX_SUBSTITUTION_ROWS: 5,
+        }
+
+        result2 = await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            user_input={"filter_subjects": []},
+        )
+
+    assert result2["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
+    assert result2["data"] == {
+        "filter_subjects": [],
+        CONF_MAX_PARALLEL_REQUESTS: 2,
+        CONF_INCREMENTAL_REFRESH: False,
+        CONF_MAX_SUBSTITUTION_ROWS: 5,
+        "unknown": True,
+    }
+
+    # Out of range
+    with patch(
+        "custom_components.stundenplan24.config_flow.IndiwareStundenplanerClient"
+    ) as mock_client:
+        mock_client.return_value.form_plan_client = None
+        mock_client.return_value.close = AsyncMock()
+        result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+        with pytest.raises(data_entry_flow.InvalidData):
+            await hass.config_entries.options.async_configure(
+                result["flow_id"],
+                user_input={"filter_subjects": [], CONF_MAX_PARALLEL_REQUESTS: 0},
+            )
+        with pytest.raises(data_entry_flow.InvalidData):
+            await hass.config_entries.options.async_configure(
+                result["flow_id"],
+                user_input={"filter_subjects": [], CONF_MAX_SUBSTITUTION_ROWS: -1},
+            )
+
+
+async def test_options_flow_updates_school_options_of_siblings(hass, mock_config_entry):
+    """Test that the request options are saved to all entries of the same school."""
+    mock_config_entry.add_to_hass(hass)
+    sibling = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        options={"filter_subjects": ["De"], CONF_MAX_SUBSTITUTION_ROWS: 5},
+        unique_id="test_school_7b",
+    )
+    other_user = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_USERNAME: "other_user"},
+        unique_id="other_user",
+    )
+    sibling.add_to_hass(hass)
+    other_user.add_to_hass(hass)
+
+    with patch(
+        "custom_components.stundenplan24.config_flow.IndiwareStundenplanerClient"
+    ) as mock_client:
+        mock_client.return_value.form_plan_client = None
+        mock_client.return_value.close = AsyncMock()
+
+        result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+        result2 = await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            user_input={
+                "filter_subjects": [],
+                CONF_MAX_PARALLEL_REQUESTS: 2,
+                CONF_INCREMENTAL_REFRESH: False,
+                CONF_MAX_SUBSTITUTION_ROWS: 10,
+            },
+        )
+
+    assert result2["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
+    # Options of the entry itself stay its own
+    assert sibling.options == {
+        "filter_subjects": ["De"],
+        CONF_MAX_SUBSTITUTION_ROWS: 5,
+        CONF_MAX_PARALLEL_REQUESTS: 2,
+        CONF_INCREMENTAL_REFRESH: False,
+    }
+    assert other_user.options == {}
@@ -1,12 +1,53 @@
 """Test the Stundenplan24 coordinator."""
+import asyncio
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import xml.etree.ElementTree as ET
 from homeassistant.helpers.update_coordinator import UpdateFailed
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_capture_events,
+    async_fire_time_changed,
+)
 
 from custom_components.stundenplan24.coordinator import Stundenplan24Coordinator
-from custom_components.stundenplan24.const import DOMAIN, CONF_FORM
+from custom_components.stundenplan24.const import (
+    DOMAIN,
+    CONF_FORM,
+    CONF_INCREMENTAL_REFRESH,
+    CONF_MAX_PARALLEL_REQUESTS,
+    EVENT_PLAN_CHANGED,
+)
+from custom_components.stundenplan24.stundenplan24_py.client import NotFoundCache
+from custom_components.stundenplan24.stundenplan24_py.errors import NotModifiedError, PlanNotFoundError
+from custom_components.stundenplan24.stundenplan24_py.substitution_plan import SubstitutionPlan
+
+
+SUBSTITUTION_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<vp>
+  <kopf>
+    <titel>Montag, {day}. Januar 2025</titel>
+    <schulname>Testschule</schulname>
+    <datum>24.01.2025, 13:12</datum>
+    <kopfinfo>
+      <abwesendl>Mü</abwesendl>
+    </kopfinfo>
+    <datei>VplanKl202501{day}.xml</datei>
+  </kopf>
+  <freietage />
+  <haupt>
+    <aktion>
+      <klasse>{form}</klasse>
+      <stunde>3</stunde>
+      <fach>Ma</fach>
+      <lehrer legeaendert="ae">Sm</lehrer>
+      <raum>101</raum>
+      <info>für Mü</info>
+    </aktion>
+  </haupt>
+</vp>"""
 
 
 async def test_coordinator_filter_to_list_conversion(hass, mock_config_entry):
@@ -63,8 +104,8 @@ async def test_coordinator_filter_to_list_conversion(hass, mock_config_entry):
         mock_subst.fetch_plan.assert_called()
 
 
-async def test_coordinator_fetch_substitution_plans(hass, mock_config_entry):
-    """Test fetching substitution plan data."""
+async def test_coordinator_fetch_substitution_plans(hass, mock_config_entry, school_day):
+    """Test fetching and parsing substitution plan data."""
     mock_config_entry.add_to_hass(hass)
 
     with patch(
@@ -78,12 +119,10 @@ async def test_coordinator_fetch_substitution_plans(hass, mock_config_entry):
 
         # Mock substitution client
         mock_subst = MagicMock()
-        today_plan = MagicMock()
-        today_plan.date = datetime.now().date()
-        tomorrow_plan = MagicMock()
-        tomorrow_plan.date = (datetime.now() + timedelta(days=1)).date()
+        today_response = MagicMock(content=SUBSTITUTION_XML.format(day=27, form="5a"))
+        tomorrow_response = MagicMock(content=SUBSTITUTION_XML.format(day=28, form="10b"))
 
-        mock_subst.fetch_plan = AsyncMock(side_effect=[today_plan, tomorrow_plan])
+        mock_subst.fetch_plan = AsyncMock(side_effect=[today_response, tomorrow_response])
 
         client_instance = mock_client.return_value
         client_instance.indiware_mobil_clients = filter(lambda x: x is not None, [])
@@ -97,9 +136,14 @@ async def test_coordinator_fetch_substitution_plans(hass, mock_config_entry):
         coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
         await coordinator.async_refresh()
 
-        # Verify data structure
-        assert coordinator.data["substitution_today"] == today_plan
-        assert coordinator.data["substitution_tomorrow"] == tomorrow_plan
+        # Verify data structure - should be parsed SubstitutionPlans
+        today_plan = coordinator.data["substitution_today"]
+        tomorrow_plan = coordinator.data["substitution_tomorrow"]
+        assert today_plan.date == date(2025, 1, 27)
+        assert tomorrow_plan.date == date(2025, 1, 28)
+        assert today_plan.actions[0].form == "5a"
+        assert str(today_plan.actions[0].teacher) == "Sm"
+        assert tomorrow_plan.actions[0].form == "10b"
 
         # Verify fetch_plan was called twice (today and tomorrow)
         assert mock_subst.fetch_plan.call_count == 2
@@ -177,6 +221,14 @@ async def test_coordinator_fetch_mobil_plans(hass, mock_config_entry):
         assert "timetables" in coordinator.data
         assert len(coordinator.data["timetables"]) > 0
 
+        # The columnar index covers the lessons of the selected form
+        week = coordinator.data["week"]
+        assert week.dates == sorted(coordinator.data["timetables"])
+        assert week.forms is None
+        assert {row.form for row in week.lessons()} <= {"5a"}
+        assert week.is_room_free("101", week.dates[0], 1)
+        assert set(coordinator.data["lessons"].dates) <= set(week.dates)
+
         # Verify fetch_dates was called
         mock_mobil.fetch_dates.assert_called_once()
 
@@ -457,3 +509,857 @@ async def test_coordinator_filters_selected_form(hass, mock_config_entry):
         # Should only have form 5a
         assert len(timetable.forms) == 1
         assert timetable.forms[0].short_name == "5a"
+
+        # So does the columnar index, which can't tell about rooms of other forms
+        week = coordinator.data["week"]
+        assert week.forms == {"5a"}
+        with pytest.raises(ValueError):
+            week.is_room_free("101", week.dates[0], 1)
+
+
+async def test_coordinator_fetches_plans_concurrently(hass, mock_config_entry):
+    """Test that plan downloads overlap but stay within the parallel request limit."""
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        options={CONF_MAX_PARALLEL_REQUESTS: 2}
+    )
+
+    xml_template = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <zeitstempel>2{day}.01.2025, 08:00</zeitstempel>
+    <DatumPlan>Montag, 2{day}. Januar 2025</DatumPlan>
+    <datei>PlanKl2025012{day}.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fetch_plan(date_or_filename):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return MagicMock(content=xml_template.format(day=date_or_filename[-5]))
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value={
+            f"PlanKl2025012{day}.xml": datetime(2025, 1, 20 + day) for day in range(5)
+        })
+        mock_mobil.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = filter(lambda x: x is not None, [mock_mobil])
+        client_instance.substitution_plan_clients = filter(lambda x: x is not None, [])
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+
+    assert mock_mobil.fetch_plan.call_count == 5
+    assert max_in_flight == 2
+    assert len(coordinator.data["timetables"]) == 5
+    assert "timetable_fetch_errors" not in coordinator.data
+
+
+async def test_coordinator_collects_per_file_errors(hass, mock_config_entry):
+    """Test that a failing file is reported without dropping the others."""
+    mock_config_entry.add_to_hass(hass)
+
+    xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <DatumPlan>Samstag, 25. Januar 2025</DatumPlan>
+    <datei>PlanKl20250125.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    async def fetch_plan(date_or_filename):
+        if date_or_filename == "PlanKl20250124.xml":
+            raise Exception("Timeout")
+        if date_or_filename == "PlanKl20250123.xml":
+            return MagicMock(content="<html>Login</html")
+        return MagicMock(content=xml_content)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value={
+            "PlanKl20250125.xml": datetime(2025, 1, 25),
+            "PlanKl20250124.xml": datetime(2025, 1, 24),
+            "PlanKl20250123.xml": datetime(2025, 1, 23),
+        })
+        mock_mobil.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = filter(lambda x: x is not None, [mock_mobil])
+        client_instance.substitution_plan_clients = filter(lambda x: x is not None, [])
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+
+    assert len(coordinator.data["timetables"]) == 1
+    errors = coordinator.data["timetable_fetch_errors"]
+    assert errors["PlanKl20250124.xml"] == "Timeout"
+    assert errors["PlanKl20250123.xml"].startswith("XML parse error")
+
+
+async def test_coordinator_reuses_parsed_plans_when_not_modified(hass, mock_config_entry):
+    """Test that validators are sent and a 304 reuses the previously parsed plans."""
+    mock_config_entry.add_to_hass(hass)
+    # Always revalidate timetables instead of trusting the vpdir listing
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        options={CONF_INCREMENTAL_REFRESH: False}
+    )
+
+    xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <DatumPlan>Samstag, 25. Januar 2025</DatumPlan>
+    <datei>PlanKl20250125.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    last_modified = datetime(2025, 1, 24, 12, 0)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value={"PlanKl20250125.xml": last_modified})
+        mock_mobil.fetch_plan = AsyncMock(side_effect=[
+            MagicMock(content=xml_content, last_modified=last_modified, etag='"abc"'),
+            NotModifiedError("not modified", 304),
+        ])
+
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=[
+            MagicMock(content=SUBSTITUTION_XML.format(day=27, form="5a"), last_modified=None, etag='"t1"'),
+            MagicMock(content=SUBSTITUTION_XML.format(day=28, form="5a"), last_modified=None, etag='"t2"'),
+            NotModifiedError("not modified", 304),
+            NotModifiedError("not modified", 304),
+        ])
+
+        client_instance = mock_client.return_value
+        # Lists instead of filter objects, as they are iterated on every refresh
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+        first_data = coordinator.data
+
+        await coordinator.async_refresh()
+
+    # The very same parsed objects are reused
+    assert coordinator.last_update_success
+    assert coordinator.data["timetable"] is first_data["timetable"]
+    assert coordinator.data["week"] is first_data["week"]
+    assert coordinator.data["lessons"] is first_data["lessons"]
+    assert coordinator.data["substitution_today"] is first_data["substitution_today"]
+    assert coordinator.data["substitution_tomorrow"] is first_data["substitution_tomorrow"]
+
+    # The second round sent the validators of the first responses
+    first_call, second_call = mock_mobil.fetch_plan.call_args_list
+    assert "if_modified_since" not in first_call.kwargs
+    assert second_call.kwargs["if_modified_since"] == last_modified
+    assert second_call.kwargs["if_none_match"] == '"abc"'
+
+    subst_calls = mock_subst.fetch_plan.call_args_list
+    assert {call.kwargs.get("if_none_match") for call in subst_calls[2:]} == {'"t1"', '"t2"'}
+    assert all("if_modified_since" not in call.kwargs for call in subst_calls)
+
+
+async def test_coordinator_incremental_refresh_uses_vpdir_timestamps(hass, mock_config_entry):
+    """Test that only new or changed plan files are downloaded again."""
+    mock_config_entry.add_to_hass(hass)
+
+    xml_template = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <DatumPlan>Montag, {day}. Januar 2025</DatumPlan>
+    <datei>PlanKl202501{day}.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        return MagicMock(
+            content=xml_template.format(day=date_or_filename[12:14]),
+            last_modified=None,
+            etag=None,
+        )
+
+    listing = {
+        f"PlanKl202501{day}.xml": datetime(2025, 1, day, 7, 0) for day in range(20, 27)
+    }
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value=listing)
+        mock_mobil.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+        assert mock_mobil.fetch_plan.call_count == 7
+        first_timetables = coordinator.data["timetables"]
+
+        # Nothing changed: only the vpdir listing is requested
+        mock_mobil.fetch_plan.reset_mock()
+        await coordinator.async_refresh()
+        assert mock_mobil.fetch_plan.call_count == 0
+        assert coordinator.data["timetables"] == first_timetables
+
+        # One file changed and a new one pushes the oldest out of the window
+        listing = dict(listing)
+        listing["PlanKl20250126.xml"] = datetime(2025, 1, 26, 9, 30)
+        listing["PlanKl20250127.xml"] = datetime(2025, 1, 27, 7, 0)
+        mock_mobil.fetch_dates = AsyncMock(return_value=listing)
+        mock_mobil.fetch_plan.reset_mock()
+        await coordinator.async_refresh()
+
+    fetched = sorted(call.kwargs["date_or_filename"] for call in mock_mobil.fetch_plan.call_args_list)
+    assert fetched == ["PlanKl20250126.xml", "PlanKl20250127.xml"]
+
+    timetables = coordinator.data["timetables"]
+    assert date(2025, 1, 20) not in timetables
+    assert date(2025, 1, 27) in timetables
+    assert timetables[date(2025, 1, 21)] is first_timetables[date(2025, 1, 21)]
+    assert "PlanKl20250120.xml" not in coordinator.store._timetable_cache
+
+
+async def test_coordinator_warm_starts_from_disk_cache(hass, mock_config_entry, school_day, plan_cache_dir):
+    """Test that a restart serves the stored plans first and then only revalidates them."""
+    mock_config_entry.add_to_hass(hass)
+
+    xml_template = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <DatumPlan>Montag, {day}. Januar 2025</DatumPlan>
+    <datei>PlanKl202501{day}.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        return MagicMock(
+            content=xml_template.format(day=date_or_filename[12:14]),
+            last_modified=datetime(2025, 1, 24, 12, 0),
+            etag=f'"{date_or_filename}"',
+        )
+
+    listing = {
+        f"PlanKl202501{day}.xml": datetime(2025, 1, day, 7, 0) for day in range(20, 23)
+    }
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value=listing)
+        mock_mobil.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(return_value=MagicMock(
+            content=SUBSTITUTION_XML.format(day=27, form="5a"), last_modified=None, etag='"t"'
+        ))
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+        first_data = coordinator.data
+        await coordinator.async_shutdown()
+
+        school_dir = next(plan_cache_dir.iterdir())
+        assert (school_dir / "index.json").is_file()
+        assert len(list((school_dir / "timetables").glob("*.snap"))) == 3
+
+        # Restoring the parsed plans needs the snapshots only
+        for content in (school_dir / "timetables").glob("*.xml"):
+            content.unlink()
+
+        # "Restart": a new store reads the plans back without asking the server
+        mock_mobil.fetch_dates.reset_mock()
+        mock_mobil.fetch_plan.reset_mock()
+        mock_subst.fetch_plan.reset_mock()
+        mock_subst.fetch_plan.side_effect = NotModifiedError("not modified", 304)
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+
+        assert coordinator.last_update_success
+        assert sorted(coordinator.data["timetables"]) == sorted(first_data["timetables"])
+        assert coordinator.data["substitution_today"].date == first_data["substitution_today"].date
+        mock_mobil.fetch_dates.assert_not_called()
+        mock_subst.fetch_plan.assert_not_called()
+
+        # The revalidation in the background is conditional
+        await hass.async_block_till_done(wait_background_tasks=True)
+        await coordinator.async_shutdown()
+
+    mock_mobil.fetch_dates.assert_called_once()
+    mock_mobil.fetch_plan.assert_not_called()
+    assert {call.kwargs["if_none_match"] for call in mock_subst.fetch_plan.call_args_list} == {'"t"'}
+    assert coordinator.last_update_success
+    assert sorted(coordinator.data["timetables"]) == sorted(first_data["timetables"])
+
+
+async def test_coordinators_of_same_school_share_plan_downloads(hass, mock_config_entry):
+    """Test that entries of one school download and parse each plan file once."""
+    entry_5a = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "5a"},
+        unique_id="test_school_5a",
+    )
+    entry_7b = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        unique_id="test_school_7b",
+    )
+    entry_5a.add_to_hass(hass)
+    entry_7b.add_to_hass(hass)
+
+    xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>1</planart>
+    <DatumPlan>Samstag, 25. Januar 2025</DatumPlan>
+    <datei>PlanKl20250125.xml</datei>
+  </Kopf>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <Pl />
+    </Kl>
+    <Kl>
+      <Kurz>7b</Kurz>
+      <Pl />
+    </Kl>
+  </Klassen>
+</VpMobil>"""
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(side_effect=[
+            {"PlanKl20250125.xml": datetime(2025, 1, 24, 12, 0)},
+            {"PlanKl20250125.xml": datetime(2025, 1, 24, 13, 0)},
+        ])
+        changed_content = xml_content.replace(
+            "</Klassen>", "</Klassen><ZusatzInfo><ZiZeile>Wandertag</ZiZeile></ZusatzInfo>"
+        )
+        mock_mobil.fetch_plan = AsyncMock(side_effect=[
+            MagicMock(content=xml_content, last_modified=None, etag=None),
+            MagicMock(content=changed_content, last_modified=None, etag=None),
+        ])
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        coordinator_5a = Stundenplan24Coordinator(hass, entry_5a)
+        coordinator_7b = Stundenplan24Coordinator(hass, entry_7b)
+
+        # Refreshes running at the same time are coalesced
+        await asyncio.gather(coordinator_5a.async_refresh(), coordinator_7b.async_refresh())
+
+        assert mock_client.call_count == 1
+        assert mock_mobil.fetch_dates.call_count == 1
+        assert mock_mobil.fetch_plan.call_count == 1
+
+        # Each entry sees its own form, the shared plan holds the forms of both
+        assert [f.short_name for f in coordinator_5a.data["timetable"].forms] == ["5a"]
+        assert [f.short_name for f in coordinator_7b.data["timetable"].forms] == ["7b"]
+        shared_plan = coordinator_5a.store._plans.timetables["PlanKl20250125.xml"]
+        assert [f.short_name for f in shared_plan.forms] == ["5a", "7b"]
+
+        # A refresh of one entry bringing a changed plan is passed on to the other one
+        listener = MagicMock()
+        unsub = coordinator_7b.async_add_listener(listener)
+        await coordinator_5a.async_refresh()
+        assert mock_mobil.fetch_dates.call_count == 2
+        listener.assert_called_once()
+        unsub()
+
+        # An entry added later gets the plans just fetched, they cover its form
+        coordinator_twin = Stundenplan24Coordinator(hass, entry_5a)
+        await coordinator_twin.async_refresh()
+        assert mock_mobil.fetch_dates.call_count == 2
+        assert coordinator_twin.data["timetable"].forms[0].short_name == "5a"
+        await coordinator_twin.async_shutdown()
+
+        await coordinator_5a.async_shutdown()
+        client_instance.close.assert_not_called()
+        await coordinator_7b.async_shutdown()
+        client_instance.close.assert_awaited_once()
+
+
+async def test_coordinator_applies_request_options_to_shared_store(hass, mock_config_entry):
+    """Test that an entry set up with changed request options applies them to a live store."""
+    entry_5a = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "5a"},
+        unique_id="test_school_5a",
+    )
+    entry_7b = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        options={CONF_MAX_PARALLEL_REQUESTS: 1, CONF_INCREMENTAL_REFRESH: False},
+        unique_id="test_school_7b",
+    )
+    entry_5a.add_to_hass(hass)
+    entry_7b.add_to_hass(hass)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        coordinator_5a = Stundenplan24Coordinator(hass, entry_5a)
+        await coordinator_5a.async_refresh()
+        store = coordinator_5a.store
+        assert store._incremental_refresh
+        assert store._max_parallel_requests == 4
+
+        coordinator_7b = Stundenplan24Coordinator(hass, entry_7b)
+        await coordinator_7b.async_refresh()
+        assert coordinator_7b.store is store
+        assert not store._incremental_refresh
+        assert store._max_parallel_requests == 1
+        assert store._request_semaphore._value == 1
+
+        await coordinator_5a.async_shutdown()
+        await coordinator_7b.async_shutdown()
+
+
+async def test_coordinators_of_same_school_poll_together(hass, mock_config_entry, freezer):
+    """Test that a refresh of one entry moves the next poll of the others along."""
+    freezer.move_to("2025-01-27 12:00:00+00:00")
+    entry_5a = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "5a"},
+        unique_id="test_school_5a",
+    )
+    entry_7b = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        unique_id="test_school_7b",
+    )
+    entry_5a.add_to_hass(hass)
+    entry_7b.add_to_hass(hass)
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        content = SUBSTITUTION_XML.format(day=date_or_filename.day, form="5a")
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        def rounds() -> int:
+            # Two substitution plans per round
+            return mock_subst.fetch_plan.call_count // 2
+
+        coordinator_5a = Stundenplan24Coordinator(hass, entry_5a)
+        coordinator_7b = Stundenplan24Coordinator(hass, entry_7b)
+        await coordinator_5a.async_refresh()
+        unsub_5a = coordinator_5a.async_add_listener(MagicMock())
+        assert rounds() == 1
+
+        # Set up ten minutes later
+        freezer.tick(timedelta(minutes=10))
+        await coordinator_7b.async_refresh()
+        unsub_7b = coordinator_7b.async_add_listener(MagicMock())
+        assert rounds() == 2
+
+        # The unchanged plans of 7b's refresh moved the poll of 5a along
+        freezer.tick(timedelta(minutes=20))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done(wait_background_tasks=True)
+        assert rounds() == 2
+
+        freezer.tick(timedelta(minutes=10))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done(wait_background_tasks=True)
+        assert rounds() == 3
+
+        unsub_5a()
+        unsub_7b()
+        await coordinator_5a.async_shutdown()
+        await coordinator_7b.async_shutdown()
+
+
+async def test_coordinator_reports_changed_plans(hass, mock_config_entry, school_day):
+    """Test that refreshes tell which data changed and fire events for changed rows."""
+    mock_config_entry.add_to_hass(hass)
+    events = async_capture_events(hass, EVENT_PLAN_CHANGED)
+
+    teacher = "Sm"
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        day = 27 if date_or_filename == dt_util.now().date() else 28
+        content = SUBSTITUTION_XML.format(day=day, form="5a")
+        if day == 27:
+            content = content.replace(">Sm</lehrer>", f">{teacher}</lehrer>")
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+        assert coordinator.changed_keys is None
+        assert coordinator.data_changed(["substitution_today"])
+
+        # Downloaded again, but the same content
+        await coordinator.async_refresh()
+        assert coordinator.changed_keys == frozenset()
+        assert not coordinator.data_changed(["substitution_today", "substitution_tomorrow"])
+
+        teacher = "Kr"
+        await coordinator.async_refresh()
+        assert coordinator.changed_keys == frozenset({"substitution_today"})
+        assert not coordinator.data_changed(["substitution_tomorrow"])
+
+        await coordinator.async_shutdown()
+
+    await hass.async_block_till_done()
+    assert len(events) == 1
+    assert events[0].data == {
+        "entry_id": mock_config_entry.entry_id,
+        "form": None,
+        "plan": "substitution",
+        "date": "2025-01-27",
+        "changes": [{
+            "change": "changed",
+            "form": "5a",
+            "period": "3",
+            "fields": ["teacher"],
+            "subject": "Ma",
+            "teacher": "Kr",
+            "room": "101",
+            "previous": {"teacher": "Sm"},
+        }],
+    }
+
+
+async def test_coordinator_reports_changes_of_its_form_only(hass, mock_config_entry, school_day):
+    """Test that entries sharing a store don't report the changes of each other's form."""
+    entry_5a = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "5a"},
+        unique_id="test_school_5a",
+    )
+    entry_7b = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        unique_id="test_school_7b",
+    )
+    entry_5a.add_to_hass(hass)
+    entry_7b.add_to_hass(hass)
+    events = async_capture_events(hass, EVENT_PLAN_CHANGED)
+
+    teacher_7b = "Sm"
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        content = SUBSTITUTION_XML.format(day=date_or_filename.day, form="5a")
+        action_7b = content[content.index("<aktion>"):content.index("</haupt>")].replace(
+            "5a", "7b"
+        ).replace(">Sm</lehrer>", f">{teacher_7b}</lehrer>")
+        content = content.replace("</haupt>", f"{action_7b}</haupt>")
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator_5a = Stundenplan24Coordinator(hass, entry_5a)
+        coordinator_7b = Stundenplan24Coordinator(hass, entry_7b)
+        await asyncio.gather(coordinator_5a.async_refresh(), coordinator_7b.async_refresh())
+
+        # Only the substitution of 7b changed, 5a gets the plans through the store
+        teacher_7b = "Kr"
+        await coordinator_7b.async_refresh()
+
+        assert coordinator_7b.changed_keys == frozenset({"substitution_today", "substitution_tomorrow"})
+        assert coordinator_5a.changed_keys == frozenset()
+        assert not coordinator_5a.data_changed(["substitution_today", "substitution_tomorrow"])
+
+        await coordinator_5a.async_shutdown()
+        await coordinator_7b.async_shutdown()
+
+    await hass.async_block_till_done()
+    assert len(events) == 2
+    for event in events:
+        assert event.data["entry_id"] == entry_7b.entry_id
+        assert event.data["form"] == "7b"
+        assert [change["form"] for change in event.data["changes"]] == ["7b"]
+
+
+async def test_coordinator_skips_listeners_for_unchanged_content(hass, mock_config_entry, school_day):
+    """Test that re-downloaded identical plans keep the data and don't notify entities."""
+    mock_config_entry.add_to_hass(hass)
+
+    room = "101"
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        day = 27 if date_or_filename == dt_util.now().date() else 28
+        content = SUBSTITUTION_XML.format(day=day, form="5a")
+        if day == 27:
+            content = content.replace(">101<", f">{room}<")
+        # No validators, so every refresh downloads the full plans
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ), patch(
+        "custom_components.stundenplan24.plan_store.SubstitutionPlan.from_xml",
+        wraps=SubstitutionPlan.from_xml,
+    ) as from_xml:
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        listener = MagicMock()
+        unsubscribe = coordinator.async_add_listener(listener)
+
+        await coordinator.async_refresh()
+        first_data = coordinator.data
+        assert listener.call_count == 1
+        assert from_xml.call_count == 2
+
+        await coordinator.async_refresh()
+        assert coordinator.data is first_data
+        assert coordinator.changed_keys == frozenset()
+        assert listener.call_count == 1
+        # Identical content is not parsed again
+        assert from_xml.call_count == 2
+
+        room = "102"
+        await coordinator.async_refresh()
+        assert coordinator.data is not first_data
+        assert coordinator.data["substitution_today"].actions[0].room.content == "102"
+        assert listener.call_count == 2
+        assert from_xml.call_count == 3
+
+        unsubscribe()
+        await coordinator.async_shutdown()
+
+
+async def test_coordinator_fetches_substitution_plans_of_school_days(
+    hass, mock_config_entry, freezer
+):
+    """Test that substitution plans are only requested for school days."""
+    mock_config_entry.add_to_hass(hass)
+    # Friday
+    freezer.move_to("2025-01-24 12:00:00+00:00")
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        content = SUBSTITUTION_XML.format(day=date_or_filename.day, form="5a").replace(
+            "<freietage />", "<freietage><ft>250128</ft></freietage>"
+        )
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        def fetched_days() -> list[date]:
+            days = [call.kwargs["date_or_filename"] for call in mock_subst.fetch_plan.call_args_list]
+            mock_subst.fetch_plan.reset_mock()
+            return sorted(days)
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+
+        # Not Saturday, but the next school day
+        assert fetched_days() == [date(2025, 1, 24), date(2025, 1, 27)]
+        assert coordinator.data["substitution_today"].date == date(2025, 1, 24)
+        assert coordinator.data["substitution_tomorrow"].date == date(2025, 1, 27)
+
+        # The plans told that Tuesday is a free day
+        freezer.move_to("2025-01-25 12:00:00+00:00")
+        await coordinator.async_refresh()
+
+        assert fetched_days() == [date(2025, 1, 27), date(2025, 1, 29)]
+        assert coordinator.data["substitution_today"] is None
+        assert coordinator.data["substitution_tomorrow"].date == date(2025, 1, 27)
+
+        await coordinator.async_shutdown()
+
+
+async def test_coordinator_asks_for_missing_plans_once_published(hass, mock_config_entry, school_day):
+    """Test that a substitution plan the server was missing is asked for once a plan is published."""
+    mock_config_entry.add_to_hass(hass)
+
+    not_found_cache = NotFoundCache(clock=lambda: 0.0)
+    published = False
+    requested = []
+
+    def get_url(date_or_filename=None):
+        return f"vdaten/VplanKl{date_or_filename or ''}.xml"
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        url = get_url(date_or_filename)
+        if url in not_found_cache:
+            raise PlanNotFoundError("cached", 404)
+        requested.append(date_or_filename)
+        if date_or_filename == date(2025, 1, 28) and not published:
+            not_found_cache.add(url, date_or_filename)
+            raise PlanNotFoundError("missing", 404)
+        content = SUBSTITUTION_XML.format(day=date_or_filename.day, form="5a")
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+        mock_subst.get_url = get_url
+        mock_subst.not_found_cache = not_found_cache
+        mock_subst.get_metadata = AsyncMock(
+            side_effect=lambda: (None, '"2"' if published else '"1"')
+        )
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        coordinator = Stundenplan24Coordinator(hass, mock_config_entry)
+        await coordinator.async_refresh()
+        assert requested.count(date(2025, 1, 28)) == 1
+        assert coordinator.data["substitution_tomorrow"] is None
+        mock_subst.get_metadata.assert_not_called()
+
+        # Nothing published since, the missing plan is not asked for before its time
+        await coordinator.async_refresh()
+        assert requested.count(date(2025, 1, 28)) == 1
+        assert mock_subst.get_metadata.call_count == 1
+
+        published = True
+        await coordinator.async_refresh()
+        assert requested.count(date(2025, 1, 28)) == 2
+        assert mock_subst.get_metadata.call_count == 2
+        assert coordinator.data["substitution_tomorrow"].date == date(2025, 1, 28)
+
+        await coordinator.async_shutdown()
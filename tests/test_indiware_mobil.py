@@ -0,0 +1,155 @@
+"""Test parsing of Indiware Mobil plans."""
+from datetime import date, time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+
+
+PLAN_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<VpMobil>
+  <Kopf>
+    <planart>K</planart>
+    <zeitstempel>24.01.2025, 13:12</zeitstempel>
+    <DatumPlan>Montag, 27. Januar 2025</DatumPlan>
+    <datei>PlanKl20250127.xml</datei>
+    <woche>2</woche>
+    <tageprowoche>5</tageprowoche>
+    <schulnummer>10000000</schulnummer>
+  </Kopf>
+  <FreieTage>
+    <ft>250203</ft>
+  </FreieTage>
+  <Klassen>
+    <Kl>
+      <Kurz>5a</Kurz>
+      <KlStunden>
+        <KlSt ZeitVon="07:30" ZeitBis="08:15">1</KlSt>
+        <KlSt ZeitVon="08:25" ZeitBis="09:10">2</KlSt>
+      </KlStunden>
+      <Kurse>
+        <Ku><KKz KLe="Mü">Ma</KKz></Ku>
+      </Kurse>
+      <Unterricht>
+        <Ue><UeNr UeLe="Mü" UeFa="Ma">17</UeNr></Ue>
+      </Unterricht>
+      <Pl>
+        <Std>
+          <St>1</St>
+          <Beginn>07:30</Beginn>
+          <Ende>08:15</Ende>
+          <Fa>Ma</Fa>
+          <Le LeAe="LeGeaendert">Sm</Le>
+          <Ra>101</Ra>
+          <Nr>17</Nr>
+          <If>für Mü</If>
+        </Std>
+      </Pl>
+    </Kl>
+    <Kl>
+      <Kurz>7b</Kurz>
+      <Unterricht>
+        <Ue><UeNr>missing attributes, fails to parse</UeNr></Ue>
+      </Unterricht>
+    </Kl>
+    <Kl>
+      <Kurz>10c</Kurz>
+      <Pl>
+        <Std>
+          <St>2</St>
+          <Fa>De</Fa>
+          <Le>Sm</Le>
+          <Ra>203</Ra>
+          <If />
+        </Std>
+      </Pl>
+    </Kl>
+  </Klassen>
+  <ZusatzInfo>
+    <ZiZeile>Wandertag der 7b</ZiZeile>
+  </ZusatzInfo>
+</VpMobil>"""
+
+
+def _without_form(xml: str, short_name: str) -> str:
+    root = ET.fromstring(xml)
+    klassen = root.find("Klassen")
+    for kl in klassen.findall("Kl"):
+        if kl.find("Kurz").text == short_name:
+            klassen.remove(kl)
+    return ET.tostring(root, encoding="unicode")
+
+
+def test_stream_matches_tree_parser():
+    """Test that the streaming parser yields the same plan as from_xml."""
+    xml = _without_form(PLAN_XML, "7b")
+    expected = IndiwareMobilPlan.from_xml(ET.fromstring(xml))
+    plan = IndiwareMobilPlan.from_xml_stream(xml)
+
+    for attribute in (
+        "plan_type", "timestamp", "date", "filename", "native",
+        "week", "days_per_week", "school_number", "free_days", "additional_info",
+    ):
+        assert getattr(plan, attribute) == getattr(expected, attribute)
+
+    assert [form.short_name for form in plan.forms] == ["5a", "10c"]
+    form, expected_form = plan.forms[0], expected.forms[0]
+    assert form.periods == expected_form.periods == {
+        1: (time(7, 30), time(8, 15)),
+        2: (time(8, 25), time(9, 10)),
+    }
+    assert form.courses == expected_form.courses
+    assert form.classes == expected_form.classes
+
+    lesson = form.lessons[0]
+    assert lesson.period == 1
+    assert lesson.teacher.content == "Sm"
+    assert lesson.teacher.was_changed
+    assert lesson.information == "für Mü"
+
+
+def test_stream_skips_forms_not_selected():
+    """Test that forms outside the allow-list are never parsed."""
+    plan = IndiwareMobilPlan.from_xml_stream(PLAN_XML.encode(), forms={"5a", "10c"})
+
+    assert plan.date == date(2025, 1, 27)
+    assert [form.short_name for form in plan.forms] == ["5a", "10c"]
+    assert plan.additional_info == ["Wandertag der 7b"]
+
+    plan = IndiwareMobilPlan.from_xml_stream(PLAN_XML, forms={"10c"})
+    assert [form.short_name for form in plan.forms] == ["10c"]
+    assert plan.forms[0].lessons[0].subject.content == "De"
+
+    # The broken 7b is parsed as soon as it is selected
+    with pytest.raises(KeyError):
+        IndiwareMobilPlan.from_xml_stream(PLAN_XML, forms={"7b"})
+
+
+def test_stream_rejects_truncated_document():
+    """Test that a truncated plan raises a parse error."""
+    with pytest.raises(ET.ParseError):
+        IndiwareMobilPlan.from_xml_stream(PLAN_XML[:len(PLAN_XML) // 2], forms={"5a"})
+
+
+def test_lesson_without_required_child_is_rejected():
+    """Test that a lesson missing a mandatory child raises a ValueError."""
+    xml = PLAN_XML.replace("<Fa>De</Fa>", "")
+
+    with pytest.raises(ValueError, match="<Std> lacks"):
+        IndiwareMobilPlan.from_xml_stream(xml, forms={"10c"})
+
+
+def test_parsed_objects_are_compact():
+    """Test that plan objects have no instance dict and share repeating values."""
+    plan = IndiwareMobilPlan.from_xml_stream(_without_form(PLAN_XML, "7b"))
+    first, second = plan.forms[0].lessons[0], plan.forms[1].lessons[0]
+
+    assert not hasattr(plan, "__dict__")
+    assert not hasattr(first, "__dict__")
+    # Both lessons are taught by Sm, just one of them is changed
+    assert first.teacher.content is second.teacher.content
+    assert first.teacher is not second.teacher
+    assert plan.forms[1].lessons[0].teacher is IndiwareMobilPlan.from_xml_stream(
+        PLAN_XML, forms={"10c"}
+    ).forms[0].lessons[0].teacher
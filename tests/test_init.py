@@ -1,10 +1,13 @@
 """Test the Stundenplan24 integration."""
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
+from homeassistant.config_entries import ConfigEntryState
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
-from custom_components.stundenplan24.const import DOMAIN
+from custom_components.stundenplan24.const import CONF_FORM, CONF_SCHOOL_URL, CONF_USERNAME, DOMAIN
 from custom_components.stundenplan24.coordinator import Stundenplan24Coordinator
+from custom_components.stundenplan24.plan_cache import PlanDiskCache
+from custom_components.stundenplan24.registry import async_get_plan_store_registry
 
 
 async def test_setup_unload_entry(hass, mock_config_entry):
@@ -152,3 +155,112 @@ async def test_reload_entry(hass, mock_config_entry):
 
         assert DOMAIN in hass.data
         assert mock_config_entry.entry_id in hass.data[DOMAIN]
+
+
+async def test_entries_of_same_school_share_client(hass, mock_config_entry):
+    """Test that entries for the same school share one client until the last unload."""
+    sibling_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        unique_id="test_school_7b",
+    )
+    other_school_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_SCHOOL_URL: "https://andere-schule.stundenplan24.de"},
+        unique_id="other_school",
+    )
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_client.side_effect = lambda hosting: MagicMock(
+            indiware_mobil_clients=[],
+            substitution_plan_clients=[],
+            close=AsyncMock(),
+        )
+
+        for entry in (mock_config_entry, sibling_entry, other_school_entry):
+            entry.add_to_hass(hass)
+            assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+        coordinators = [
+            hass.data[DOMAIN][entry.entry_id]["coordinator"]
+            for entry in (mock_config_entry, sibling_entry, other_school_entry)
+        ]
+        first, sibling, other = (coordinator.client for coordinator in coordinators)
+
+        # One client per school, not per entry
+        assert mock_client.call_count == 2
+        assert first is sibling
+        assert first is not other
+
+        assert await hass.config_entries.async_unload(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+        first.close.assert_not_called()
+
+        assert await hass.config_entries.async_unload(sibling_entry.entry_id)
+        await hass.async_block_till_done()
+        first.close.assert_called_once()
+        other.close.assert_not_called()
+
+
+async def test_remove_entry_deletes_plan_cache(hass, mock_config_entry, plan_cache_dir):
+    """Test that the cached plans of a school go with the last entry using them."""
+    sibling_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_FORM: "7b"},
+        unique_id="test_school_7b",
+    )
+    other_school_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={**mock_config_entry.data, CONF_SCHOOL_URL: "https://andere-schule.stundenplan24.de"},
+        unique_id="other_school",
+    )
+
+    async def store_plans(entry: MockConfigEntry):
+        cache = PlanDiskCache.for_school(
+            hass, entry.data[CONF_SCHOOL_URL], entry.data[CONF_USERNAME]
+        )
+        await hass.async_add_executor_job(cache.save, {}, {})
+
+    await store_plans(other_school_entry)
+    (other_school_dir,) = plan_cache_dir.iterdir()
+    await store_plans(mock_config_entry)
+    (school_dir,) = set(plan_cache_dir.iterdir()) - {other_school_dir}
+
+    for entry in (mock_config_entry, sibling_entry, other_school_entry):
+        entry.add_to_hass(hass)
+
+    # The sibling still uses the cache
+    await hass.config_entries.async_remove(mock_config_entry.entry_id)
+    assert school_dir.is_dir()
+
+    await hass.config_entries.async_remove(sibling_entry.entry_id)
+    assert not school_dir.exists()
+    assert other_school_dir.is_dir()
+
+
+async def test_failed_setup_releases_plan_store(hass, mock_config_entry):
+    """Test that a setup retried after a failed first refresh leaves no store behind."""
+    mock_config_entry.add_to_hass(hass)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        client_instance = mock_client.return_value
+        # Not iterable, so the refresh fails
+        client_instance.indiware_mobil_clients = None
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        assert not await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert mock_config_entry.state is ConfigEntryState.SETUP_RETRY
+    assert len(async_get_plan_store_registry(hass)) == 0
+    client_instance.close.assert_awaited_once()
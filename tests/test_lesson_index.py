@@ -0,0 +1,98 @@
+"""Test the lesson index by start time."""
+from datetime import date, datetime, time
+from pathlib import Path
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.lesson_index import LessonIndex
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _plans() -> list[IndiwareMobilPlan]:
+    plan = IndiwareMobilPlan.from_xml_stream((FIXTURES / "PlanKl20250127.xml").read_bytes())
+    # A later day with the same lessons, after a day without a plan
+    later = IndiwareMobilPlan.from_xml_stream((FIXTURES / "PlanKl20250127.xml").read_bytes())
+    later.date = date(2025, 1, 29)
+    return [later, plan]
+
+
+def _start(form, lesson) -> time:
+    return lesson.start if lesson.start is not None else form.periods[lesson.period][0]
+
+
+def _next_by_scan(plans: list[IndiwareMobilPlan], now: datetime):
+    """Find the next lesson the way the sensor used to, extended to all days."""
+    for plan in sorted(plans, key=lambda plan: plan.date):
+        if plan.date < now.date():
+            continue
+        form = plan.forms[0]
+        candidates = [
+            lesson for lesson in form.lessons
+            if plan.date > now.date() or _start(form, lesson) > now.time()
+        ]
+        if candidates:
+            return plan.date, min(candidates, key=lambda lesson: _start(form, lesson))
+    return None
+
+
+def test_next_lesson_matches_scan():
+    """Test that the bisect lookup finds the lesson a scan over all lessons finds."""
+    plans = _plans()
+    index = LessonIndex.from_plans(plans)
+
+    assert index.dates == [date(2025, 1, 27), date(2025, 1, 29)]
+    # The fourth lesson has no time, it takes the one of its period
+    assert len(index) == 8
+
+    for now in (
+        datetime(2025, 1, 26, 12, 0),
+        datetime(2025, 1, 27, 7, 0),
+        datetime(2025, 1, 27, 7, 30),
+        datetime(2025, 1, 27, 8, 24, 59),
+        datetime(2025, 1, 27, 12, 0),
+        datetime(2025, 1, 28, 9, 0),
+        datetime(2025, 1, 27, 10, 20),
+        datetime(2025, 1, 29, 10, 24),
+    ):
+        found = index.next_lesson(now)
+        assert (found.date, found.lesson) == _next_by_scan(plans, now), now
+        assert found.form == "5a"
+
+    assert index.next_lesson(datetime(2025, 1, 29, 10, 25)) is None
+
+
+def test_current_lesson_and_boundaries():
+    """Test the lesson taking place at a time and the next time that changes."""
+    index = LessonIndex.from_plans(_plans())
+
+    current = index.current_lesson(datetime(2025, 1, 27, 7, 30))
+    assert current.lesson.period == 1
+    assert current.start == datetime(2025, 1, 27, 7, 30)
+    assert current.end == datetime(2025, 1, 27, 8, 15)
+
+    # In the break and on a day without a plan
+    assert index.current_lesson(datetime(2025, 1, 27, 8, 15)) is None
+    assert index.current_lesson(datetime(2025, 1, 28, 8, 30)) is None
+    # Times from the periods of the form
+    assert index.current_lesson(datetime(2025, 1, 27, 10, 30)).lesson.period == 4
+
+    assert index.next_boundary(datetime(2025, 1, 27, 7, 0)) == datetime(2025, 1, 27, 7, 30)
+    assert index.next_boundary(datetime(2025, 1, 27, 7, 30)) == datetime(2025, 1, 27, 8, 15)
+    assert index.next_boundary(datetime(2025, 1, 27, 8, 15)) == datetime(2025, 1, 27, 8, 25)
+    assert index.next_boundary(datetime(2025, 1, 27, 11, 10)) == datetime(2025, 1, 29, 7, 30)
+    assert index.next_boundary(datetime(2025, 1, 29, 11, 10)) is None
+
+
+def test_selected_form():
+    """Test that the lessons of the given form are indexed."""
+    index = LessonIndex.from_plans(_plans(), "10c")
+    plan = _plans()[1]
+    form = next(form for form in plan.forms if form.short_name == "10c")
+
+    found = index.next_lesson(datetime(2025, 1, 27, 0, 0))
+    assert found.form == "10c"
+    assert found.lesson is not None
+    assert found.lesson.start == min(_start(form, lesson) for lesson in form.lessons)
+
+    assert len(LessonIndex.from_plans(_plans(), "does not exist")) == 0
+    assert LessonIndex.from_plans([]).next_lesson(datetime(2025, 1, 27)) is None
@@ -0,0 +1,100 @@
+"""Test differences between plan versions."""
+from pathlib import Path
+
+from custom_components.stundenplan24.stundenplan24_py import xml_backend
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.plan_diff import (
+    ADDED,
+    CHANGED,
+    REMOVED,
+    diff_substitution_plans,
+    diff_timetables,
+)
+from custom_components.stundenplan24.stundenplan24_py.substitution_plan import SubstitutionPlan
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _timetable(content: str | None = None) -> IndiwareMobilPlan:
+    if content is None:
+        content = (FIXTURES / "PlanKl20250127.xml").read_text(encoding="utf-8")
+    return IndiwareMobilPlan.from_xml_stream(content)
+
+
+def _substitution_plan(content: str | None = None) -> SubstitutionPlan:
+    if content is None:
+        content = (FIXTURES / "VplanKl20250127.xml").read_text(encoding="utf-8")
+    return SubstitutionPlan.from_xml(xml_backend.fromstring(content))
+
+
+def test_equal_timetables_have_no_changes():
+    """Test that two parses of the same file don't differ."""
+    old, new = _timetable(), _timetable()
+
+    assert old is not new
+    assert not diff_timetables(old, new)
+    assert not diff_timetables(old, old)
+
+
+def test_changed_lesson_is_reported_per_field():
+    """Test that a changed lesson lists the attributes that differ."""
+    old = _timetable()
+    new = _timetable()
+    lesson = new.forms[0].lessons[0]
+    lesson.room = type(lesson.room)("999", True)
+
+    changes = diff_timetables(old, new)
+
+    assert changes.date == new.date
+    assert changes.fields == ()
+    [row] = changes.rows
+    assert row.change == CHANGED
+    assert row.form == new.forms[0].short_name
+    assert row.period == lesson.period
+    assert row.fields == ("room",)
+    assert row.old is old.forms[0].lessons[0]
+    assert row.new is lesson
+
+
+def test_added_and_removed_lessons_and_forms():
+    """Test lessons and forms that only one version has."""
+    old = _timetable()
+    new = _timetable()
+    removed = new.forms[0].lessons.pop()
+    dropped_form = new.forms.pop()
+
+    changes = diff_timetables(old, new)
+
+    assert changes.forms_removed == (dropped_form.short_name,)
+    removed_rows = [row for row in changes.rows if row.form == new.forms[0].short_name]
+    assert [(row.change, row.period) for row in removed_rows] == [(REMOVED, removed.period)]
+    assert {row.change for row in changes.rows if row.form == dropped_form.short_name} == {REMOVED}
+
+    # Restricted to other forms, nothing changed
+    assert not diff_timetables(old, new, forms={new.forms[1].short_name})
+
+    changes = diff_timetables(None, new)
+    assert changes.fields and {row.change for row in changes.rows} == {ADDED}
+
+
+def test_substitution_plan_changes():
+    """Test changed, added and removed substitutions and plan-level changes."""
+    old = _substitution_plan()
+    new = _substitution_plan()
+    assert not diff_substitution_plans(old, new)
+
+    new.actions[0].info = "entfällt"
+    new.actions.append(old.actions[-1])
+    new.absent_teachers = [*new.absent_teachers, "Xy"]
+
+    changes = diff_substitution_plans(old, new)
+
+    assert changes.fields == ("absent_teachers",)
+    assert [(row.change, row.form, row.fields) for row in changes.rows][0] == (
+        CHANGED, old.actions[0].form, ("info",)
+    )
+    assert changes.rows[-1].change == ADDED
+    assert changes.rows[-1].form == old.actions[-1].form
+
+    other_forms = {action.form for action in old.actions} - {old.actions[0].form, old.actions[-1].form}
+    assert not diff_substitution_plans(old, new, forms=other_forms).rows
@@ -0,0 +1,36 @@
+"""Test parsed plans against golden files recorded from the reference parser."""
+import json
+from pathlib import Path
+import xml.etree.ElementTree as ET
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.substitution_plan import SubstitutionPlan
+
+from .plan_snapshot import snapshot
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _golden(name: str):
+    return json.loads((FIXTURES / f"{name}.json").read_text(encoding="utf-8"))
+
+
+def _tree(name: str) -> ET.Element:
+    return ET.parse(FIXTURES / f"{name}.xml").getroot()
+
+
+def test_indiware_mobil_plan_matches_golden_file():
+    """Test that a timetable parses to exactly the recorded objects."""
+    golden = _golden("PlanKl20250127")
+
+    assert snapshot(IndiwareMobilPlan.from_xml(_tree("PlanKl20250127"))) == golden
+
+    content = (FIXTURES / "PlanKl20250127.xml").read_bytes()
+    assert snapshot(IndiwareMobilPlan.from_xml_stream(content)) == golden
+
+
+def test_substitution_plan_matches_golden_file():
+    """Test that a substitution plan parses to exactly the recorded objects."""
+    golden = _golden("VplanKl20250127")
+
+    assert snapshot(SubstitutionPlan.from_xml(_tree("VplanKl20250127"))) == golden
@@ -0,0 +1,241 @@
+"""Test the Stundenplan24 sensor platform."""
+from unittest.mock import patch, MagicMock, AsyncMock
+from datetime import datetime
+
+import pytest
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.stundenplan24.const import CONF_FORM, CONF_MAX_SUBSTITUTION_ROWS, DOMAIN
+from custom_components.stundenplan24.substitutions import substitution_attributes
+
+
+SUBSTITUTION_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<vp>
+  <kopf>
+    <titel>Montag, {day}. Januar 2025</titel>
+    <schulname>Testschule</schulname>
+    <datum>24.01.2025, 13:12</datum>
+    <kopfinfo>
+      <abwesendl>Mü</abwesendl>
+      <abwesendk>7b</abwesendk>
+    </kopfinfo>
+    <datei>VplanKl202501{day}.xml</datei>
+  </kopf>
+  <freietage />
+  <haupt>
+    <aktion>
+      <klasse>5a</klasse>
+      <stunde>3</stunde>
+      <fach>Ma</fach>
+      <lehrer>Mü</lehrer>
+      <raum>101</raum>
+      <vfach>Ma</vfach>
+      <vlehrer legeaendert="ae">Sm</vlehrer>
+      <vraum>101</vraum>
+      <info>für Mü</info>
+    </aktion>
+  </haupt>
+</vp>"""
+
+
+async def test_lesson_sensors_follow_lesson_boundaries(
+    hass, mock_config_entry, mock_timetable_with_lessons, freezer
+):
+    """Test that the lesson sensors change at lesson boundaries without polling."""
+    freezer.move_to(datetime(2025, 1, 25, 8, 30, tzinfo=dt_util.get_default_time_zone()))
+    mock_config_entry.add_to_hass(hass)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_mobil = MagicMock()
+        mock_mobil.fetch_dates = AsyncMock(return_value={"PlanKl20250125.xml": datetime.now()})
+        mock_mobil.fetch_plan = AsyncMock(return_value=mock_timetable_with_lessons)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = [mock_mobil]
+        client_instance.substitution_plan_clients = []
+        client_instance.close = AsyncMock()
+
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        def states() -> tuple[str, str]:
+            return (
+                hass.states.get("sensor.stundenplan24_aktuelle_stunde").state,
+                hass.states.get("sensor.stundenplan24_nachste_stunde").state,
+            )
+
+        assert states() == ("Ma", "De")
+        current = hass.states.get("sensor.stundenplan24_aktuelle_stunde")
+        assert current.attributes["start_time"] == "08:00:00"
+        assert current.attributes["end_time"] == "08:45:00"
+        fetches = mock_mobil.fetch_dates.call_count
+
+        # The first lesson ends, the break before the second one starts
+        freezer.move_to(datetime(2025, 1, 25, 8, 45, tzinfo=dt_util.get_default_time_zone()))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+        assert states() == ("Keine Stunde", "De")
+
+        freezer.move_to(datetime(2025, 1, 25, 8, 50, tzinfo=dt_util.get_default_time_zone()))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+        assert states() == ("De", "En")
+        # None of this needed a request
+        assert mock_mobil.fetch_dates.call_count == fetches
+
+        # After the last lesson
+        freezer.move_to(datetime(2025, 1, 25, 11, 30, tzinfo=dt_util.get_default_time_zone()))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+        assert states() == ("Keine Stunde", "Keine weiteren Stunden")
+
+        assert await hass.config_entries.async_unload(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+
+async def test_substitution_sensors_share_cached_attributes(hass, mock_config_entry, school_day):
+    """Test that the attributes of a substitution plan are built once and frozen."""
+    mock_config_entry.add_to_hass(hass)
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        content = SUBSTITUTION_XML.format(day=date_or_filename.day)
+        return MagicMock(content=content, last_modified=None, etag=None)
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]["coordinator"]
+        plan = coordinator.data["substitution_tomorrow"]
+        attrs = substitution_attributes(plan, None, 30)
+        assert substitution_attributes(plan, None, 30) is attrs
+        with pytest.raises(RuntimeError):
+            attrs["date"] = None
+
+        # Tomorrow's sensor shows the original values just like today's
+        state = hass.states.get("sensor.stundenplan24_vertretungen_morgen")
+        assert state.state == "1"
+        assert state.attributes["substitutions"] == ({
+            "form": "5a",
+            "period": "3",
+            "subject": "Ma",
+            "teacher": "Sm",
+            "room": "101",
+            "info": "für Mü",
+            "original_subject": "Ma",
+            "original_teacher": "Mü",
+            "original_room": "101",
+        },)
+        assert state.attributes["absent_forms"] == ("7b",)
+
+        assert await hass.config_entries.async_unload(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+
+async def test_substitution_attributes_are_budgeted(hass, mock_config_entry, school_day, hass_ws_client):
+    """Test that sensors show few substitutions of their form, the websocket API all of them."""
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        data={**mock_config_entry.data, CONF_FORM: "5a"},
+        options={CONF_MAX_SUBSTITUTION_ROWS: 2},
+    )
+
+    action = SUBSTITUTION_XML[SUBSTITUTION_XML.index("<aktion>"):SUBSTITUTION_XML.index("</haupt>")]
+    actions = "".join(
+        action.replace("<klasse>5a</klasse>", f"<klasse>{form}</klasse>").replace(
+            "<stunde>3</stunde>", f"<stunde>{period}</stunde>"
+        )
+        for form in ("5a", "7b")
+        for period in range(1, 4)
+    )
+    content = SUBSTITUTION_XML.replace(action, actions)
+
+    async def fetch_plan(date_or_filename, **kwargs):
+        return MagicMock(
+            content=content.format(day=date_or_filename.day), last_modified=None, etag=None
+        )
+
+    with patch(
+        "custom_components.stundenplan24.coordinator.IndiwareStundenplanerClient"
+    ) as mock_client, patch(
+        "custom_components.stundenplan24.coordinator.Hosting"
+    ):
+        mock_subst = MagicMock()
+        mock_subst.fetch_plan = AsyncMock(side_effect=fetch_plan)
+
+        client_instance = mock_client.return_value
+        client_instance.indiware_mobil_clients = []
+        client_instance.substitution_plan_clients = [mock_subst]
+        client_instance.close = AsyncMock()
+
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        state = hass.states.get("sensor.stundenplan24_vertretungen_heute")
+        # Only the substitutions of 5a were parsed, those of 7b just counted
+        assert state.state == "3"
+        substitutions = state.attributes["substitutions"]
+        assert [(row["form"], row["period"]) for row in substitutions] == [("5a", "1"), ("5a", "2")]
+        assert state.attributes["substitutions_total"] == 3
+        assert state.attributes["substitutions_truncated"]
+        assert state.attributes["school_total"] == 6
+
+        # The websocket API pages through all substitutions kept
+        client = await hass_ws_client(hass)
+        rows = []
+        offset = 0
+        while offset is not None:
+            await client.send_json_auto_id({
+                "type": "stundenplan24/substitutions",
+                "entry_id": mock_config_entry.entry_id,
+                "offset": offset,
+                "limit": 2,
+            })
+            response = await client.receive_json()
+            assert response["success"]
+            assert response["result"]["total"] == 3
+            assert response["result"]["school_total"] == 6
+            rows += response["result"]["substitutions"]
+            offset = response["result"]["next_offset"]
+        assert [(row["form"], row["period"]) for row in rows] == [
+            ("5a", str(period)) for period in range(1, 4)
+        ]
+
+        await client.send_json_auto_id({
+            "type": "stundenplan24/substitutions",
+            "entry_id": mock_config_entry.entry_id,
+            "day": "tomorrow",
+            "form": "5a",
+            "offset": 1,
+        })
+        response = await client.receive_json()
+        assert [row["period"] for row in response["result"]["substitutions"]] == ["2", "3"]
+        assert response["result"]["next_offset"] is None
+
+        await client.send_json_auto_id({
+            "type": "stundenplan24/substitutions",
+            "entry_id": "does not exist",
+        })
+        response = await client.receive_json()
+        assert response["error"]["code"] == "not_found"
+
+        assert await hass.config_entries.async_unload(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
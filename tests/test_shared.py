@@ -0,0 +1,56 @@
+"""Test the shared time and date parsers against strptime."""
+import datetime
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py.shared import (
+    parse_plan_date,
+    parse_short_date,
+    parse_time,
+    parse_timestamp,
+)
+
+TIMES = ["00:00", "07:30", "23:59", "7:30", "07:5", "24:00", "07:60", "0730", " 07:30", "07:3x", "", "٠٧:٣٠"]
+SHORT_DATES = ["250127", "000101", "681231", "690101", "991231", "250230", "251301", "25127", "2501271", "25o127"]
+TIMESTAMPS = ["24.01.2025, 13:12", "01.01.1999, 00:00", "31.02.2025, 13:12", "24.1.2025, 13:12", "24.01.2025 13:12"]
+
+
+def _reference(value: str, fmt: str):
+    try:
+        return datetime.datetime.strptime(value, fmt)
+    except ValueError:
+        return ValueError
+
+
+def _parsed(parse, value: str):
+    try:
+        return parse(value)
+    except ValueError:
+        return ValueError
+
+
+@pytest.mark.parametrize("value", TIMES)
+def test_parse_time_matches_strptime(value):
+    """Test that parse_time accepts and rejects exactly what strptime does."""
+    expected = _reference(value, "%H:%M")
+    assert _parsed(parse_time, value) == (expected if expected is ValueError else expected.time())
+
+
+@pytest.mark.parametrize("value", SHORT_DATES)
+def test_parse_short_date_matches_strptime(value):
+    """Test that parse_short_date accepts and rejects exactly what strptime does."""
+    expected = _reference(value, "%y%m%d")
+    assert _parsed(parse_short_date, value) == (expected if expected is ValueError else expected.date())
+
+
+@pytest.mark.parametrize("value", TIMESTAMPS)
+def test_parse_timestamp_matches_strptime(value):
+    """Test that parse_timestamp accepts and rejects exactly what strptime does."""
+    assert _parsed(parse_timestamp, value) == _reference(value, "%d.%m.%Y, %H:%M")
+
+
+def test_parsed_values_are_cached():
+    """Test that repeated values are served from the cache."""
+    assert parse_time("08:25") is parse_time("08:25")
+    assert parse_plan_date("Montag, 27. Januar 2025 (A-Woche)") == datetime.date(2025, 1, 27)
+    assert parse_plan_date.cache_info().currsize > 0
@@ -0,0 +1,116 @@
+"""Test binary snapshots of parsed plans."""
+import mmap
+from pathlib import Path
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.snapshot import (
+    SnapshotError,
+    TimetableSnapshot,
+    dump_substitution_plan,
+    dump_timetable,
+    load_substitution_plan,
+)
+from custom_components.stundenplan24.stundenplan24_py.substitution_plan import SubstitutionPlan
+from custom_components.stundenplan24.stundenplan24_py import xml_backend
+from custom_components.stundenplan24.substitutions import substitution_rows
+
+from .plan_snapshot import snapshot
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _timetable() -> IndiwareMobilPlan:
+    return IndiwareMobilPlan.from_xml_stream((FIXTURES / "PlanKl20250127.xml").read_bytes())
+
+
+def test_timetable_round_trip(tmp_path):
+    """Test that a timetable loads back from an mmap exactly as parsed."""
+    plan = _timetable()
+    path = tmp_path / "plan.snap"
+    path.write_bytes(dump_timetable(plan))
+
+    with path.open("rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        with TimetableSnapshot(buffer) as stored:
+            assert stored.parsed_forms is None
+            assert stored.short_names == [form.short_name for form in plan.forms]
+            restored = stored.materialize()
+
+    assert snapshot(restored) == snapshot(plan)
+    # Values are shared with the parsed plans like after parsing
+    assert restored.forms[0].lessons[0].subject is plan.forms[0].lessons[0].subject
+
+
+def test_timetable_materializes_selected_forms():
+    """Test that only the forms asked for are built."""
+    plan = _timetable()
+    stored = TimetableSnapshot(dump_timetable(plan, forms={"5a", "7b"}))
+
+    assert stored.parsed_forms == frozenset({"5a", "7b"})
+    restored = stored.materialize(forms={"5a"})
+
+    assert [form.short_name for form in restored.forms] == ["5a"]
+    assert snapshot(restored.forms[0]) == snapshot(plan.forms[0])
+    assert restored.date == plan.date
+
+
+def test_substitution_plan_round_trip():
+    """Test that a substitution plan loads back exactly as parsed."""
+    plan = SubstitutionPlan.from_xml(
+        xml_backend.fromstring((FIXTURES / "VplanKl20250127.xml").read_bytes())
+    )
+
+    assert snapshot(load_substitution_plan(dump_substitution_plan(plan))) == snapshot(plan)
+
+
+
+def test_substitution_plan_of_selected_forms():
+    """Test that actions of other forms are counted, but neither parsed nor stored."""
+    content = (FIXTURES / "VplanKl20250127.xml").read_bytes()
+    plan = SubstitutionPlan.from_xml(xml_backend.fromstring(content), forms={"7b"})
+
+    assert [action.form for action in plan.actions] == ["7b"]
+    assert plan.action_count == 3
+
+    data = dump_substitution_plan(plan, {"7b"})
+    loaded = load_substitution_plan(data, {"7b"})
+    assert snapshot(loaded) == snapshot(plan)
+    # The actions of 5a were never kept
+    assert load_substitution_plan(data, {"5a", "7b"}) is None
+    assert load_substitution_plan(data) is None
+
+    full = dump_substitution_plan(SubstitutionPlan.from_xml(xml_backend.fromstring(content)))
+    assert [action.form for action in load_substitution_plan(full, {"5a"}).actions] == ["5a", "5a"]
+
+
+def test_substitution_plan_of_combined_forms():
+    """Test that an action for several forms is kept for each of them."""
+    content = (FIXTURES / "VplanKl20250127.xml").read_text(encoding="utf-8").replace(
+        "<klasse>7b</klasse>", "<klasse>5a,7b</klasse>"
+    )
+    plan = SubstitutionPlan.from_xml(xml_backend.fromstring(content), forms={"7b"})
+
+    assert [action.form for action in plan.actions] == ["5a,7b"]
+    assert plan.action_count == 3
+
+    data = dump_substitution_plan(SubstitutionPlan.from_xml(xml_backend.fromstring(content)))
+    assert [action.form for action in load_substitution_plan(data, {"7b"}).actions] == ["5a,7b"]
+    assert len(load_substitution_plan(data, {"5a"}).actions) == 3
+
+    rows = substitution_rows(plan, "7b")
+    assert [row["form"] for row in rows] == ["5a,7b"]
+    assert substitution_rows(plan, "5a") == rows
+    assert substitution_rows(plan, "5") == ()
+
+
+def test_broken_snapshots_are_rejected():
+    """Test that foreign or truncated data raises a SnapshotError."""
+    data = dump_timetable(_timetable())
+
+    with pytest.raises(SnapshotError):
+        TimetableSnapshot(b"<?xml version='1.0'?>")
+    with pytest.raises(SnapshotError):
+        TimetableSnapshot(data[:len(data) // 2]).materialize()
+    with pytest.raises(SnapshotError):
+        load_substitution_plan(data)
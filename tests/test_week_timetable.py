@@ -0,0 +1,89 @@
+"""Test the columnar week timetable."""
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.week_timetable import WeekTimetable
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _plans() -> list[IndiwareMobilPlan]:
+    plan = IndiwareMobilPlan.from_xml_stream((FIXTURES / "PlanKl20250127.xml").read_bytes())
+    # A second day with the same lessons
+    next_day = IndiwareMobilPlan.from_xml_stream((FIXTURES / "PlanKl20250127.xml").read_bytes())
+    next_day.date = date(2025, 1, 28)
+    return [next_day, plan]
+
+
+def test_select_matches_lesson_loops():
+    """Test that bitmap queries select the same lessons as walking the plans."""
+    plans = _plans()
+    week = WeekTimetable.from_plans(plans)
+
+    assert week.dates == [date(2025, 1, 27), date(2025, 1, 28)]
+    assert len(week) == sum(len(form.lessons) for plan in plans for form in plan.forms)
+
+    plan = plans[1]
+    form = plan.forms[0]
+    subject = form.lessons[0].subject.content
+    expected = [
+        lesson for lesson in form.lessons
+        if lesson.subject.content == subject and lesson.start is not None
+    ]
+    rows = week.lessons(dates=plan.date, forms=form.short_name, subjects=[subject], timed=True)
+
+    assert [row.lesson for row in rows] == expected
+    assert {(row.date, row.form) for row in rows} == {(plan.date, form.short_name)}
+
+    teacher = form.lessons[0].teacher.content
+    assert [row.lesson for row in week.lessons(teachers=teacher)] == [
+        lesson
+        for plan in sorted(plans, key=lambda plan: plan.date)
+        for form in plan.forms
+        for lesson in form.lessons
+        if lesson.teacher.content == teacher
+    ]
+
+
+def test_columns_and_unknown_values():
+    """Test the stored columns and queries for values not in the plans."""
+    week = WeekTimetable.from_plans(_plans())
+    first = week.lessons()[0].lesson
+
+    assert week.codes[week.form[0]] == "5a"
+    assert week.period[0] == first.period
+    if first.start is not None:
+        assert week.start[0] == first.start.hour * 60 + first.start.minute
+
+    assert week.select(forms="does not exist") == 0
+    assert week.select(dates=date(2030, 1, 1)) == 0
+    assert week.lessons(forms=[]) == []
+
+
+def test_is_room_free():
+    """Test room occupancy lookups."""
+    week = WeekTimetable.from_plans(_plans())
+    row = week.lessons(timed=True)[0]
+    room = row.lesson.room.content
+
+    assert not week.is_room_free(room, row.date, row.lesson.period)
+    assert week.is_room_free(room, date(2025, 1, 29), row.lesson.period)
+    assert week.is_room_free("no such room", row.date, row.lesson.period)
+
+    # Plans of some forms don't tell about the rooms of the others
+    some_forms = WeekTimetable.from_plans(_plans(), forms=["5a"])
+    assert some_forms.forms == {"5a"}
+    with pytest.raises(ValueError):
+        some_forms.is_room_free(room, row.date, row.lesson.period)
+
+
+def test_empty():
+    """Test a table without plans."""
+    week = WeekTimetable.from_plans([])
+
+    assert len(week) == 0
+    assert week.lessons(rooms="101") == []
+    assert week.is_room_free("101", date(2025, 1, 27), 1)
@@ -0,0 +1,71 @@
+"""Test that the lxml backend parses plans exactly like ElementTree."""
+from pathlib import Path
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from custom_components.stundenplan24.stundenplan24_py import xml_backend
+from custom_components.stundenplan24.stundenplan24_py.indiware_mobil import IndiwareMobilPlan
+from custom_components.stundenplan24.stundenplan24_py.substitution_plan import SubstitutionPlan
+
+from .plan_snapshot import snapshot
+
+pytest.importorskip("lxml")
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _read(filename: str, as_bytes: bool) -> str | bytes:
+    content = (FIXTURES / filename).read_bytes()
+    return content if as_bytes else content.decode("utf-8")
+
+
+def _parse_both(parse) -> tuple:
+    return tuple(snapshot(parse(backend)) for backend in ("etree", "lxml"))
+
+
+def test_lxml_backend_available():
+    """Test that lxml can be selected when it is installed."""
+    assert xml_backend.BACKENDS == ("etree", "lxml")
+    assert xml_backend.DEFAULT_BACKEND == "etree"
+
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_indiware_mobil_plan_parity(as_bytes):
+    """Test that both backends build the same timetable."""
+    content = _read("PlanKl20250127.xml", as_bytes)
+
+    etree_plan, lxml_plan = _parse_both(
+        lambda backend: IndiwareMobilPlan.from_xml(xml_backend.fromstring(content, backend))
+    )
+    assert etree_plan == lxml_plan
+    assert len(lxml_plan["forms"]) == 3
+
+    for forms in (None, {"7b"}):
+        etree_plan, lxml_plan = _parse_both(
+            lambda backend: IndiwareMobilPlan.from_xml_stream(content, forms, backend)
+        )
+        assert etree_plan == lxml_plan
+
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_substitution_plan_parity(as_bytes):
+    """Test that both backends build the same substitution plan."""
+    content = _read("VplanKl20250127.xml", as_bytes)
+
+    etree_plan, lxml_plan = _parse_both(
+        lambda backend: SubstitutionPlan.from_xml(xml_backend.fromstring(content, backend))
+    )
+    assert etree_plan == lxml_plan
+    assert len(lxml_plan["actions"]) == 3
+
+
+@pytest.mark.parametrize("backend", ["etree", "lxml"])
+def test_backends_raise_parse_error(backend):
+    """Test that malformed documents raise ET.ParseError with either backend."""
+    content = _read("PlanKl20250127.xml", as_bytes=True)[:500]
+
+    with pytest.raises(ET.ParseError):
+        xml_backend.fromstring(content, backend)
+    with pytest.raises(ET.ParseError):
+        IndiwareMobilPlan.from_xml_stream(content, backend=backend)